@@ -0,0 +1,218 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+#
+# benchmark for the data preparation (rawdataprocessor) and metrics (forecastMetrics) paths
+# against a local S3/CloudWatch stand-in (moto), used to size lambda memory and catch regressions
+#
+#   pip install -r benchmarks/requirements.txt
+#   python benchmarks/benchmark.py --items 1000 --days 365 --quantiles 3
+#
+import os
+import io
+import sys
+import gc
+import csv
+import json
+import time
+import argparse
+import importlib
+import resource
+import tempfile
+from datetime import timedelta
+
+REPO_ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUCKET="forecast-benchmark-bucket"
+
+import syntheticdata
+
+
+def peakRssMB():
+    # ru_maxrss is in KB on linux (bytes on macOS)
+    peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/1024.0/1024.0 if sys.platform=="darwin" else peak/1024.0
+
+
+class Stage(object):
+
+    def __init__(self, results, name):
+        self.results=results
+        self.name=name
+        self.rows=0
+
+    def __enter__(self):
+        gc.collect()
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        elapsed=time.perf_counter()-self.start
+        self.results.append({
+            "stage": self.name,
+            "seconds": round(elapsed, 4),
+            "rows": self.rows,
+            "rowsPerSecond": int(self.rows/elapsed) if elapsed>0 else 0,
+            "peakRssMB": round(peakRssMB(), 1),
+        })
+        return False
+
+
+# each lambda folder has its own vars module, so every handler is imported with a fresh one
+def loadLambdaModule(folder, moduleName):
+    sys.modules.pop("vars", None)
+    sys.path.insert(0, os.path.join(REPO_ROOT, folder))
+    try:
+        return importlib.import_module(moduleName)
+    finally:
+        sys.path.pop(0)
+        sys.modules.pop("vars", None)
+
+
+def setupEnvironment():
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ["S3BucketName"]=BUCKET
+    os.environ["MetricsNameSpace"]="ForecastBenchmark"
+    os.environ["IncrementalMode"]="false"
+    sys.path.insert(0, os.path.join(REPO_ROOT, "common"))
+
+
+# None when both stores hold the same items, days and values (NaN equal to NaN), else what differs
+def storeDifference(expected, actual):
+    import numpy
+    if (actual.items!=expected.items):
+        return "items"
+    if ((actual.startOrdinal, actual.endOrdinal)!=(expected.startOrdinal, expected.endOrdinal)):
+        return "day range"
+    for fieldName in expected.fieldNames:
+        if (not numpy.array_equal(actual.getRange(actual.startOrdinal, actual.endOrdinal, fieldName),
+                                  expected.getRange(expected.startOrdinal, expected.endOrdinal, fieldName), equal_nan=True)):
+            return "values of "+fieldName
+    return None
+
+def benchmarkDataPrep(args, results, workDir):
+    rawProcessor=loadLambdaModule("rawdataprocessor", "RawDataProcesser")
+    rawVars=rawProcessor.vars
+    rawPath=os.path.join(workDir, "states_daily.csv")
+    numOfRawRows=syntheticdata.writeRawCsv(rawPath, args.items, args.days, missingRate=args.missing_rate)
+
+    with Stage(results, "processRawCSV") as stage:
+        rawProcessor.processRawCSV(rawPath)
+        stage.rows=numOfRawRows
+
+    if (args.ingestion_shards>1):
+        serialData=rawVars.RawData
+        with Stage(results, "processRawCSVSharded") as stage:
+            rawProcessor.processRawCSVSharded(rawPath, args.ingestion_shards)
+            stage.rows=numOfRawRows
+        difference=storeDifference(serialData, rawVars.RawData)
+        if (difference is not None):
+            raise SystemExit("sharded parse differs from the serial parse: "+difference)
+
+    with Stage(results, "generateDataForCurrentDay") as stage:
+        currentDay=rawVars.StartDate
+        while (currentDay<=rawVars.EndDate):
+            for _ in rawProcessor.generateDataForCurrentDay(currentDay):
+                stage.rows+=1
+            currentDay=currentDay+timedelta(days=1)
+
+    with open(os.path.join(REPO_ROOT, "forecast-model-config.json")) as configFile:
+        modelConfig=json.load(configFile)["models"][0]
+    modelConfig["output_format"]=args.output_format
+    modelConfig["preditor"]["ForecastHorizon"]=args.horizon
+    with Stage(results, "writePreparedDataForModel") as stage:
+        rawProcessor.writePreparedDataForModel(modelConfig)
+        stage.rows=2*len(rawVars.ItemList)*((rawVars.EndDate-rawVars.StartDate).days+1)+len(rawVars.ItemList)*args.horizon
+    return rawVars.EndDate+timedelta(days=1)
+
+
+def benchmarkMetrics(args, results, s3Client, forecastStartDate):
+    import numpy
+    import actualsstore
+    from timeseriesstore import TimeSeriesStore
+    metrics=loadLambdaModule("forecastMetrics", "forecastMetrics")
+    metricsVars=metrics.vars
+    quantiles=syntheticdata.quantileNames(args.quantiles)
+    shards=syntheticdata.generateForecastExport(args.items, forecastStartDate, args.horizon, quantiles, args.shards)
+    dailyActuals=syntheticdata.generateDailyActuals(args.items, forecastStartDate, args.horizon)
+    for day, body in dailyActuals:
+        s3Client.put_object(Bucket=BUCKET, Key="covid-19-daily/target_"+day.strftime("%Y-%m-%d")+".csv", Body=body)
+
+    with Stage(results, "processForecastCSV") as stage:
+        metrics.resetForecastData()
+        for shardName, body in shards:
+            shardPath=os.path.join(tempfile.gettempdir(), shardName)
+            with open(shardPath, "wb") as shardFile:
+                shardFile.write(body)
+            metrics.processForecastCSV(shardPath)
+        stage.rows=args.items*args.horizon
+
+    forecastEndDate=forecastStartDate+timedelta(days=args.horizon-1)
+    exportFolder="ForecastExports/benchmark_Forecast"
+    for shardName, body in shards:
+        s3Client.put_object(Bucket=BUCKET, Key=exportFolder+"/"+shardName, Body=body)
+    with Stage(results, "loopAllForecastExports") as stage:
+        metrics.loopAllForecastExports(exportFolder, forecastStartDate, forecastEndDate)
+        stage.rows=args.items*args.horizon
+
+    # real values from the daily files (no actuals manifest yet), then from the monthly actuals partitions
+    with Stage(results, "getHorizonRealData(daily)") as stage:
+        metricsVars.Actuals=None
+        dailyRealValues=metrics.getHorizonRealData(forecastStartDate, forecastEndDate)
+        stage.rows=args.items*args.horizon
+    actualsData=TimeSeriesStore([actualsstore.ACTUALS_FIELD])
+    for day, body in dailyActuals:
+        for row in csv.reader(io.StringIO(body.decode("utf-8"))):
+            actualsData.setValues(day.toordinal(), row[1], (float(row[2]),))
+    actualsstore.writePartitions(s3Client, metrics.s3_transfer, BUCKET, actualsData, actualsstore.ACTUALS_FIELD, actualsData.startOrdinal)
+    with Stage(results, "getHorizonRealData(actuals)") as stage:
+        metricsVars.Actuals=None
+        realValues=metrics.getHorizonRealData(forecastStartDate, forecastEndDate)
+        stage.rows=args.items*args.horizon
+    assert numpy.array_equal(dailyRealValues, realValues, equal_nan=True)
+    with Stage(results, "publishMetrics") as stage:
+        metrics.publishMetrics(forecastStartDate, realValues, {"modelName": "benchmark"}, "benchmark_dataset_group")
+        stage.rows=args.items*args.horizon*len(metricsVars.forecastPList)
+
+
+def printResults(args, results):
+    print("items="+str(args.items)+" days="+str(args.days)+" horizon="+str(args.horizon)+" quantiles="+str(args.quantiles)+" output_format="+args.output_format)
+    print("%-28s %10s %12s %14s %12s" % ("stage", "seconds", "rows", "rows/sec", "peakRssMB"))
+    for result in results:
+        print("%-28s %10.3f %12d %14d %12.1f" % (result["stage"], result["seconds"], result["rows"], result["rowsPerSecond"], result["peakRssMB"]))
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="benchmark the data preparation and metrics paths with synthetic data")
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--horizon", type=int, default=2)
+    parser.add_argument("--quantiles", type=int, default=3)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--output-format", default="csv")
+    parser.add_argument("--ingestion-shards", type=int, default=1, help="also time the sharded raw data parsing with this many processes")
+    parser.add_argument("--json", help="also write the results to this file")
+    args=parser.parse_args(argv)
+
+    setupEnvironment()
+    import boto3
+    from moto import mock_aws
+
+    results=[]
+    with mock_aws():
+        s3Client=boto3.client("s3")
+        s3Client.create_bucket(Bucket=BUCKET)
+        with tempfile.TemporaryDirectory() as workDir:
+            forecastStartDate=benchmarkDataPrep(args, results, workDir)
+            benchmarkMetrics(args, results, s3Client, forecastStartDate)
+
+    printResults(args, results)
+    if (args.json):
+        with open(args.json, "w") as outputFile:
+            json.dump({"parameters": vars(args), "results": results}, outputFile, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import io
+import csv
+import math
+import random
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from botocore.exceptions import ClientError
+
+# local stand-ins for the services the lambdas call, used by pipelinesimulation.py (S3 itself is moto)
+#   ApiCallCounter       API calls per stage, service and operation
+#   FakeForecast         Forecast control plane on a simulated clock: resources go CREATE_PENDING -> CREATE_IN_PROGRESS -> ACTIVE
+#                        (or CREATE_FAILED) as the clock advances, deletes are refused while children exist, and an export job
+#                        writes synthetic export shards (item_id,date,p10,p50,p90 + _SUCCESS) from the imported target data
+#   CapturingCloudWatch  keeps every put_metric_data datum and answers get_metric_statistics from them
+ARN_PREFIX="arn:aws:forecast:us-east-1:123456789012:"
+# simulated seconds spent in CREATE_IN_PROGRESS
+DEFAULT_DURATIONS={"datasetGroup": 0, "dataset": 0, "datasetImportJob": 3600, "predictor": 6*3600, "forecast": 2*3600, "forecastExportJob": 3600}
+DEFAULT_PAGE_SIZE=100
+MAX_DATUMS_PER_CALL=1000
+MAX_VALUES_PER_DATUM=150
+
+# kind -> (arn resource type, arn/name parameter prefix, list operation, list result key)
+KINDS=OrderedDict([
+    ("datasetGroup", ("dataset-group", "DatasetGroup", "list_dataset_groups", "DatasetGroups")),
+    ("dataset", ("dataset", "Dataset", "list_datasets", "Datasets")),
+    ("datasetImportJob", ("dataset-import-job", "DatasetImportJob", "list_dataset_import_jobs", "DatasetImportJobs")),
+    ("predictor", ("predictor", "Predictor", "list_predictors", "Predictors")),
+    ("forecast", ("forecast", "Forecast", "list_forecasts", "Forecasts")),
+    ("forecastExportJob", ("forecast-export-job", "ForecastExportJob", "list_forecast_export_jobs", "ForecastExportJobs")),
+])
+LIST_OPERATIONS={operation: kind for kind, (_, _, operation, _) in KINDS.items()}
+
+
+def serviceError(code, message, operation):
+    return ClientError({"Error": {"Code": code, "Message": message}}, operation)
+
+def parseS3Url(url):
+    bucket, _, key=url[len("s3://"):].partition("/")
+    return bucket, key
+
+def toUtc(timestamp):
+    if (isinstance(timestamp, datetime)):
+        return timestamp.replace(tzinfo=timezone.utc) if timestamp.tzinfo is None else timestamp.astimezone(timezone.utc)
+    if (isinstance(timestamp, date)):
+        return datetime(timestamp.year, timestamp.month, timestamp.day, tzinfo=timezone.utc)
+    return datetime.fromtimestamp(float(timestamp), timezone.utc)
+
+
+class ApiCallCounter(object):
+
+    def __init__(self):
+        self.stage=None
+        self.calls=defaultdict(int)
+        self._lock=threading.Lock()
+
+    def count(self, service, operation):
+        with self._lock:
+            self.calls[(self.stage, service, operation)]+=1
+
+    # every API call of a boto3 client, paginated and managed transfer calls included
+    def attach(self, client, service):
+        def beforeCall(model=None, **kwargs):
+            self.count(service, model.name)
+        client.meta.events.register("before-call", beforeCall)
+        return client
+
+    # {service: calls} of one stage
+    def byService(self, stage):
+        totals=defaultdict(int)
+        for (callStage, service, _), calls in self.calls.items():
+            if (callStage==stage):
+                totals[service]+=calls
+        return dict(totals)
+
+    # {"service.operation": calls} of one stage
+    def byOperation(self, stage):
+        return {service+"."+operation: calls for (callStage, service, operation), calls in sorted(self.calls.items()) if callStage==stage}
+
+
+class FakePaginator(object):
+
+    def __init__(self, fake, operation):
+        self.fake=fake
+        self.operation=operation
+
+    def paginate(self, **kwargs):
+        return self.fake._pages(self.operation)
+
+
+class FakeForecast(object):
+
+    def __init__(self, s3Client, counter=None, now=None, durations=None, deleteChecks=1, exportShards=2, failureRate=0.0, pageSize=DEFAULT_PAGE_SIZE, seed=1):
+        self.s3Client=s3Client
+        self.counter=counter
+        self.now=now or datetime.now(timezone.utc)
+        self.durations=dict(DEFAULT_DURATIONS)
+        self.durations.update(durations or {})
+        # describe calls a deleted resource stays in DELETE_IN_PROGRESS (the simulated clock doesn't move during an invocation)
+        self.deleteChecks=deleteChecks
+        self.exportShards=exportShards
+        self.failureRate=failureRate
+        self.pageSize=pageSize
+        self.random=random.Random(seed)
+        self.resources=OrderedDict()
+        self.created=defaultdict(int)
+        self.deleted=defaultdict(int)
+        self.exportedObjects=0
+        self._lock=threading.RLock()
+
+    def _count(self, operation):
+        if (self.counter is not None):
+            self.counter.count("forecast", operation)
+
+    def _arn(self, kind, name, parentName=None):
+        return ARN_PREFIX+KINDS[kind][0]+"/"+(parentName+"/" if parentName else "")+name
+
+    def _get(self, arn, operation):
+        resource=self.resources.get(arn)
+        if (resource is None):
+            raise serviceError("ResourceNotFoundException", "No resource found "+arn, operation)
+        return resource
+
+    def _getActive(self, arn, operation):
+        resource=self._get(arn, operation)
+        if (resource["status"]!="ACTIVE"):
+            raise serviceError("ResourceInUseException", arn+" is in status "+resource["status"], operation)
+        return resource
+
+    def _create(self, operation, kind, name, parentArn=None, parentName=None, datasetGroupArn=None, request=None):
+        arn=self._arn(kind, name, parentName)
+        if (arn in self.resources):
+            raise serviceError("ResourceAlreadyExistsException", arn+" already exists", operation)
+        failed=self.durations[kind]>0 and self.random.random()<self.failureRate
+        resource={"kind": kind, "arn": arn, "name": name, "parent": parentArn, "datasetGroupArn": datasetGroupArn,
+                  "request": request or {}, "status": "CREATE_PENDING" if self.durations[kind]>0 else "ACTIVE",
+                  "creationTime": self.now, "lastModificationTime": self.now, "readyAt": self.now+timedelta(seconds=self.durations[kind]),
+                  "outcome": "CREATE_FAILED" if failed else "ACTIVE", "deleteChecksLeft": None}
+        self.resources[arn]=resource
+        self.created[kind]+=1
+        return resource
+
+    def _setStatus(self, resource, status):
+        resource["status"]=status
+        resource["lastModificationTime"]=self.now
+
+    # moves the simulated clock, resources change status and finished export jobs write their files
+    def advanceTo(self, now):
+        with self._lock:
+            self.now=now
+            for resource in list(self.resources.values()):
+                if (resource["status"].startswith("DELETE")):
+                    self._remove(resource)
+                elif (resource["status"] in ("CREATE_PENDING", "CREATE_IN_PROGRESS")):
+                    if (now>=resource["readyAt"]):
+                        self._complete(resource)
+                    elif (now>resource["creationTime"]):
+                        self._setStatus(resource, "CREATE_IN_PROGRESS")
+
+    def _complete(self, resource):
+        status=resource["outcome"]
+        if (status=="ACTIVE" and resource["kind"]=="datasetImportJob"):
+            bucket, key=parseS3Url(resource["request"]["DataSource"]["S3Config"]["Path"])
+            try:
+                self.s3Client.head_object(Bucket=bucket, Key=key)
+            except ClientError:
+                status="CREATE_FAILED"
+        if (status=="ACTIVE" and resource["kind"]=="forecastExportJob"):
+            self._writeExport(resource)
+        self._setStatus(resource, status)
+
+    def _remove(self, resource):
+        del self.resources[resource["arn"]]
+        self.deleted[resource["kind"]]+=1
+
+
+    # list operations, one call per page like the real paginators
+    def _summary(self, resource):
+        typeName=KINDS[resource["kind"]][1]
+        summary={typeName+"Arn": resource["arn"], typeName+"Name": resource["name"],
+                 "CreationTime": resource["creationTime"], "LastModificationTime": resource["lastModificationTime"]}
+        request=resource["request"]
+        if (resource["kind"]=="dataset"):
+            summary.update(DatasetType=request["DatasetType"], Domain=request["Domain"])
+        if (resource["kind"] in ("datasetImportJob", "predictor", "forecast", "forecastExportJob")):
+            summary["Status"]=resource["status"]
+        if (resource["kind"]=="datasetImportJob"):
+            summary["DataSource"]=request["DataSource"]
+        if (resource["kind"] in ("predictor", "forecast")):
+            summary["DatasetGroupArn"]=resource["datasetGroupArn"]
+        if (resource["kind"]=="forecast"):
+            summary["PredictorArn"]=resource["parent"]
+        if (resource["kind"]=="forecastExportJob"):
+            summary["Destination"]=request["Destination"]
+        return summary
+
+    def _pages(self, operation):
+        kind=LIST_OPERATIONS[operation]
+        with self._lock:
+            summaries=[self._summary(resource) for resource in self.resources.values() if resource["kind"]==kind]
+        resultKey=KINDS[kind][3]
+        for start in range(0, max(1, len(summaries)), self.pageSize):
+            self._count(operation)
+            yield {resultKey: summaries[start:start+self.pageSize]}
+
+    def get_paginator(self, operation):
+        if (operation not in LIST_OPERATIONS):
+            raise ValueError("no paginator for "+operation)
+        return FakePaginator(self, operation)
+
+
+    def create_dataset(self, DatasetName, Domain, DatasetType, Schema, DataFrequency=None, **kwargs):
+        self._count("create_dataset")
+        with self._lock:
+            request={"Domain": Domain, "DatasetType": DatasetType, "Schema": Schema, "DataFrequency": DataFrequency}
+            return {"DatasetArn": self._create("create_dataset", "dataset", DatasetName, request=request)["arn"]}
+
+    def create_dataset_group(self, DatasetGroupName, Domain, DatasetArns=(), **kwargs):
+        self._count("create_dataset_group")
+        with self._lock:
+            for datasetArn in DatasetArns:
+                self._get(datasetArn, "create_dataset_group")
+            request={"Domain": Domain, "DatasetArns": list(DatasetArns)}
+            return {"DatasetGroupArn": self._create("create_dataset_group", "datasetGroup", DatasetGroupName, request=request)["arn"]}
+
+    def create_dataset_import_job(self, DatasetImportJobName, DatasetArn, DataSource, **kwargs):
+        self._count("create_dataset_import_job")
+        with self._lock:
+            dataset=self._get(DatasetArn, "create_dataset_import_job")
+            request=dict(kwargs, DataSource=DataSource)
+            job=self._create("create_dataset_import_job", "datasetImportJob", DatasetImportJobName, DatasetArn, dataset["name"], request=request)
+            return {"DatasetImportJobArn": job["arn"]}
+
+    def create_predictor(self, PredictorName, ForecastHorizon, InputDataConfig, **kwargs):
+        self._count("create_predictor")
+        with self._lock:
+            datasetGroup=self._getActive(InputDataConfig["DatasetGroupArn"], "create_predictor")
+            # every dataset of the group needs a finished import
+            for datasetArn in datasetGroup["request"]["DatasetArns"]:
+                if (self._latestImportJob(datasetArn, "ACTIVE") is None):
+                    raise serviceError("ResourceInUseException", "no finished dataset import for "+datasetArn, "create_predictor")
+            request=dict(kwargs, ForecastHorizon=ForecastHorizon, InputDataConfig=InputDataConfig)
+            predictor=self._create("create_predictor", "predictor", PredictorName, datasetGroup["arn"], datasetGroupArn=datasetGroup["arn"], request=request)
+            return {"PredictorArn": predictor["arn"]}
+
+    def create_forecast(self, ForecastName, PredictorArn, ForecastTypes=("0.1", "0.5", "0.9"), **kwargs):
+        self._count("create_forecast")
+        with self._lock:
+            predictor=self._getActive(PredictorArn, "create_forecast")
+            forecast=self._create("create_forecast", "forecast", ForecastName, PredictorArn, datasetGroupArn=predictor["datasetGroupArn"],
+                                  request={"ForecastTypes": list(ForecastTypes)})
+            return {"ForecastArn": forecast["arn"]}
+
+    def create_forecast_export_job(self, ForecastExportJobName, ForecastArn, Destination, **kwargs):
+        self._count("create_forecast_export_job")
+        with self._lock:
+            forecast=self._getActive(ForecastArn, "create_forecast_export_job")
+            job=self._create("create_forecast_export_job", "forecastExportJob", ForecastExportJobName, ForecastArn, forecast["name"],
+                             datasetGroupArn=forecast["datasetGroupArn"], request={"Destination": Destination})
+            return {"ForecastExportJobArn": job["arn"]}
+
+
+    # a deleted resource is gone after deleteChecks describe calls, or once the simulated clock moves on
+    def _describe(self, operation, arn):
+        self._count(operation)
+        with self._lock:
+            resource=self._get(arn, operation)
+            if (resource["deleteChecksLeft"] is not None):
+                resource["deleteChecksLeft"]-=1
+                if (resource["deleteChecksLeft"]<=0):
+                    self._remove(resource)
+                    raise serviceError("ResourceNotFoundException", "No resource found "+arn, operation)
+                self._setStatus(resource, "DELETE_IN_PROGRESS")
+            description=self._summary(resource)
+            description["Status"]=resource["status"]
+            if (resource["kind"]=="datasetGroup"):
+                description["DatasetArns"]=list(resource["request"]["DatasetArns"])
+            return description
+
+    def describe_dataset_group(self, DatasetGroupArn):
+        return self._describe("describe_dataset_group", DatasetGroupArn)
+
+    def describe_dataset(self, DatasetArn):
+        return self._describe("describe_dataset", DatasetArn)
+
+    def describe_dataset_import_job(self, DatasetImportJobArn):
+        return self._describe("describe_dataset_import_job", DatasetImportJobArn)
+
+    def describe_predictor(self, PredictorArn):
+        return self._describe("describe_predictor", PredictorArn)
+
+    def describe_forecast(self, ForecastArn):
+        return self._describe("describe_forecast", ForecastArn)
+
+    def describe_forecast_export_job(self, ForecastExportJobArn):
+        return self._describe("describe_forecast_export_job", ForecastExportJobArn)
+
+
+    # refused while the resource is being created or deleted, or while resources that depend on it exist
+    def _delete(self, operation, arn):
+        self._count(operation)
+        with self._lock:
+            resource=self._get(arn, operation)
+            if (resource["status"] not in ("ACTIVE", "CREATE_FAILED")):
+                raise serviceError("ResourceInUseException", arn+" is in status "+resource["status"], operation)
+            if (any(child["parent"]==arn for child in self.resources.values())):
+                raise serviceError("ResourceInUseException", arn+" has dependent resources", operation)
+            self._setStatus(resource, "DELETE_PENDING")
+            resource["deleteChecksLeft"]=self.deleteChecks
+            return {}
+
+    def delete_dataset_group(self, DatasetGroupArn):
+        return self._delete("delete_dataset_group", DatasetGroupArn)
+
+    def delete_dataset(self, DatasetArn):
+        return self._delete("delete_dataset", DatasetArn)
+
+    def delete_dataset_import_job(self, DatasetImportJobArn):
+        return self._delete("delete_dataset_import_job", DatasetImportJobArn)
+
+    def delete_predictor(self, PredictorArn):
+        return self._delete("delete_predictor", PredictorArn)
+
+    def delete_forecast(self, ForecastArn):
+        return self._delete("delete_forecast", ForecastArn)
+
+    def delete_forecast_export_job(self, ForecastExportJobArn):
+        return self._delete("delete_forecast_export_job", ForecastExportJobArn)
+
+
+    def _latestImportJob(self, datasetArn, status):
+        jobs=[resource for resource in self.resources.values() if resource["kind"]=="datasetImportJob" and resource["parent"]==datasetArn and resource["status"]==status]
+        return max(jobs, key=lambda job: job["creationTime"]) if len(jobs)>0 else None
+
+    # {item: last known target value} and the last day of the target data of a dataset group
+    def _readTargetHistory(self, datasetGroupArn):
+        datasetGroup=self.resources[datasetGroupArn]
+        for datasetArn in datasetGroup["request"]["DatasetArns"]:
+            dataset=self.resources.get(datasetArn)
+            if (dataset is None or dataset["request"]["DatasetType"]!="TARGET_TIME_SERIES"):
+                continue
+            job=self._latestImportJob(datasetArn, "ACTIVE")
+            if (job is None):
+                break
+            bucket, key=parseS3Url(job["request"]["DataSource"]["S3Config"]["Path"])
+            body=self.s3Client.get_object(Bucket=bucket, Key=key)["Body"].read()
+            return parseTargetRows(readRows(key, body))
+        return {}, None
+
+    def _writeExport(self, job):
+        forecast=self.resources[job["parent"]]
+        predictor=self.resources[forecast["parent"]]
+        lastValues, lastDay=self._readTargetHistory(forecast["datasetGroupArn"])
+        if (lastDay is None):
+            return
+        quantiles=[forecastType if forecastType=="mean" else "p"+str(int(round(float(forecastType)*100))) for forecastType in forecast["request"]["ForecastTypes"]]
+        horizon=predictor["request"]["ForecastHorizon"]
+        shards=[io.StringIO() for _ in range(max(1, self.exportShards))]
+        writers=[csv.writer(shard) for shard in shards]
+        for writer in writers:
+            writer.writerow(["item_id", "date"]+quantiles)
+        # naive forecast around the last known value, item ids lower case like a real export
+        for i, (item, lastValue) in enumerate(sorted(lastValues.items())):
+            for day in range(1, horizon+1):
+                median=lastValue*(1+self.random.gauss(0, 0.05))
+                row=[item.lower(), (lastDay+timedelta(days=day)).strftime("%Y-%m-%dT00:00:00Z")]
+                for quantile in quantiles:
+                    spread=0 if quantile=="mean" else (int(quantile[1:])-50)/250.0
+                    row.append(str(round(median*(1+spread), 4)))
+                writers[i%len(writers)].writerow(row)
+        bucket, prefix=parseS3Url(job["request"]["Destination"]["S3Config"]["Path"])
+        stamp=self.now.strftime("%Y-%m-%dT%H-%M-%SZ")
+        for i, shard in enumerate(shards):
+            self.s3Client.put_object(Bucket=bucket, Key=prefix+"/"+job["name"]+"_"+stamp+"_part"+str(i)+".csv", Body=shard.getvalue().encode("utf-8"))
+        self.s3Client.put_object(Bucket=bucket, Key=prefix+"/_SUCCESS", Body=b"")
+        self.exportedObjects+=len(shards)+1
+
+    def datasetGroupNames(self):
+        with self._lock:
+            return sorted(resource["name"] for resource in self.resources.values() if resource["kind"]=="datasetGroup")
+
+
+# rows of a dataset file
+def readRows(key, body):
+    return csv.reader(io.StringIO(body.decode("utf-8")))
+
+def parseTargetRows(rows):
+    lastValues={}
+    lastDay=None
+    for row in rows:
+        day=datetime.strptime(str(row[0])[:10], "%Y-%m-%d").date()
+        lastDay=day if lastDay is None or day>lastDay else lastDay
+        if (row[2] not in ("", None) and not (isinstance(row[2], float) and math.isnan(row[2]))):
+            lastValues[row[1]]=float(row[2])
+        else:
+            lastValues.setdefault(row[1], 0.0)
+    return lastValues, lastDay
+
+
+class CapturingCloudWatch(object):
+
+    def __init__(self, counter=None):
+        self.counter=counter
+        self.datums=[]
+        self._lock=threading.Lock()
+
+    def _count(self, operation):
+        if (self.counter is not None):
+            self.counter.count("cloudwatch", operation)
+
+    # same limits as the API, so batching mistakes fail here too
+    def put_metric_data(self, Namespace, MetricData):
+        self._count("put_metric_data")
+        if (len(MetricData)>MAX_DATUMS_PER_CALL):
+            raise serviceError("InvalidParameterValue", "The collection MetricData must not have a size greater than "+str(MAX_DATUMS_PER_CALL), "PutMetricData")
+        for datum in MetricData:
+            if (len(datum.get("Values", []))>MAX_VALUES_PER_DATUM):
+                raise serviceError("InvalidParameterValue", "The collection Values must not have a size greater than "+str(MAX_VALUES_PER_DATUM), "PutMetricData")
+        with self._lock:
+            self.datums.extend((Namespace, datum) for datum in MetricData)
+        return {}
+
+    def get_metric_statistics(self, Namespace, MetricName, StartTime, EndTime, Period, Statistics=("Average",), Dimensions=(), **kwargs):
+        self._count("get_metric_statistics")
+        # datums match on the exact dimension set, like CloudWatch
+        dimensions=sorted((dimension["Name"], str(dimension["Value"])) for dimension in Dimensions)
+        startTime=toUtc(StartTime)
+        endTime=toUtc(EndTime)
+        periods={}
+        with self._lock:
+            datums=list(self.datums)
+        for namespace, datum in datums:
+            if (namespace!=Namespace or datum["MetricName"]!=MetricName or sorted((dimension["Name"], str(dimension["Value"])) for dimension in datum.get("Dimensions", []))!=dimensions):
+                continue
+            timestamp=toUtc(datum["Timestamp"])
+            if (timestamp<startTime or timestamp>=endTime):
+                continue
+            periodStart=startTime+timedelta(seconds=Period*int((timestamp-startTime).total_seconds()//Period))
+            total, count, minimum, maximum=datumStatistics(datum)
+            if (count==0):
+                continue
+            period=periods.setdefault(periodStart, [0.0, 0.0, minimum, maximum])
+            period[0]+=total
+            period[1]+=count
+            period[2]=min(period[2], minimum)
+            period[3]=max(period[3], maximum)
+        datapoints=[]
+        for periodStart, (total, count, minimum, maximum) in sorted(periods.items()):
+            datapoint={"Timestamp": periodStart, "Unit": "None"}
+            values={"Average": total/count, "Sum": total, "SampleCount": count, "Minimum": minimum, "Maximum": maximum}
+            for statistic in Statistics:
+                datapoint[statistic]=values[statistic]
+            datapoints.append(datapoint)
+        return {"Label": MetricName, "Datapoints": datapoints}
+
+    def metricNames(self):
+        with self._lock:
+            return sorted(set(datum["MetricName"] for _, datum in self.datums))
+
+# (sum, sample count, min, max) of a Value, Values/Counts or StatisticValues datum
+def datumStatistics(datum):
+    if ("StatisticValues" in datum):
+        statistics=datum["StatisticValues"]
+        return statistics["Sum"], statistics["SampleCount"], statistics["Minimum"], statistics["Maximum"]
+    if ("Values" in datum):
+        values=datum["Values"]
+        counts=datum.get("Counts", [1]*len(values))
+        if (len(values)==0):
+            return 0.0, 0, 0.0, 0.0
+        return sum(value*count for value, count in zip(values, counts)), sum(counts), min(values), max(values)
+    return datum["Value"], 1, datum["Value"], datum["Value"]
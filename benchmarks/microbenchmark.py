@@ -0,0 +1,150 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+#
+# micro benchmark of the per row / per item-day operations, the previous implementation against keycodec and the batched store loading
+#
+#   python benchmarks/microbenchmark.py --rows 200000 --items 500
+#
+import os
+import sys
+import json
+import random
+import argparse
+import timeit
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+
+REPO_ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "common"))
+
+import numpy as np
+import keycodec
+from timeseriesstore import TimeSeriesStore, RowBatch, formatValue, formatValues
+
+
+def makeRows(numOfRows, numOfItems, numOfDays, seed=1):
+    rnd=random.Random(seed)
+    startDay=date(2020, 1, 1)
+    days=[startDay+timedelta(days=d) for d in range(numOfDays)]
+    rows=[]
+    for _ in range(numOfRows):
+        day=rnd.choice(days)
+        rows.append((day.strftime("%Y%m%d"), day.strftime("%Y-%m-%dT00:00:00Z"), "s"+str(rnd.randrange(numOfItems)).zfill(4), rnd.randint(0, 100000)))
+    return days, rows
+
+
+def timeCase(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def benchmarkCases(args):
+    days, rows=makeRows(args.rows, args.items, args.days)
+    compactDates=[row[0] for row in rows]
+    exportDates=[row[1] for row in rows]
+    items=[row[2] for row in rows]
+    values=[float(row[3]) for row in rows]
+    dayValues=np.array([values[:args.items] for _ in range(1)]).reshape(-1)
+    dayValues[::17]=np.nan
+
+    def strptimeParse():
+        return [datetime.strptime(text[0:4]+"-"+text[4:6]+"-"+text[6:], "%Y-%m-%d").date().toordinal() for text in compactDates]
+    def dictCachedStrptime():
+        cache={}
+        result=[]
+        for text in compactDates:
+            ordinal=cache.get(text)
+            if (ordinal is None):
+                ordinal=datetime.strptime(text[0:4]+"-"+text[4:6]+"-"+text[6:], "%Y-%m-%d").date().toordinal()
+                cache[text]=ordinal
+            result.append(ordinal)
+        return result
+    def codecParse():
+        dayOrdinals=keycodec.DayOrdinals()
+        return [dayOrdinals[text] for text in compactDates]
+
+    ordinals=[day.toordinal() for day in days]*max(1, args.items//10)
+    def strftimeRender():
+        return [date.fromordinal(ordinal).strftime("%Y-%m-%d") for ordinal in ordinals]
+    def codecRender():
+        dayStrings=keycodec.DayStrings()
+        return [dayStrings[ordinal] for ordinal in ordinals]
+
+    def formatPerValue():
+        return [formatValue(value) for value in dayValues.tolist()]
+    def formatVectorised():
+        return formatValues(dayValues)
+
+    def storePerRow():
+        store=TimeSeriesStore(["value"])
+        for ordinal, item, value in zip(codecParse(), items, values):
+            store.setValues(ordinal, item, (value,))
+        return store
+    def storeBatched():
+        dayOrdinals=keycodec.DayOrdinals()
+        batch=RowBatch(1)
+        for text, item, value in zip(compactDates, items, values):
+            batch.add(dayOrdinals[text], item, (value,))
+        store=TimeSeriesStore(["value"])
+        store.addRows(*batch.partial())
+        return store
+
+    def exportRowsPerRow():
+        store=TimeSeriesStore(["p50"])
+        cache={}
+        for text, item, value in zip(exportDates, items, values):
+            ordinal=cache.get(text)
+            if (ordinal is None):
+                ordinal=datetime.strptime(text[:10], "%Y-%m-%d").date().toordinal()
+                cache[text]=ordinal
+            store.setValues(ordinal, item.upper(), (value,))
+        return store
+    def exportRowsBatched():
+        dayOrdinals=keycodec.DayOrdinals()
+        batch=RowBatch(1)
+        for text, item, value in zip(exportDates, items, values):
+            batch.add(dayOrdinals[text], item.upper(), (value,))
+        store=TimeSeriesStore(["p50"])
+        store.addRows(*batch.partial())
+        return store
+
+    assert strptimeParse()==codecParse()
+    assert strftimeRender()==codecRender()
+    assert formatPerValue()==formatVectorised()
+    assert storePerRow().items==storeBatched().items
+
+    return [
+        ("parse raw date (per row strptime)", len(rows), strptimeParse, codecParse),
+        ("parse raw date (dict cached strptime)", len(rows), dictCachedStrptime, codecParse),
+        ("render date string", len(ordinals), strftimeRender, codecRender),
+        ("format day values", len(dayValues), formatPerValue, formatVectorised),
+        ("raw rows into store", len(rows), storePerRow, storeBatched),
+        ("forecast export rows into store", len(rows), exportRowsPerRow, exportRowsBatched),
+    ]
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="micro benchmark of date/key handling and row loading")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args=parser.parse_args(argv)
+
+    results=[]
+    print("%-40s %10s %12s %12s %9s" % ("case", "n", "before(s)", "after(s)", "speedup"))
+    for name, n, before, after in benchmarkCases(args):
+        beforeSeconds=timeCase(before, args.repeat)
+        afterSeconds=timeCase(after, args.repeat)
+        results.append({"case": name, "n": n, "beforeSeconds": round(beforeSeconds, 5), "afterSeconds": round(afterSeconds, 5),
+                        "speedup": round(beforeSeconds/afterSeconds, 2) if afterSeconds>0 else None})
+        print("%-40s %10d %12.4f %12.4f %8.1fx" % (name, n, beforeSeconds, afterSeconds, beforeSeconds/afterSeconds if afterSeconds>0 else 0))
+    if (args.json):
+        with open(args.json, "w") as outputFile:
+            json.dump({"parameters": vars(args), "results": results}, outputFile, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
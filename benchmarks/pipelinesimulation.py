@@ -0,0 +1,338 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+#
+# replays N simulated days of the whole pipeline offline, every scheduled lambda once a day in pipeline order
+#   RawDataProcesser -> createForecastDataSetGroup (SQS event of the new DatasetGroups files) -> trainDefaultPredictor
+#   -> generateDefaultForecast -> generateForecastExport -> forecastMetrics -> deleteExpiredForecast
+# against moto S3, a fake Forecast service and a capturing CloudWatch (see localservices.py), and reports the API calls
+# and wall time of every stage; used as regression and performance gate for the pipeline
+#
+#   pip install -r benchmarks/requirements.txt
+#   python benchmarks/pipelinesimulation.py --days 10 --items 50 --json run.json
+#   python benchmarks/pipelinesimulation.py --days 10 --items 50 --baseline run.json
+#
+# the exit code is 1 when a pipeline check fails, or when a stage makes more API calls than the baseline
+# or is slower than the baseline by more than --tolerance
+import os
+import io
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+import contextlib
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from urllib.parse import quote
+
+import syntheticdata
+from benchmark import REPO_ROOT, loadLambdaModule, peakRssMB
+from localservices import ApiCallCounter, FakeForecast, CapturingCloudWatch
+
+BUCKET="forecast-simulation-bucket"
+RAW_BUCKET="covid19-lake"
+RAW_KEY="rearc-covid-19-testing-data/csv/states_daily/states_daily.csv"
+NAMESPACE="ForecastSimulation"
+SQS_BATCH_SIZE=10
+
+# (stage, lambda folder, handler module, hour of the simulated day, lambda timeout in seconds)
+# the default Forecast durations (localservices.DEFAULT_DURATIONS) let one dataset group go from import to export in one day
+STAGES=[
+    ("RawDataProcesser", "rawdataprocessor", "RawDataProcesser", 0, 180),
+    ("createForecastDataSetGroup", "createForecastDataSetGroup", "createForecastDataSetGroup", 0.25, 60),
+    ("trainDefaultPredictor", "trainDefaultPredictor", "trainDefaultPredictor", 2, 180),
+    ("generateDefaultForecast", "generateDefaultForecast", "generateDefaultForecast", 9, 180),
+    ("generateForecastExport", "generateForecastExport", "generateForecastExport", 12, 180),
+    ("forecastMetrics", "forecastMetrics", "forecastMetrics", 14, 30),
+    ("deleteExpiredForecast", "deleteExpiredForecast", "deleteExpiredForecast", 15, 900),
+]
+
+
+class SimulatedContext(object):
+
+    def __init__(self, functionName, timeoutSeconds):
+        self.function_name=functionName
+        self.deadline=time.perf_counter()+timeoutSeconds
+
+    def get_remaining_time_in_millis(self):
+        return max(0, int((self.deadline-time.perf_counter())*1000))
+
+
+# ERROR records per stage, the handlers log and continue on failures
+class ErrorCounter(logging.Handler):
+
+    def __init__(self, counter):
+        logging.Handler.__init__(self, logging.ERROR)
+        self.counter=counter
+        self.errors=defaultdict(list)
+
+    def emit(self, record):
+        self.errors[self.counter.stage].append(record.getMessage())
+
+
+def setupEnvironment(args):
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+    os.environ["S3BucketName"]=BUCKET
+    os.environ["MetricsNameSpace"]=NAMESPACE
+    os.environ["ForecastExecutionRole"]="arn:aws:iam::123456789012:role/ForecastSimulationRole"
+    os.environ["NumberOfForecastsToKeep"]=str(args.keep)
+    os.environ["KeepBestByAccuracy"]=str(args.keep_best)
+    os.environ["IncrementalMode"]="true" if args.incremental else "false"
+    os.environ["MetricsOutput"]="api"
+    # shard processes wouldn't see the in-process S3
+    os.environ["IngestionShards"]="1"
+    sys.path.insert(0, os.path.join(REPO_ROOT, "common"))
+
+
+def uploadModelConfig(s3Client, horizon):
+    with open(os.path.join(REPO_ROOT, "forecast-model-config.json")) as configFile:
+        config=json.load(configFile)
+    for model in config["models"]:
+        model["preditor"]["ForecastHorizon"]=horizon
+    s3Client.put_object(Bucket=BUCKET, Key="forecast-model-config.json", Body=json.dumps(config).encode("utf-8"))
+
+# the raw file of a day holds every row up to the day before (newest first, like states_daily.csv)
+def uploadRawData(s3Client, rawRows, day):
+    lastDay=(day-timedelta(days=1)).strftime("%Y%m%d")
+    output=io.StringIO()
+    writer=csv.writer(output)
+    writer.writerow(syntheticdata.RAW_HEADER)
+    writer.writerows(row for row in rawRows if row[0]<=lastDay)
+    s3Client.put_object(Bucket=RAW_BUCKET, Key=RAW_KEY, Body=output.getvalue().encode("utf-8"))
+
+# S3 notification -> SNS -> SQS records of the DatasetGroups files written since the last call
+def datasetGroupEvents(s3Client, seenETags):
+    records=[]
+    for page in s3Client.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix="DatasetGroups/"):
+        for content in page.get("Contents", []):
+            if (seenETags.get(content["Key"])==content["ETag"]):
+                continue
+            seenETags[content["Key"]]=content["ETag"]
+            s3Event={"Records": [{"eventSource": "aws:s3", "eventName": "ObjectCreated:Put",
+                                  "s3": {"bucket": {"name": BUCKET}, "object": {"key": quote(content["Key"], safe="/")}}}]}
+            records.append({"messageId": "msg-"+str(len(seenETags))+"-"+str(len(records)),
+                            "body": json.dumps({"Type": "Notification", "Message": json.dumps(s3Event)})})
+    return [{"Records": records[start:start+SQS_BATCH_SIZE]} for start in range(0, len(records), SQS_BATCH_SIZE)]
+
+
+class Simulation(object):
+
+    def __init__(self, args, s3Client, counter, forecast, cloudwatch, handlers):
+        self.args=args
+        self.s3Client=s3Client
+        self.counter=counter
+        self.forecast=forecast
+        self.cloudwatch=cloudwatch
+        self.handlers=handlers
+        self.errorCounter=ErrorCounter(counter)
+        logging.getLogger().addHandler(self.errorCounter)
+        self.seenETags={}
+        self.results={stage: {"invocations": 0, "seconds": 0.0, "maxSeconds": 0.0, "failures": 0, "spans": {}, "counters": {}} for stage, _, _, _, _ in STAGES}
+        self.days=[]
+
+    def invoke(self, stage, event, timeoutSeconds):
+        module=self.handlers[stage]
+        context=SimulatedContext("sam_forecast_"+stage, min(timeoutSeconds, self.args.stage_timeout))
+        output=io.StringIO()
+        self.counter.stage=stage
+        start=time.perf_counter()
+        try:
+            # the instrumentation summary (and EMF lines) go to stdout in lambda
+            with contextlib.redirect_stdout(output):
+                module.onEventHandler(event, context)
+        except Exception as e:
+            self.results[stage]["failures"]+=1
+            self.errorCounter.errors[stage].append(stage+" raised "+repr(e))
+        finally:
+            elapsed=time.perf_counter()-start
+            self.counter.stage=None
+        result=self.results[stage]
+        result["invocations"]+=1
+        result["seconds"]+=elapsed
+        result["maxSeconds"]=max(result["maxSeconds"], elapsed)
+        self.addInstrumentation(result, output.getvalue())
+
+    # spans and counters of the instrumentation summaries, summed over the invocations of the stage
+    def addInstrumentation(self, result, output):
+        for line in output.splitlines():
+            if (not line.startswith('{"instrumentation"')):
+                continue
+            summary=json.loads(line)["instrumentation"]
+            for name, entry in summary["spans"].items():
+                total=result["spans"].setdefault(name, {"count": 0, "ms": 0.0})
+                total["count"]+=entry["count"]
+                total["ms"]=round(total["ms"]+entry["ms"], 2)
+            for name, value in summary["counters"].items():
+                result["counters"][name]=result["counters"].get(name, 0)+value
+
+    def runDay(self, day, rawRows):
+        dayStart=datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+        uploadRawData(self.s3Client, rawRows, day)
+        datumsBefore=len(self.cloudwatch.datums)
+        for stage, _, _, hour, timeoutSeconds in STAGES:
+            self.forecast.advanceTo(dayStart+timedelta(hours=hour))
+            if (stage=="createForecastDataSetGroup"):
+                for event in datasetGroupEvents(self.s3Client, self.seenETags):
+                    self.invoke(stage, event, timeoutSeconds)
+            else:
+                self.invoke(stage, {}, timeoutSeconds)
+        self.forecast.advanceTo(dayStart+timedelta(hours=24))
+        summary={"day": day.isoformat(), "datasetGroups": len(self.forecast.datasetGroupNames()),
+                 "exports": self.forecast.created["forecastExportJob"], "metricDatums": len(self.cloudwatch.datums)-datumsBefore}
+        self.days.append(summary)
+        return summary
+
+    def run(self):
+        lastDay=self.args.end
+        firstDay=lastDay-timedelta(days=self.args.days-1)
+        rawRows=list(syntheticdata.generateRawRows(self.args.items, self.args.history+self.args.days, lastDay, self.args.missing_rate, self.args.seed))
+        for i in range(self.args.days):
+            summary=self.runDay(firstDay+timedelta(days=i), rawRows)
+            print("day "+summary["day"]+": dataset groups="+str(summary["datasetGroups"])+", exports="+str(summary["exports"])
+                  +", metric datums="+str(summary["metricDatums"]))
+        return self.report()
+
+    # what a healthy run has to show at the end
+    def checks(self):
+        args=self.args
+        errors=sum(len(messages) for messages in self.errorCounter.errors.values())
+        checks=[("a dataset group per day", self.forecast.created["datasetGroup"]==args.days, str(self.forecast.created["datasetGroup"])+" created")]
+        # injected Forecast failures are logged as errors by the handlers
+        if (args.failure_rate==0):
+            checks.append(("no errors logged", errors==0, str(errors)+" error(s)"))
+        # the export of day d is evaluated once the actuals of its horizon arrived, on day d+horizon
+        if (args.days>args.horizon and args.failure_rate==0):
+            checks.append(("exports evaluated", len(self.cloudwatch.datums)>0, str(len(self.cloudwatch.datums))+" metric datum(s)"))
+            remaining=len(self.forecast.datasetGroupNames())
+            checks.append(("expired dataset groups deleted", remaining<=args.keep+args.keep_best, str(remaining)+" remaining"))
+        return [{"check": name, "passed": bool(passed), "detail": detail} for name, passed, detail in checks]
+
+    def report(self):
+        stages={}
+        for stage, _, _, _, _ in STAGES:
+            result=dict(self.results[stage])
+            result["seconds"]=round(result["seconds"], 4)
+            result["maxSeconds"]=round(result["maxSeconds"], 4)
+            result["apiCalls"]=self.counter.byService(stage)
+            result["operations"]=self.counter.byOperation(stage)
+            result["errors"]=self.errorCounter.errors.get(stage, [])
+            stages[stage]=result
+        return {"parameters": {name: (value.isoformat() if isinstance(value, date) else value) for name, value in vars(self.args).items() if name not in ("json", "baseline")},
+                "stages": stages, "days": self.days, "checks": self.checks(),
+                "forecast": {"created": dict(self.forecast.created), "deleted": dict(self.forecast.deleted), "exportedObjects": self.forecast.exportedObjects},
+                "cloudwatch": {"datums": len(self.cloudwatch.datums), "metrics": self.cloudwatch.metricNames()},
+                "peakRssMB": round(peakRssMB(), 1)}
+
+
+def totalCalls(stageResult):
+    return sum(stageResult["apiCalls"].values())
+
+# [(stage, problem)] of the stages worse than the baseline run
+def compareWithBaseline(report, baseline, tolerance, noiseSeconds=0.05):
+    regressions=[]
+    for stage, result in report["stages"].items():
+        base=baseline["stages"].get(stage)
+        if (base is None):
+            continue
+        if (totalCalls(result)>totalCalls(base)):
+            regressions.append((stage, "api calls "+str(totalCalls(base))+" -> "+str(totalCalls(result))))
+        if (result["seconds"]>base["seconds"]*(1+tolerance) and result["seconds"]-base["seconds"]>noiseSeconds):
+            regressions.append((stage, "seconds "+str(base["seconds"])+" -> "+str(result["seconds"])))
+    return regressions
+
+def printReport(report, showOperations, showSpans):
+    print("%-28s %6s %10s %10s %8s %9s %11s %7s" % ("stage", "runs", "seconds", "max ms", "s3", "forecast", "cloudwatch", "errors"))
+    for stage, result in report["stages"].items():
+        calls=result["apiCalls"]
+        print("%-28s %6d %10.3f %10.1f %8d %9d %11d %7d" % (stage, result["invocations"], result["seconds"], result["maxSeconds"]*1000,
+              calls.get("s3", 0), calls.get("forecast", 0), calls.get("cloudwatch", 0), len(result["errors"])))
+        if (showOperations):
+            for operation, calls in result["operations"].items():
+                print("    %-50s %8d" % (operation, calls))
+        if (showSpans):
+            for name, entry in sorted(result["spans"].items(), key=lambda span: -span[1]["ms"]):
+                print("    span %-45s %8d %10.1f ms" % (name, entry["count"], entry["ms"]))
+            for name, value in sorted(result["counters"].items()):
+                print("    counter %-42s %10s" % (name, value))
+        for message in result["errors"][:3]:
+            print("    error: "+message.splitlines()[0][:160])
+    print("forecast resources created="+json.dumps(report["forecast"]["created"], sort_keys=True)+" deleted="+json.dumps(report["forecast"]["deleted"], sort_keys=True))
+    print("metric datums="+str(report["cloudwatch"]["datums"])+", peak RSS="+str(report["peakRssMB"])+" MB")
+    for check in report["checks"]:
+        print(("PASS " if check["passed"] else "FAIL ")+check["check"]+" ("+check["detail"]+")")
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description="replay simulated days through the whole pipeline against local stand-ins of S3, Forecast and CloudWatch")
+    parser.add_argument("--days", type=int, default=7, help="simulated days, every lambda runs once per day")
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--history", type=int, default=60, help="days of raw data before the first simulated day")
+    parser.add_argument("--horizon", type=int, default=2)
+    parser.add_argument("--end", type=lambda value: datetime.strptime(value, "%Y-%m-%d").date(), default=date.today(), help="last simulated day (yyyy-mm-dd)")
+    parser.add_argument("--keep", type=int, default=3, help="NumberOfForecastsToKeep")
+    parser.add_argument("--keep-best", type=int, default=0, help="KeepBestByAccuracy")
+    parser.add_argument("--incremental", action="store_true", help="IncrementalMode of the raw data processor")
+    parser.add_argument("--missing-rate", type=float, default=0.05)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of Forecast jobs ending in CREATE_FAILED")
+    parser.add_argument("--export-shards", type=int, default=2)
+    parser.add_argument("--page-size", type=int, default=100, help="page size of the Forecast list operations")
+    parser.add_argument("--stage-timeout", type=float, default=60, help="cap of the lambda timeouts, in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--operations", action="store_true", help="also print the API calls per operation")
+    parser.add_argument("--spans", action="store_true", help="also print the instrumentation spans and counters per stage")
+    parser.add_argument("--verbose", action="store_true", help="show the lambda logs")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown against the baseline (0.5 = 50%%)")
+    args=parser.parse_args(argv)
+
+    setupEnvironment(args)
+    logHandler=logging.StreamHandler()
+    logHandler.setLevel(logging.INFO if args.verbose else logging.CRITICAL)
+    logging.getLogger().addHandler(logHandler)
+    import boto3
+    import lambdaruntime
+    from moto import mock_aws
+
+    with mock_aws():
+        counter=ApiCallCounter()
+        # the stand-ins run on their own S3 client, so only the calls of the lambdas are counted
+        serviceS3Client=boto3.client("s3")
+        serviceS3Client.create_bucket(Bucket=BUCKET)
+        serviceS3Client.create_bucket(Bucket=RAW_BUCKET)
+        uploadModelConfig(serviceS3Client, args.horizon)
+        endTime=datetime(args.end.year, args.end.month, args.end.day, tzinfo=timezone.utc)
+        forecast=FakeForecast(serviceS3Client, counter, now=endTime-timedelta(days=args.days), exportShards=args.export_shards,
+                              failureRate=args.failure_rate, pageSize=args.page_size, seed=args.seed)
+        cloudwatch=CapturingCloudWatch(counter)
+        lambdaruntime.setClient("s3", counter.attach(lambdaruntime.newClient("s3"), "s3"))
+        lambdaruntime.setClient("forecast", forecast)
+        lambdaruntime.setClient("cloudwatch", cloudwatch)
+        handlers={stage: loadLambdaModule(folder, moduleName) for stage, folder, moduleName, _, _ in STAGES}
+
+        simulation=Simulation(args, serviceS3Client, counter, forecast, cloudwatch, handlers)
+        report=simulation.run()
+
+    printReport(report, args.operations, args.spans)
+    failed=[check for check in report["checks"] if not check["passed"]]
+    if (args.baseline):
+        with open(args.baseline) as baselineFile:
+            baseline=json.load(baselineFile)
+        for name in ("days", "items", "history", "horizon", "keep", "keep_best", "incremental", "failure_rate", "export_shards", "page_size"):
+            if (baseline["parameters"].get(name)!=report["parameters"][name]):
+                print("WARNING baseline ran with "+name+"="+str(baseline["parameters"].get(name))+", this run with "+str(report["parameters"][name]))
+        regressions=compareWithBaseline(report, baseline, args.tolerance)
+        for stage, problem in regressions:
+            print("REGRESSION "+stage+": "+problem)
+        failed.extend(regressions)
+    if (args.json):
+        with open(args.json, "w") as outputFile:
+            json.dump(report, outputFile, indent=2, default=str)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import csv
+import io
+import random
+from datetime import date
+from datetime import timedelta
+
+# synthetic inputs shaped like the real ones
+# raw data:        states_daily.csv (date as yyyymmdd, state, positive at column 2, totalTestResults at column 17), newest day first
+# forecast export: item_id,date,p10,p50,p90 shards as written by a Forecast export job (lower case item ids)
+
+RAW_HEADER=["date","state","positive","probableCases","negative","pending","totalTestResultsSource","totalTestResults_legacy",
+            "hospitalizedCurrently","hospitalizedCumulative","inIcuCurrently","inIcuCumulative","onVentilatorCurrently",
+            "onVentilatorCumulative","recovered","lastUpdateEt","dateModified","totalTestResults","checkTimeEt","death"]
+TARGET_COL=2
+RELATED_COL=17
+
+
+def itemName(i):
+    return "S"+str(i).zfill(4)
+
+def dateRange(endDate, numOfDays):
+    return [endDate-timedelta(days=d) for d in range(numOfDays-1, -1, -1)]
+
+
+def generateRawRows(numOfItems, numOfDays, endDate=date(2020, 10, 1), missingRate=0.05, seed=1):
+    rnd=random.Random(seed)
+    base=[rnd.randint(100, 100000) for _ in range(numOfItems)]
+    for day in reversed(dateRange(endDate, numOfDays)):
+        dayString=day.strftime("%Y%m%d")
+        for i in range(numOfItems):
+            if (rnd.random()<missingRate):
+                continue
+            row=[""]*len(RAW_HEADER)
+            row[0]=dayString
+            row[1]=itemName(i)
+            row[TARGET_COL]=str(base[i]+rnd.randint(0, 1000)) if rnd.random()>missingRate else ""
+            row[RELATED_COL]=str(base[i]*10+rnd.randint(0, 10000))
+            yield row
+
+def writeRawCsv(path, numOfItems, numOfDays, endDate=date(2020, 10, 1), missingRate=0.05, seed=1):
+    rowCount=0
+    with open(path, "w", newline="") as outputFile:
+        writer=csv.writer(outputFile)
+        writer.writerow(RAW_HEADER)
+        for row in generateRawRows(numOfItems, numOfDays, endDate, missingRate, seed):
+            writer.writerow(row)
+            rowCount+=1
+    return rowCount
+
+
+def quantileNames(numOfQuantiles):
+    if (numOfQuantiles==3):
+        return ["p10","p50","p90"]
+    step=100.0/(numOfQuantiles+1)
+    return ["p"+str(int(round(step*(i+1)))) for i in range(numOfQuantiles)]
+
+# returns [(shardName, csv bytes)], every shard has the header like a real export
+def generateForecastExport(numOfItems, startDate, horizon, quantiles, numOfShards=4, seed=2):
+    rnd=random.Random(seed)
+    shards=[io.StringIO() for _ in range(numOfShards)]
+    writers=[csv.writer(shard) for shard in shards]
+    for writer in writers:
+        writer.writerow(["item_id","date"]+quantiles)
+    for i in range(numOfItems):
+        writer=writers[i%numOfShards]
+        level=rnd.uniform(100, 100000)
+        for d in range(horizon):
+            day=startDate+timedelta(days=d)
+            values=sorted(level*rnd.uniform(0.8, 1.2) for _ in quantiles)
+            writer.writerow([itemName(i).lower(), day.strftime("%Y-%m-%dT00:00:00Z")]+["%.4f" % v for v in values])
+    return [("part"+str(i).zfill(5)+".csv", shard.getvalue().encode("utf-8")) for i, shard in enumerate(shards)]
+
+# daily real data files (covid-19-daily/target_<date>.csv layout), returns [(date, csv bytes)]
+def generateDailyActuals(numOfItems, startDate, numOfDays, seed=3):
+    rnd=random.Random(seed)
+    files=[]
+    for d in range(numOfDays):
+        day=startDate+timedelta(days=d)
+        output=io.StringIO()
+        writer=csv.writer(output)
+        for i in range(numOfItems):
+            writer.writerow([day.strftime("%Y-%m-%d"), itemName(i), rnd.randint(100, 100000)])
+        files.append((day, output.getvalue().encode("utf-8")))
+    return files
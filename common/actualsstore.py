@@ -0,0 +1,149 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import io
+import logging
+from datetime import date
+import numpy as np
+from timeseriesstore import TimeSeriesStore
+import keycodec
+import s3stream
+
+logger = logging.getLogger()
+
+# real target values for the model evaluation, written by rawdataprocessor and read by forecastMetrics
+#   covid-19-actuals/<yyyy-mm>.npz     one TimeSeriesStore per month (field "target", every item of the raw data)
+#   covid-19-actuals/manifest.json     {"dates": [yyyy-mm-dd, ...], "months": [yyyy-mm, ...]}
+# a forecast horizon is loaded with one GET per month it touches, availability is a set lookup per day
+# values follow the covid-19-daily files: every day of the raw data range, missing values are 0
+ACTUALS_PREFIX="covid-19-actuals/"
+MANIFEST_KEY=ACTUALS_PREFIX+"manifest.json"
+ACTUALS_FIELD="target"
+
+
+def monthOf(ordinal):
+    day=date.fromordinal(ordinal)
+    return "%04d-%02d" % (day.year, day.month)
+
+def partitionKey(month):
+    return ACTUALS_PREFIX+month+".npz"
+
+# inclusive ordinal range of a yyyy-mm month
+def monthRange(month):
+    year, monthNumber=int(month[0:4]), int(month[5:7])
+    nextMonth=date(year+1, 1, 1) if monthNumber==12 else date(year, monthNumber+1, 1)
+    return date(year, monthNumber, 1).toordinal(), nextMonth.toordinal()-1
+
+def monthsBetween(startOrdinal, endOrdinal):
+    months=[]
+    ordinal=startOrdinal
+    while (ordinal<=endOrdinal):
+        month=monthOf(ordinal)
+        months.append(month)
+        ordinal=monthRange(month)[1]+1
+    return months
+
+def readManifest(client, bucket):
+    try:
+        return s3stream.readJson(client, bucket, MANIFEST_KEY)
+    except client.exceptions.NoSuchKey:
+        return None
+
+
+# month partition from the raw data store, days without raw rows are 0 like in the daily files
+def buildMonthStore(rawData, fieldName, startOrdinal, endOrdinal):
+    block=rawData.getRange(startOrdinal, endOrdinal, fieldName, fill=0)
+    store=TimeSeriesStore([ACTUALS_FIELD])
+    for item in rawData.items:
+        store.addItem(item)
+    ordinals, cols=np.meshgrid(np.arange(startOrdinal, endOrdinal+1, dtype=np.int64), np.arange(rawData.numItems, dtype=np.int64), indexing="ij")
+    store.setRows(ordinals.ravel(), cols.ravel(), block.reshape(-1, 1))
+    return store
+
+# rewrites the month partitions from fromOrdinal to the end of the raw data, then the manifest
+# without a manifest yet, the whole raw data range is written
+def writePartitions(client, transfer, bucket, rawData, fieldName, fromOrdinal):
+    if (rawData.startOrdinal is None):
+        return []
+    manifest=readManifest(client, bucket)
+    if (manifest is None):
+        manifest={"dates": [], "months": []}
+        fromOrdinal=rawData.startOrdinal
+    fromOrdinal=max(fromOrdinal, rawData.startOrdinal)
+    months=monthsBetween(fromOrdinal, rawData.endOrdinal)
+    dates=set(manifest["dates"])
+    uploads=[]
+    for month in months:
+        monthStart, monthEnd=monthRange(month)
+        lo=max(monthStart, rawData.startOrdinal)
+        hi=min(monthEnd, rawData.endOrdinal)
+        body=io.BytesIO()
+        buildMonthStore(rawData, fieldName, lo, hi).save(body)
+        uploads.append((body.getvalue(), bucket, partitionKey(month)))
+        dates.update(keycodec.isoString(ordinal) for ordinal in range(lo, hi+1))
+    transfer.putObjects(uploads)
+    manifest["dates"]=sorted(dates)
+    manifest["months"]=sorted(set(manifest["months"]).union(months))
+    s3stream.writeJson(client, bucket, MANIFEST_KEY, manifest)
+    logger.info("actuals written for months="+",".join(months)+", available dates="+str(len(manifest["dates"])))
+    return months
+
+
+# read side, one instance per invocation: the manifest and the month partitions are fetched once
+class ActualsStore(object):
+
+    def __init__(self, client, bucket):
+        self.client=client
+        self.bucket=bucket
+        self._manifest=None
+        self._manifestLoaded=False
+        self._availableOrdinals=None
+        self._months={}
+
+    @property
+    def manifest(self):
+        if (not self._manifestLoaded):
+            self._manifest=readManifest(self.client, self.bucket)
+            self._manifestLoaded=True
+        return self._manifest
+
+    def exists(self):
+        return self.manifest is not None
+
+    def availableOrdinals(self):
+        if (self._availableOrdinals is None):
+            dates=[] if self.manifest is None else self.manifest["dates"]
+            self._availableOrdinals=set(keycodec.parseOrdinal(text) for text in dates)
+        return self._availableOrdinals
+
+    def hasRange(self, startOrdinal, endOrdinal):
+        available=self.availableOrdinals()
+        return all(ordinal in available for ordinal in range(startOrdinal, endOrdinal+1))
+
+    def _month(self, month):
+        if (month not in self._months):
+            try:
+                with s3stream.readObject(self.client, self.bucket, partitionKey(month)) as fileobj:
+                    self._months[month]=TimeSeriesStore.load(fileobj)
+            except self.client.exceptions.NoSuchKey:
+                self._months[month]=None
+        return self._months[month]
+
+    # [day, item] values for the given items (NaN for unknown items and unavailable days)
+    def getRange(self, items, startOrdinal, endOrdinal):
+        values=np.full((endOrdinal-startOrdinal+1, len(items)), np.nan)
+        for month in monthsBetween(startOrdinal, endOrdinal):
+            store=self._month(month)
+            if (store is None):
+                continue
+            monthStart, monthEnd=monthRange(month)
+            lo=max(monthStart, startOrdinal)
+            hi=min(monthEnd, endOrdinal)
+            cols=store.lookupItems(items)
+            known=cols>=0
+            block=store.getRange(lo, hi, ACTUALS_FIELD)
+            values[lo-startOrdinal:hi-startOrdinal+1, known]=block[:, cols[known]]
+        available=self.availableOrdinals()
+        for i, ordinal in enumerate(range(startOrdinal, endOrdinal+1)):
+            if (ordinal not in available):
+                values[i]=np.nan
+        return values
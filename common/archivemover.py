@@ -0,0 +1,96 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import logging
+import s3stream
+
+logger = logging.getLogger()
+
+# moves every object under a prefix to another prefix of the same bucket, resumable across invocations
+# progress is kept in a manifest next to the destination ("<destinationPrefix>/_ARCHIVE_MANIFEST.json"):
+#   copying    the key list (and the listed sizes) is fixed when the move starts, copied keys are recorded after every chunk
+#   deleting   every copy succeeded, the sources are deleted in delete_objects batches
+#   complete   nothing left to do, moving again is a no-op
+# an interrupted move restarts from its manifest, redoing at most one chunk of (idempotent) copies
+# copies are managed (multipart upload_part_copy above the threshold, so objects over 5 GB work) and run in parallel,
+# the listed sizes pick a single copy_object below the threshold without a HEAD per object
+MANIFEST_NAME="_ARCHIVE_MANIFEST.json"
+DEFAULT_CHUNK_SIZE=500
+STATUS_COPYING="copying"
+STATUS_DELETING="deleting"
+STATUS_COMPLETE="complete"
+
+
+def manifestKey(destinationPrefix):
+    return destinationPrefix.rstrip("/")+"/"+MANIFEST_NAME
+
+# [(key, size)]
+def listObjects(client, bucket, prefix):
+    objects=[]
+    paginator=client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        objects.extend((content["Key"], content["Size"]) for content in page.get("Contents", []))
+    return objects
+
+def listKeys(client, bucket, prefix):
+    return [key for key, size in listObjects(client, bucket, prefix)]
+
+def newManifest(client, bucket, sourcePrefix, destinationPrefix):
+    objects=listObjects(client, bucket, sourcePrefix)
+    return {"source": sourcePrefix, "destination": destinationPrefix, "status": STATUS_COPYING,
+            "keys": [key for key, size in objects], "sizes": [size for key, size in objects], "copied": []}
+
+def loadManifest(client, bucket, key):
+    try:
+        return s3stream.readJson(client, bucket, key)
+    except client.exceptions.NoSuchKey:
+        return None
+
+def destinationKey(key, sourcePrefix, destinationPrefix):
+    return destinationPrefix+key[len(sourcePrefix):]
+
+
+# returns True once the move is complete, False when shouldStop() asked to stop early (call again to resume)
+# lastKeys are deleted after all the other sources (e.g. the marker that triggers the move), so they survive an interruption
+def movePrefix(client, transfer, bucket, sourcePrefix, destinationPrefix, chunkSize=DEFAULT_CHUNK_SIZE, shouldStop=None, lastKeys=()):
+    progressKey=manifestKey(destinationPrefix)
+    manifest=loadManifest(client, bucket, progressKey)
+    if (manifest is None):
+        manifest=newManifest(client, bucket, sourcePrefix, destinationPrefix)
+        s3stream.writeJson(client, bucket, progressKey, manifest)
+        logger.info("archive started, "+str(len(manifest["keys"]))+" object(s) from "+sourcePrefix+" to "+destinationPrefix)
+    elif (manifest["status"]==STATUS_COMPLETE):
+        # new objects under a prefix that was moved before start a new move
+        manifest=newManifest(client, bucket, sourcePrefix, destinationPrefix)
+        if (len(manifest["keys"])==0):
+            return True
+        s3stream.writeJson(client, bucket, progressKey, manifest)
+    else:
+        logger.info("archive resumed in status="+manifest["status"]+", "+str(len(manifest["copied"]))+"/"+str(len(manifest["keys"]))+" copied, from "+sourcePrefix)
+
+    if (manifest["status"]==STATUS_COPYING):
+        copied=set(manifest["copied"])
+        # manifests written before the sizes were recorded copy with a HEAD per object
+        sizes=dict(zip(manifest["keys"], manifest.get("sizes", [])))
+        pending=[key for key in manifest["keys"] if key not in copied]
+        for start in range(0, len(pending), chunkSize):
+            if (shouldStop is not None and shouldStop()):
+                logger.info("archive interrupted after "+str(len(manifest["copied"]))+"/"+str(len(manifest["keys"]))+" copies, from "+sourcePrefix)
+                return False
+            chunk=pending[start:start+chunkSize]
+            transfer.copyObjects([(bucket, key, bucket, destinationKey(key, sourcePrefix, destinationPrefix), sizes.get(key)) for key in chunk])
+            manifest["copied"].extend(chunk)
+            s3stream.writeJson(client, bucket, progressKey, manifest)
+        manifest["status"]=STATUS_DELETING
+        s3stream.writeJson(client, bucket, progressKey, manifest)
+
+    # deleting a missing key succeeds, so a repeated delete phase is harmless
+    if (shouldStop is not None and shouldStop()):
+        return False
+    last=set(lastKeys)
+    transfer.deleteObjects(bucket, [key for key in manifest["keys"] if key not in last])
+    transfer.deleteObjects(bucket, [key for key in manifest["keys"] if key in last])
+    manifest["status"]=STATUS_COMPLETE
+    manifest["copied"]=[]
+    s3stream.writeJson(client, bucket, progressKey, manifest)
+    logger.info("archive complete, "+str(len(manifest["keys"]))+" object(s) moved from "+sourcePrefix+" to "+destinationPrefix)
+    return True
@@ -0,0 +1,93 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# parsed json configs kept across warm lambda invocations
+# within the TTL a cached config is returned without any S3 call, after it the config is revalidated
+# with a conditional GET (If-None-Match: ETag) and only downloaded again when it changed
+DEFAULT_TTL_SECONDS=int(os.environ.get('ConfigCacheTTLSeconds','300'))
+DEFAULT_MAX_ENTRIES=int(os.environ.get('ConfigCacheMaxEntries','128'))
+
+
+class ConfigCache(object):
+
+    def __init__(self, ttlSeconds=DEFAULT_TTL_SECONDS, maxEntries=DEFAULT_MAX_ENTRIES, clock=time.time):
+        self.ttlSeconds=ttlSeconds
+        self.maxEntries=maxEntries
+        self.clock=clock
+        self.hits=0
+        self.revalidations=0
+        self.downloads=0
+        self._entries=OrderedDict()
+        self._lock=threading.Lock()
+
+    def _fetch(self, client, bucket, key, etag):
+        try:
+            if (etag is None):
+                response=client.get_object(Bucket=bucket, Key=key)
+            else:
+                response=client.get_object(Bucket=bucket, Key=key, IfNoneMatch=etag)
+        except ClientError as e:
+            if (etag is not None and e.response.get("Error", {}).get("Code") in ("304", "NotModified")):
+                return None
+            raise
+        return response["ETag"], json.loads(response["Body"].read())
+
+    # returns a copy of the parsed config, callers are free to modify it
+    def get(self, client, bucket, key):
+        cacheKey=(bucket, key)
+        now=self.clock()
+        with self._lock:
+            entry=self._entries.get(cacheKey)
+            if (entry is not None):
+                self._entries.move_to_end(cacheKey)
+        if (entry is not None and now-entry["fetchedAt"]<self.ttlSeconds):
+            self.hits+=1
+            return copy.deepcopy(entry["config"])
+
+        fetched=self._fetch(client, bucket, key, None if entry is None else entry["etag"])
+        if (fetched is None):
+            self.revalidations+=1
+            entry["fetchedAt"]=now
+        else:
+            self.downloads+=1
+            entry={"etag": fetched[0], "config": fetched[1], "fetchedAt": now}
+            logger.debug("config loaded from bucket="+bucket+", key="+key+", etag="+fetched[0])
+        with self._lock:
+            self._entries[cacheKey]=entry
+            self._entries.move_to_end(cacheKey)
+            while (len(self._entries)>self.maxEntries):
+                self._entries.popitem(last=False)
+        return copy.deepcopy(entry["config"])
+
+    def invalidate(self, bucket=None, key=None):
+        with self._lock:
+            if (bucket is None):
+                self._entries.clear()
+            else:
+                self._entries.pop((bucket, key), None)
+
+
+# module level cache, lives as long as the lambda container
+_cache=ConfigCache()
+
+def loadConfig(client, bucket, key):
+    return _cache.get(client, bucket, key)
+
+def datasetGroupConfigKey(datasetGroupName):
+    return "DatasetGroups/"+datasetGroupName+"/config.json"
+
+def loadDatasetGroupConfig(client, bucket, datasetGroupName):
+    return _cache.get(client, bucket, datasetGroupConfigKey(datasetGroupName))
+
+def getCache():
+    return _cache
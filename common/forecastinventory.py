@@ -0,0 +1,140 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger()
+
+# one snapshot of the Forecast control plane per invocation
+# every resource type is paged through once, on first use, and indexed so handlers never list per dataset group
+# (list_* calls without pagination silently miss anything past the first page)
+
+RESOURCE_TYPES={
+    "datasetGroups": ("list_dataset_groups", "DatasetGroups"),
+    "datasets": ("list_datasets", "Datasets"),
+    "datasetImportJobs": ("list_dataset_import_jobs", "DatasetImportJobs"),
+    "predictors": ("list_predictors", "Predictors"),
+    "forecasts": ("list_forecasts", "Forecasts"),
+    "forecastExportJobs": ("list_forecast_export_jobs", "ForecastExportJobs"),
+}
+
+
+# arn:aws:forecast:<region>:<account>:<resource-type>/<name>[/<child name>] -> [name, child name]
+def arnNames(arn):
+    return arn.split(":", 5)[-1].split("/")[1:]
+
+
+class ForecastInventory(object):
+
+    def __init__(self, client):
+        self.client=client
+        self.apiCalls=0
+        self._resources={}
+        self._indexes={}
+
+    def _list(self, resourceType):
+        if (resourceType not in self._resources):
+            operation, resultKey=RESOURCE_TYPES[resourceType]
+            resources=[]
+            for page in self.client.get_paginator(operation).paginate():
+                self.apiCalls+=1
+                resources.extend(page[resultKey])
+            logger.debug("inventory loaded "+str(len(resources))+" "+resourceType)
+            self._resources[resourceType]=resources
+        return self._resources[resourceType]
+
+    # drop a resource type (and its indexes) after creating or deleting resources of that type
+    def invalidate(self, resourceType=None):
+        for name in ([resourceType] if resourceType else list(RESOURCE_TYPES)):
+            self._resources.pop(name, None)
+            for indexKey in [key for key in self._indexes if key[0]==name]:
+                del self._indexes[indexKey]
+
+    def _index(self, resourceType, keyFunction, unique=True):
+        indexKey=(resourceType, keyFunction.__name__, unique)
+        if (indexKey not in self._indexes):
+            if (unique):
+                index={}
+                for resource in self._list(resourceType):
+                    index[keyFunction(resource)]=resource
+            else:
+                index=defaultdict(list)
+                for resource in self._list(resourceType):
+                    index[keyFunction(resource)].append(resource)
+            self._indexes[indexKey]=index
+        return self._indexes[indexKey]
+
+    def datasetGroups(self):
+        return self._list("datasetGroups")
+
+    def datasets(self):
+        return self._list("datasets")
+
+    def predictors(self):
+        return self._list("predictors")
+
+    def forecasts(self):
+        return self._list("forecasts")
+
+    def datasetGroupByName(self, datasetGroupName):
+        return self._index("datasetGroups", datasetGroupNameKey).get(datasetGroupName)
+
+    def datasetGroupByArn(self, datasetGroupArn):
+        return self._index("datasetGroups", datasetGroupArnKey).get(datasetGroupArn)
+
+    def datasetByName(self, datasetName):
+        return self._index("datasets", datasetNameKey).get(datasetName)
+
+    def datasetByArn(self, datasetArn):
+        return self._index("datasets", datasetArnKey).get(datasetArn)
+
+    # import job summaries don't carry the DatasetArn, it is derived from the job arn (.../<datasetName>/<jobName>)
+    def datasetImportJobsByDataset(self, datasetArn):
+        return self._index("datasetImportJobs", importJobDatasetNameKey, unique=False).get(arnNames(datasetArn)[0], [])
+
+    def predictorsByDatasetGroup(self, datasetGroupArn):
+        return self._index("predictors", datasetGroupArnKey, unique=False).get(datasetGroupArn, [])
+
+    def predictorByName(self, predictorName):
+        return self._index("predictors", predictorNameKey).get(predictorName)
+
+    def forecastsByDatasetGroup(self, datasetGroupArn):
+        return self._index("forecasts", datasetGroupArnKey, unique=False).get(datasetGroupArn, [])
+
+    def forecastsByStatus(self, status):
+        return self._index("forecasts", statusKey, unique=False).get(status, [])
+
+    def forecastByName(self, forecastName):
+        return self._index("forecasts", forecastNameKey).get(forecastName)
+
+    # export job summaries don't carry the ForecastArn, it is derived from the job arn (.../<forecastName>/<jobName>)
+    def forecastExportJobsByForecast(self, forecastArn):
+        return self._index("forecastExportJobs", exportJobForecastNameKey, unique=False).get(arnNames(forecastArn)[0], [])
+
+
+def datasetGroupNameKey(resource):
+    return resource["DatasetGroupName"]
+
+def datasetGroupArnKey(resource):
+    return resource["DatasetGroupArn"]
+
+def datasetNameKey(resource):
+    return resource["DatasetName"]
+
+def datasetArnKey(resource):
+    return resource["DatasetArn"]
+
+def predictorNameKey(resource):
+    return resource["PredictorName"]
+
+def forecastNameKey(resource):
+    return resource["ForecastName"]
+
+def statusKey(resource):
+    return resource["Status"]
+
+def importJobDatasetNameKey(resource):
+    return arnNames(resource["DatasetImportJobArn"])[0]
+
+def exportJobForecastNameKey(resource):
+    return arnNames(resource["ForecastExportJobArn"])[0]
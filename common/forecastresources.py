@@ -0,0 +1,60 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import logging
+
+logger = logging.getLogger()
+
+# creation of the default predictor, forecast and export job of a dataset group, shared by the scheduled lambdas
+# (trainDefaultPredictor, generateDefaultForecast, generateForecastExport) and the pipelineOrchestrator
+# names: <dg>_Predictor, <dg>_Forecast, <forecast>_export, exported under s3://<bucket>/ForecastExports/<forecast>
+FORECAST_TYPES=["0.1", "0.5", "0.9"]
+
+
+def predictorName(datasetGroupName):
+    return datasetGroupName+"_Predictor"
+
+def forecastName(datasetGroupName):
+    return datasetGroupName+"_Forecast"
+
+def exportJobName(forecastName):
+    return forecastName+"_export"
+
+def exportPath(bucket, forecastName):
+    return "s3://"+bucket+"/ForecastExports/"+forecastName
+
+#https://docs.aws.amazon.com/forecast/latest/dg/related-time-series-datasets.html
+#https://docs.aws.amazon.com/forecast/latest/dg/API_FeaturizationConfig.html
+# Forecast doesn't support aggregations or filling missing values for related time series datasets as it does for target time series datasets.
+def createPredictor(client, datasetGroupArn, predictorName, config):
+    response = client.create_predictor(
+        PredictorName=predictorName,
+        ForecastHorizon=config["preditor"]["ForecastHorizon"],
+        PerformAutoML=True,
+        EvaluationParameters=config["preditor"]["EvaluationParameters"],
+        InputDataConfig={
+            'DatasetGroupArn': datasetGroupArn,
+            'SupplementaryFeatures': config["preditor"]["InputDataConfig"]["SupplementaryFeatures"]
+        },
+        FeaturizationConfig=config["preditor"]["FeaturizationConfig"]
+        )
+    logger.debug(response)
+    logger.info("triggerred Predictor training for predictor=" + predictorName)
+
+def createForecast(client, forecastName, predictorArn):
+    client.create_forecast(
+        ForecastName=forecastName,
+        PredictorArn=predictorArn,
+        ForecastTypes=FORECAST_TYPES
+    )
+    logger.info("for predictor with arn= " + predictorArn + ", triggered forecast creation, forecastName=" + forecastName)
+
+def createExportJob(client, jobName, forecastArn, exportPath, roleArn):
+    client.create_forecast_export_job(
+        ForecastExportJobName=jobName,
+        ForecastArn=forecastArn,
+        Destination={
+            'S3Config': {
+                'Path': exportPath,
+                'RoleArn': roleArn,
+            }})
+    logger.info("triggerred export job :" + jobName + ", forecastArn=" + forecastArn)
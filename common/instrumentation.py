@@ -0,0 +1,227 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import io
+import sys
+import json
+import time
+import logging
+import threading
+import functools
+from collections import defaultdict
+
+logger = logging.getLogger()
+
+# timing surface of one invocation, started and emitted by lambdaruntime.handler
+#   spans      with instrumentation.span("parse"): ... or @instrumentation.timed("upload"), time per name (summed over
+#              the threads that ran it, so parallel spans can add up to more than the invocation)
+#   counters   instrumentation.count("rows", n), e.g. rows and bytes
+#   api calls  every call of the lambdaruntime clients (botocore events), count/time/max/errors per service.operation,
+#              retries included
+# InstrumentationOutput selects how the summary leaves the function after every invocation:
+#   json  one structured JSON line on stdout (CloudWatch Logs Insights discovers the fields), the default
+#   emf   Embedded Metric Format line (metrics extracted by CloudWatch, no API call), both, or off
+# ProfileMode=cprofile and/or tracemalloc ("cprofile,tracemalloc") profiles the whole invocation, the top entries are
+# logged and the cProfile stats dumped to ProfileDumpDirectory (pstats/snakeviz); the profilers cost real time, keep it off
+OUTPUT_MODES=("off", "json", "emf", "both")
+PROFILE_MODES=("cprofile", "tracemalloc")
+InstrumentationOutput=os.environ.get('InstrumentationOutput','json').lower()
+ProfileMode=[mode for mode in os.environ.get('ProfileMode','').lower().replace(" ","").split(",") if mode in PROFILE_MODES]
+ProfileDumpDirectory=os.environ.get('ProfileDumpDirectory','/tmp')
+ProfileTopEntries=int(os.environ.get('ProfileTopEntries','25'))
+TRACEMALLOC_FRAMES=10
+# runtime metrics (stage timings, cold starts) stay apart from the accuracy metrics: <MetricsNameSpace>/Runtime by default
+RUNTIME_NAMESPACE=os.environ.get('RuntimeMetricsNameSpace', os.environ.get('MetricsNameSpace', 'ForecastLambda')+'/Runtime')
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.started=time.perf_counter()
+        # name -> [count, seconds, max seconds]
+        self.spans=defaultdict(lambda: [0, 0.0, 0.0])
+        self.counters=defaultdict(float)
+        # service.operation -> [count, seconds, max seconds, errors]
+        self.apiCalls=defaultdict(lambda: [0, 0.0, 0.0, 0])
+        self._lock=threading.Lock()
+
+    def addSpan(self, name, seconds):
+        with self._lock:
+            entry=self.spans[name]
+            entry[0]+=1
+            entry[1]+=seconds
+            entry[2]=max(entry[2], seconds)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name]+=value
+
+    def addApiCall(self, operation, seconds, failed):
+        with self._lock:
+            entry=self.apiCalls[operation]
+            entry[0]+=1
+            entry[1]+=seconds
+            entry[2]=max(entry[2], seconds)
+            entry[3]+=1 if failed else 0
+
+    def summary(self, functionName):
+        with self._lock:
+            return {"function": functionName, "durationMs": toMillis(time.perf_counter()-self.started),
+                    "spans": {name: {"count": count, "ms": toMillis(seconds), "maxMs": toMillis(maxSeconds)} for name, (count, seconds, maxSeconds) in sorted(self.spans.items())},
+                    "counters": {name: (int(value) if value==int(value) else value) for name, value in sorted(self.counters.items())},
+                    "apiCalls": {operation: {"count": count, "ms": toMillis(seconds), "maxMs": toMillis(maxSeconds), "errors": errors}
+                                 for operation, (count, seconds, maxSeconds, errors) in sorted(self.apiCalls.items())}}
+
+def toMillis(seconds):
+    return round(seconds*1000, 2)
+
+# recorder of the running invocation (warm invocations get a new one)
+_recorder=Recorder()
+
+
+class Span(object):
+
+    __slots__=("name", "start")
+
+    def __init__(self, name):
+        self.name=name
+
+    def __enter__(self):
+        self.start=time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        _recorder.addSpan(self.name, time.perf_counter()-self.start)
+        return False
+
+def span(name):
+    return Span(name)
+
+def timed(name=None):
+    def decorator(function):
+        spanName=name or function.__name__
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(spanName):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, value=1):
+    _recorder.count(name, value)
+
+
+# botocore event handlers, the request context is shared by the events of one call
+def beforeCall(model=None, context=None, **kwargs):
+    if (context is not None):
+        context["instrumentationStart"]=time.perf_counter()
+        context["instrumentationOperation"]=model.service_model.service_name+"."+model.name
+
+def afterCall(parsed=None, context=None, **kwargs):
+    start=None if context is None else context.pop("instrumentationStart", None)
+    if (start is not None):
+        _recorder.addApiCall(context["instrumentationOperation"], time.perf_counter()-start, isinstance(parsed, dict) and "Error" in parsed)
+
+def afterCallError(context=None, **kwargs):
+    start=None if context is None else context.pop("instrumentationStart", None)
+    if (start is not None):
+        _recorder.addApiCall(context["instrumentationOperation"], time.perf_counter()-start, True)
+
+def instrumentClient(client):
+    client.meta.events.register("before-call", beforeCall)
+    client.meta.events.register("after-call", afterCall)
+    client.meta.events.register("after-call-error", afterCallError)
+    return client
+
+
+class Profiler(object):
+
+    def __init__(self, modes, functionName):
+        self.modes=modes
+        self.functionName=functionName
+        self.profile=None
+
+    def start(self):
+        if ("tracemalloc" in self.modes):
+            import tracemalloc
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if ("cprofile" in self.modes):
+            import cProfile
+            self.profile=cProfile.Profile()
+            self.profile.enable()
+
+    # the allocation snapshot is taken before the cProfile report allocates anything
+    def stop(self):
+        if (self.profile is not None):
+            self.profile.disable()
+        if ("tracemalloc" in self.modes):
+            import tracemalloc
+            current, peak=tracemalloc.get_traced_memory()
+            statistics=tracemalloc.take_snapshot().statistics("lineno")[:ProfileTopEntries]
+            tracemalloc.stop()
+            logger.info("tracemalloc of "+self.functionName+", current="+str(current//1024)+" KB, peak="+str(peak//1024)+" KB, top "
+                        +str(ProfileTopEntries)+" allocation sites\n"+"\n".join(str(statistic) for statistic in statistics))
+        if (self.profile is not None):
+            import pstats
+            output=io.StringIO()
+            pstats.Stats(self.profile, stream=output).sort_stats("cumulative").print_stats(ProfileTopEntries)
+            logger.info("cProfile of "+self.functionName+", top "+str(ProfileTopEntries)+" by cumulative time\n"+output.getvalue())
+            dumpPath=os.path.join(ProfileDumpDirectory, self.functionName+"-"+str(int(time.time()))+".prof")
+            try:
+                self.profile.dump_stats(dumpPath)
+                logger.info("cProfile stats dumped to "+dumpPath)
+            except OSError as e:
+                logger.warning("cProfile stats not dumped to "+dumpPath+": "+str(e))
+
+
+def emitJson(summary, stream):
+    stream.write(json.dumps({"instrumentation": summary})+"\n")
+
+def emitEmf(summary, stream):
+    import metricpublisher
+    publisher=metricpublisher.MetricPublisher(None, RUNTIME_NAMESPACE, output="emf", emfStream=stream)
+    function=[("FunctionName", summary["function"])]
+    timestamp=time.time()*1000
+    publisher.add("InvocationDuration", function, summary["durationMs"], timestamp, "Milliseconds")
+    for name, entry in summary["spans"].items():
+        publisher.add("StageDuration", function+[("Stage", name)], entry["ms"], timestamp, "Milliseconds")
+    for operation, entry in summary["apiCalls"].items():
+        publisher.add("ApiCalls", function+[("Operation", operation)], entry["count"], timestamp, "Count")
+        publisher.add("ApiCallDuration", function+[("Operation", operation)], entry["ms"], timestamp, "Milliseconds")
+    for name, value in summary["counters"].items():
+        publisher.add(name, function, value, timestamp)
+    publisher.flush()
+
+# wraps one invocation: fresh recorder, optional profiling, summary emitted at the end (also when the handler raises)
+class Invocation(object):
+
+    def __init__(self, functionName, output=None, profileModes=None, stream=None):
+        self.functionName=functionName
+        self.output=(output or InstrumentationOutput).lower()
+        if (self.output not in OUTPUT_MODES):
+            logger.warning("unsupported InstrumentationOutput="+self.output+", expected one of "+",".join(OUTPUT_MODES)+", using json")
+            self.output="json"
+        self.profiler=Profiler(ProfileMode if profileModes is None else profileModes, functionName)
+        self.stream=stream
+
+    def __enter__(self):
+        global _recorder
+        _recorder=Recorder()
+        self.profiler.start()
+        return _recorder
+
+    def __exit__(self, excType, excValue, traceback):
+        try:
+            self.profiler.stop()
+            summary=_recorder.summary(self.functionName)
+            stream=self.stream or sys.stdout
+            if (self.output in ("json", "both")):
+                emitJson(summary, stream)
+            if (self.output in ("emf", "both")):
+                emitEmf(summary, stream)
+        except Exception as e:
+            logger.warning("instrumentation not emitted: "+str(e))
+        return False
+
+def invocation(functionName, output=None, profileModes=None, stream=None):
+    return Invocation(functionName, output, profileModes, stream)
@@ -0,0 +1,47 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+from datetime import date
+
+# dates as used in the per row / per item-day loops
+# days are date ordinals (date.toordinal()) internally, every distinct date string is parsed once,
+# output strings come from a table filled once per covered day
+# the tables are dicts filled on a miss (__missing__), so a hit is a plain subscription: dayOrdinals[text]
+
+
+# 'yyyymmdd' (raw data), 'yyyy-mm-dd' or 'yyyy-mm-ddThh:mm:ssZ' (forecast export)
+def parseOrdinal(text):
+    if (len(text)>=10 and text[4]=="-"):
+        return date(int(text[0:4]), int(text[5:7]), int(text[8:10])).toordinal()
+    if (len(text)==8):
+        return date(int(text[0:4]), int(text[4:6]), int(text[6:8])).toordinal()
+    raise ValueError("unsupported date format: "+text)
+
+def isoString(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+# date string -> ordinal
+class DayOrdinals(dict):
+
+    def __missing__(self, text):
+        ordinal=parseOrdinal(text)
+        self[text]=ordinal
+        return ordinal
+
+
+# ordinal -> yyyy-mm-dd
+class DayStrings(dict):
+
+    def __missing__(self, ordinal):
+        text=isoString(ordinal)
+        self[ordinal]=text
+        return text
+
+    # table of the inclusive range, index i is startOrdinal+i
+    def table(self, startOrdinal, endOrdinal):
+        return [self[ordinal] for ordinal in range(startOrdinal, endOrdinal+1)]
+
+
+# per process tables, they only grow with the number of distinct date strings and days
+dayOrdinals=DayOrdinals()
+dayStrings=DayStrings()
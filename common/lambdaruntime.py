@@ -0,0 +1,116 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import time
+import logging
+import threading
+import functools
+import instrumentation
+
+# imported first by every handler module, so the init time measured from here covers the imports of the handler
+INIT_STARTED=time.perf_counter()
+
+logger = logging.getLogger()
+
+# boto3 and the clients are created on first use, once per process, and reused by the warm invocations
+# every client of a service shares one tuned botocore Config (connection pool, standard retries, bounded timeouts so
+# a stuck call fails inside the lambda timeout)
+# the pool covers the largest fan-out on one client: the 8 s3batch workers each running a managed transfer with
+# max_concurrency=4 threads (s3batch.TRANSFER_CONFIG), the same as the 4 model workers of rawdataprocessor each running
+# an 8 worker s3batch; connections are only opened when needed, a smaller pool would open and discard extra ones
+MAX_POOL_CONNECTIONS=32
+CONNECT_TIMEOUT_SECONDS=5
+READ_TIMEOUT_SECONDS=60
+MAX_ATTEMPTS=4
+# clients of callers that retry on their own (S3BatchTransfer, MetricPublisher) are created without botocore retries,
+# so a throttled call is retried by one layer only
+NO_RETRIES=0
+COLD_START_NAMESPACE=instrumentation.RUNTIME_NAMESPACE
+
+# (serviceName, maxAttempts) -> client
+_clients={}
+# serviceName -> stand-in set by setClient, used for every maxAttempts
+_standIns={}
+_clientsLock=threading.Lock()
+_coldStart=True
+
+
+# maxAttempts is the number of botocore retries after the first attempt
+def clientConfig(maxAttempts=MAX_ATTEMPTS):
+    from botocore.config import Config
+    return Config(max_pool_connections=MAX_POOL_CONNECTIONS, connect_timeout=CONNECT_TIMEOUT_SECONDS, read_timeout=READ_TIMEOUT_SECONDS,
+                  retries={"max_attempts": maxAttempts, "mode": "standard"})
+
+# new client, for code that can't share the cached one (e.g. a forked shard process)
+# its API calls are recorded by the instrumentation of the invocation
+def newClient(serviceName, maxAttempts=MAX_ATTEMPTS):
+    import boto3
+    return instrumentation.instrumentClient(boto3.session.Session().client(serviceName, config=clientConfig(maxAttempts)))
+
+# cached client of the process
+def getClient(serviceName, maxAttempts=MAX_ATTEMPTS):
+    client=_standIns.get(serviceName) or _clients.get((serviceName, maxAttempts))
+    if (client is None):
+        with _clientsLock:
+            client=_clients.get((serviceName, maxAttempts))
+            if (client is None):
+                client=newClient(serviceName, maxAttempts)
+                _clients[(serviceName, maxAttempts)]=client
+    return client
+
+# stand-in for every client of a service (local stand-ins, see benchmarks/pipelinesimulation.py), None drops it;
+# has to happen before the handler modules first use their lazy clients
+def setClient(serviceName, client):
+    with _clientsLock:
+        if (client is None):
+            _standIns.pop(serviceName, None)
+        else:
+            _standIns[serviceName]=client
+
+
+# module level stand-in for a client (s3_client=lambdaruntime.lazyClient('s3')), the real client is created on the
+# first attribute access; resolved attributes are kept on the proxy so later calls skip the lookup
+class LazyClient(object):
+
+    def __init__(self, serviceName, maxAttempts=MAX_ATTEMPTS):
+        self._serviceName=serviceName
+        self._maxAttempts=maxAttempts
+
+    def __getattr__(self, name):
+        if (name.startswith("__")):
+            raise AttributeError(name)
+        value=getattr(getClient(self._serviceName, self._maxAttempts), name)
+        self.__dict__[name]=value
+        return value
+
+def lazyClient(serviceName, maxAttempts=MAX_ATTEMPTS):
+    return LazyClient(serviceName, maxAttempts)
+
+
+def getFunctionName(function):
+    return os.environ.get('AWS_LAMBDA_FUNCTION_NAME', function.__module__)
+
+# cold start metric as an Embedded Metric Format log line (no API call on the invocation path)
+def reportColdStart(functionName, initSeconds):
+    import metricpublisher
+    publisher=metricpublisher.MetricPublisher(None, COLD_START_NAMESPACE, output="emf")
+    publisher.add("ColdStartInitDuration", [("FunctionName", functionName)], initSeconds*1000, time.time()*1000, "Milliseconds")
+    publisher.flush()
+    logger.info("cold start of "+functionName+", init took "+str(round(initSeconds*1000, 1))+" ms")
+
+# handler decorator, reports the time between the import of this module and the first invocation once per process,
+# and runs every invocation under the instrumentation (spans, counters and API calls, see instrumentation)
+def handler(function):
+    @functools.wraps(function)
+    def wrapper(event, context):
+        global _coldStart
+        functionName=getFunctionName(function)
+        if (_coldStart):
+            _coldStart=False
+            try:
+                reportColdStart(functionName, time.perf_counter()-INIT_STARTED)
+            except Exception as e:
+                logger.warning("cold start metric not reported: "+str(e))
+        with instrumentation.invocation(functionName):
+            return function(event, context)
+    return wrapper
@@ -0,0 +1,206 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import sys
+import json
+import math
+import calendar
+import time
+import random
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError
+
+logger = logging.getLogger()
+
+# datums are collected first and sent with as few put_metric_data calls as the API limits allow
+# (1000 datums and 1 MB per call, 150 distinct values per Values/Counts statistic set), the calls run on a thread pool
+# with full jitter retries on throttling (pass a client without botocore retries, lambdaruntime.NO_RETRIES). With the emf output, the same datums are written to stdout in the
+# CloudWatch Embedded Metric Format instead of (or next to) the API calls, extraction is done by CloudWatch logs
+MAX_DATUMS_PER_CALL=1000
+MAX_REQUEST_BYTES=1000000
+MAX_VALUES_PER_DATUM=150
+# EMF accepts at most 100 values per metric and 100 metrics per log event
+MAX_EMF_VALUES=100
+MAX_EMF_METRICS=100
+DEFAULT_MAX_WORKERS=4
+DEFAULT_MAX_ATTEMPTS=5
+RETRYABLE_ERROR_CODES=set(["Throttling","ThrottlingException","RequestLimitExceeded","TooManyRequestsException","InternalFailure","InternalServiceError","ServiceUnavailable"])
+OUTPUT_MODES=("api", "emf", "both")
+
+
+def isRetryable(error):
+    if (isinstance(error, BotocoreConnectionError)):
+        return True
+    if (isinstance(error, ClientError)):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+    return False
+
+def checkOutputMode(mode):
+    mode=(mode or "api").lower()
+    if (mode not in OUTPUT_MODES):
+        raise ValueError("unsupported metrics output: "+mode+", expected one of "+",".join(OUTPUT_MODES))
+    return mode
+
+# [(name, value)] or {name: value} -> put_metric_data dimensions, in the given order
+def toDimensions(dimensions):
+    pairs=dimensions.items() if isinstance(dimensions, dict) else dimensions
+    return [{"Name": name, "Value": str(value)} for name, value in pairs]
+
+# query protocol size of one datum (MetricData.member.N.Values.member.M=... per entry), on the safe side
+def estimateDatumSize(datum):
+    size=200+len(datum["MetricName"])
+    for dimension in datum.get("Dimensions", []):
+        size+=80+len(dimension["Name"])+len(dimension["Value"])
+    size+=60*(len(datum.get("Values", []))+len(datum.get("Counts", [])))
+    return size
+
+
+class MetricPublisher(object):
+
+    def __init__(self, client, namespace, output="api", maxWorkers=DEFAULT_MAX_WORKERS, maxAttempts=DEFAULT_MAX_ATTEMPTS, emfStream=None):
+        self.client=client
+        self.namespace=namespace
+        self.output=checkOutputMode(output)
+        self.maxWorkers=maxWorkers
+        self.maxAttempts=maxAttempts
+        self.emfStream=emfStream
+        self.datums=[]
+
+    def __len__(self):
+        return len(self.datums)
+
+    # one value, NaN and inf are not accepted by CloudWatch and are dropped
+    def add(self, name, dimensions, value, timestamp, unit="None"):
+        value=float(value)
+        if (not math.isfinite(value)):
+            return
+        self.datums.append({"MetricName": name, "Dimensions": toDimensions(dimensions), "Timestamp": timestamp, "Value": value, "Unit": unit})
+
+    # many values of one metric (e.g. one per item) as statistic sets, equal values are sent once with their count
+    def addValues(self, name, dimensions, values, timestamp, unit="None"):
+        # numpy is only imported here, the module stays light for the lambdas that only add single values
+        import numpy as np
+        values=np.asarray(values, dtype=np.float64)
+        values=values[np.isfinite(values)]
+        if (len(values)==0):
+            return
+        distinctValues, counts=np.unique(values, return_counts=True)
+        dimensionList=toDimensions(dimensions)
+        for start in range(0, len(distinctValues), MAX_VALUES_PER_DATUM):
+            self.datums.append({"MetricName": name, "Dimensions": dimensionList, "Timestamp": timestamp,
+                                "Values": distinctValues[start:start+MAX_VALUES_PER_DATUM].tolist(),
+                                "Counts": counts[start:start+MAX_VALUES_PER_DATUM].astype(np.float64).tolist(), "Unit": unit})
+
+    # datums packed into put_metric_data calls, in insertion order
+    def batches(self):
+        batches=[]
+        current=[]
+        currentSize=0
+        for datum in self.datums:
+            size=estimateDatumSize(datum)
+            if (len(current)>0 and (len(current)>=MAX_DATUMS_PER_CALL or currentSize+size>MAX_REQUEST_BYTES)):
+                batches.append(current)
+                current=[]
+                currentSize=0
+            current.append(datum)
+            currentSize+=size
+        if (len(current)>0):
+            batches.append(current)
+        return batches
+
+    def _withRetry(self, fn, args):
+        attempt=1
+        while True:
+            try:
+                return fn(*args)
+            except Exception as e:
+                if (attempt>=self.maxAttempts or not isRetryable(e)):
+                    raise
+                # full jitter backoff
+                time.sleep(random.uniform(0, min(10.0, 0.5*(2**attempt))))
+                attempt+=1
+
+    def _put(self, batch):
+        self.client.put_metric_data(Namespace=self.namespace, MetricData=batch)
+        return len(batch)
+
+    def _putBatches(self, batches):
+        if (len(batches)<=1 or self.maxWorkers<=1):
+            for batch in batches:
+                self._withRetry(self._put, (batch,))
+            return
+        failures=[]
+        with ThreadPoolExecutor(max_workers=min(self.maxWorkers, len(batches))) as executor:
+            futures=[executor.submit(self._withRetry, self._put, (batch,)) for batch in batches]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append(e)
+        if (len(failures)>0):
+            logger.error("put_metric_data failed for "+str(len(failures))+" of "+str(len(batches))+" batch(es)")
+            raise failures[0]
+
+    # EMF log events, datums sharing timestamp and dimensions go into the same event
+    def emfEvents(self):
+        groups={}
+        for datum in self.datums:
+            key=(datum["Timestamp"], tuple((dimension["Name"], dimension["Value"]) for dimension in datum["Dimensions"]))
+            metrics=groups.setdefault(key, {})
+            entry=metrics.setdefault(datum["MetricName"], {"unit": datum["Unit"], "values": []})
+            if ("Values" in datum):
+                for value, count in zip(datum["Values"], datum["Counts"]):
+                    entry["values"].extend([value]*int(count))
+            else:
+                entry["values"].append(datum["Value"])
+        events=[]
+        for (timestamp, dimensions), metrics in groups.items():
+            # a metric with more than MAX_EMF_VALUES values is split over several events
+            chunks=[]
+            for name, entry in metrics.items():
+                for start in range(0, len(entry["values"]), MAX_EMF_VALUES):
+                    chunkValues=entry["values"][start:start+MAX_EMF_VALUES]
+                    chunks.append((name, entry["unit"], chunkValues[0] if len(chunkValues)==1 else chunkValues))
+            pending=[]
+            for chunk in chunks:
+                if (len(pending)>=MAX_EMF_METRICS or any(name==chunk[0] for name, _, _ in pending)):
+                    events.append(self._emfEvent(timestamp, dimensions, pending))
+                    pending=[]
+                pending.append(chunk)
+            if (len(pending)>0):
+                events.append(self._emfEvent(timestamp, dimensions, pending))
+        return events
+
+    def _emfEvent(self, timestamp, dimensions, metrics):
+        # naive datetimes are UTC, as for put_metric_data
+        if (isinstance(timestamp, datetime)):
+            milliseconds=calendar.timegm(timestamp.utctimetuple())*1000+timestamp.microsecond//1000
+        else:
+            milliseconds=int(timestamp)
+        event={"_aws": {"Timestamp": milliseconds, "CloudWatchMetrics": [{"Namespace": self.namespace,
+                        "Dimensions": [[name for name, _ in dimensions]],
+                        "Metrics": [{"Name": name, "Unit": unit} for name, unit, _ in metrics]}]}}
+        for name, value in dimensions:
+            event[name]=value
+        for name, _, value in metrics:
+            event[name]=value
+        return event
+
+    # sends everything collected so far, returns the number of put_metric_data calls
+    def flush(self):
+        if (len(self.datums)==0):
+            return 0
+        numOfCalls=0
+        if (self.output in ("emf", "both")):
+            stream=self.emfStream or sys.stdout
+            for event in self.emfEvents():
+                stream.write(json.dumps(event)+"\n")
+            stream.flush()
+        if (self.output in ("api", "both")):
+            batches=self.batches()
+            self._putBatches(batches)
+            numOfCalls=len(batches)
+        logger.info(str(len(self.datums))+" metric datum(s) published, output="+self.output+", put_metric_data calls="+str(numOfCalls))
+        self.datums=[]
+        return numOfCalls
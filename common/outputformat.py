@@ -0,0 +1,39 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import csv
+import io
+
+# row writers for the dataset files imported by Forecast (dataset import jobs with Format=CSV)
+# csv      plain csv without header, the only format of the import path: compressed or columnar files would need a
+#          Forecast import format of their own (and parquet a pyarrow the common layer doesn't ship)
+SUPPORTED_FORMATS=["csv"]
+
+
+def checkFormat(outputFormat):
+    if (outputFormat not in SUPPORTED_FORMATS):
+        raise ValueError("unsupported output_format="+str(outputFormat)+", supported formats are "+",".join(SUPPORTED_FORMATS))
+    return outputFormat
+
+def fileExtension(outputFormat):
+    return "."+checkFormat(outputFormat)
+
+
+class CsvRowWriter(object):
+
+    def __init__(self, fileobj):
+        self._text=io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        self._writer=csv.writer(self._text)
+        self.rowCount=0
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        self.rowCount+=1
+
+    def close(self):
+        self._text.close()
+
+
+# fileobj is a binary writable object (local file or s3stream.S3MultipartWriter), rows are written as they come
+def openRowWriter(outputFormat, fileobj):
+    checkFormat(outputFormat)
+    return CsvRowWriter(fileobj)
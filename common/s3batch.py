@@ -0,0 +1,141 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import time
+import random
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError
+from boto3.s3.transfer import TransferConfig
+import s3stream
+
+logger = logging.getLogger()
+
+# batches of uploads, downloads, server side copies and deletes run on a bounded thread pool sharing one client
+# (boto3 clients are thread safe, the lambdaruntime client pool keeps the connections of all workers alive)
+# the retries of throttled and transient errors happen here, pass a client without botocore retries
+# (lambdaruntime.lazyClient('s3', lambdaruntime.NO_RETRIES)) or every attempt is retried again by botocore
+DEFAULT_MAX_WORKERS=8
+DEFAULT_MAX_ATTEMPTS=4
+# delete_objects accepts at most 1000 keys per call
+DELETE_BATCH_SIZE=1000
+RETRYABLE_ERROR_CODES=set(["SlowDown","Throttling","ThrottlingException","RequestTimeout","RequestTimeTooSkewed","InternalError","ServiceUnavailable","503","500"])
+
+TRANSFER_CONFIG=TransferConfig(multipart_threshold=16*1024*1024, multipart_chunksize=16*1024*1024, max_concurrency=4, use_threads=True)
+
+
+class S3BatchError(Exception):
+
+    def __init__(self, operation, failures):
+        self.operation=operation
+        self.failures=failures
+        super(S3BatchError, self).__init__(operation+" failed for "+str(len(failures))+" object(s), first error: "+str(failures[0][1]))
+
+
+def isRetryable(error):
+    if (isinstance(error, BotocoreConnectionError)):
+        return True
+    if (isinstance(error, ClientError)):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+    return False
+
+
+class S3BatchTransfer(object):
+
+    def __init__(self, client, maxWorkers=DEFAULT_MAX_WORKERS, maxAttempts=DEFAULT_MAX_ATTEMPTS, transferConfig=TRANSFER_CONFIG):
+        self.client=client
+        self.maxWorkers=maxWorkers
+        self.maxAttempts=maxAttempts
+        self.transferConfig=transferConfig
+
+    def _withRetry(self, fn, args):
+        attempt=1
+        while True:
+            try:
+                return fn(*args)
+            except Exception as e:
+                if (attempt>=self.maxAttempts or not isRetryable(e)):
+                    raise
+                # full jitter backoff
+                time.sleep(random.uniform(0, min(5.0, 0.2*(2**attempt))))
+                attempt+=1
+
+    # runs fn(*args) for every args tuple, results come back in input order, failures are raised together at the end
+    def run(self, operation, fn, argsList):
+        argsList=list(argsList)
+        if (len(argsList)==0):
+            return []
+        results=[None]*len(argsList)
+        failures=[]
+        if (len(argsList)==1 or self.maxWorkers<=1):
+            for i, args in enumerate(argsList):
+                try:
+                    results[i]=self._withRetry(fn, args)
+                except Exception as e:
+                    failures.append((args, e))
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.maxWorkers, len(argsList))) as executor:
+                futures=[executor.submit(self._withRetry, fn, args) for args in argsList]
+                for i, future in enumerate(futures):
+                    try:
+                        results[i]=future.result()
+                    except Exception as e:
+                        failures.append((argsList[i], e))
+        if (len(failures)>0):
+            raise S3BatchError(operation, failures)
+        logger.debug(operation+" finished for "+str(len(argsList))+" object(s)")
+        return results
+
+    def _upload(self, localPath, bucket, key):
+        self.client.upload_file(localPath, bucket, key, Config=self.transferConfig)
+
+    def _put(self, body, bucket, key):
+        self.client.put_object(Bucket=bucket, Key=key, Body=body)
+
+    def _read(self, bucket, key, spillThreshold):
+        return s3stream.readObject(self.client, bucket, key, spillThreshold)
+
+    def _download(self, bucket, key, localPath):
+        self.client.download_file(bucket, key, localPath, Config=self.transferConfig)
+        return localPath
+
+    # managed copy, switches to multipart upload_part_copy for large objects (copy_object is limited to 5 GB)
+    # when the caller already knows the source size, a small object is copied with a single copy_object (the managed
+    # copy would HEAD the source first)
+    def _copy(self, sourceBucket, sourceKey, bucket, key, sourceSize=None):
+        if (sourceSize is not None and sourceSize<self.transferConfig.multipart_threshold):
+            self.client.copy_object(CopySource={"Bucket": sourceBucket, "Key": sourceKey}, Bucket=bucket, Key=key)
+            return
+        self.client.copy({"Bucket": sourceBucket, "Key": sourceKey}, bucket, key, Config=self.transferConfig)
+
+    def _deleteBatch(self, bucket, keys):
+        response=self.client.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": key} for key in keys], "Quiet": True})
+        errors=response.get("Errors", [])
+        if (len(errors)>0):
+            raise ClientError({"Error": {"Code": errors[0].get("Code", "InternalError"), "Message": str(len(errors))+" key(s) not deleted, first key="+errors[0].get("Key", "")}}, "DeleteObjects")
+        return len(keys)
+
+    # [(localPath, bucket, key)]
+    def uploadFiles(self, uploads):
+        return self.run("upload", self._upload, uploads)
+
+    # [(body, bucket, key)] for in-memory content
+    def putObjects(self, puts):
+        return self.run("put", self._put, puts)
+
+    # [(bucket, key)], returns seekable file objects (in memory, or spilled to /tmp above spillThreshold)
+    def readObjects(self, reads, spillThreshold=s3stream.SPILL_THRESHOLD):
+        return self.run("read", self._read, [(bucket, key, spillThreshold) for bucket, key in reads])
+
+    # [(bucket, key, localPath)], returns the local paths
+    def downloadFiles(self, downloads):
+        return self.run("download", self._download, downloads)
+
+    # [(sourceBucket, sourceKey, bucket, key)], optionally with the source size as a fifth element
+    def copyObjects(self, copies):
+        return self.run("copy", self._copy, copies)
+
+    # deletes in batches of 1000 keys, returns the number of deleted keys
+    def deleteObjects(self, bucket, keys):
+        keys=list(keys)
+        batches=[(bucket, keys[i:i+DELETE_BATCH_SIZE]) for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+        return sum(self.run("delete", self._deleteBatch, batches))
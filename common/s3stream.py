@@ -0,0 +1,128 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import io
+import csv
+import json
+import codecs
+import tempfile
+import logging
+
+logger = logging.getLogger()
+
+# S3 requires every part except the last one to be at least 5 MB
+MIN_PART_SIZE=5*1024*1024
+DEFAULT_PART_SIZE=8*1024*1024
+# objects up to this size are read into memory, bigger ones spill to a temporary file under /tmp
+SPILL_THRESHOLD=64*1024*1024
+READ_CHUNK_SIZE=1024*1024
+
+
+# seekable binary file with the object content, caller closes it
+def readObject(client, bucket, key, spillThreshold=SPILL_THRESHOLD):
+    response=client.get_object(Bucket=bucket, Key=key)
+    body=response["Body"]
+    if (response.get("ContentLength", 0)<=spillThreshold):
+        fileobj=io.BytesIO(body.read())
+    else:
+        logger.debug("object bigger than spill threshold, spilling to disk, key="+key)
+        fileobj=tempfile.TemporaryFile(mode="w+b")
+        for chunk in iter(lambda: body.read(READ_CHUNK_SIZE), b""):
+            fileobj.write(chunk)
+        fileobj.seek(0)
+    body.close()
+    return fileobj
+
+# csv reader over a binary file object
+def csvReader(fileobj):
+    return csv.reader(io.TextIOWrapper(fileobj, encoding="utf-8", newline=""))
+
+# streams csv rows straight from the get_object body, nothing is buffered beyond the current line
+def iterCsvRows(client, bucket, key):
+    body=client.get_object(Bucket=bucket, Key=key)["Body"]
+    try:
+        for row in csv.reader(codecs.getreader("utf-8")(body)):
+            yield row
+    finally:
+        body.close()
+
+def readJson(client, bucket, key):
+    return json.loads(client.get_object(Bucket=bucket, Key=key)["Body"].read())
+
+def writeJson(client, bucket, key, content):
+    client.put_object(Bucket=bucket, Key=key, Body=json.dumps(content).encode("utf-8"))
+
+# csv rows rendered in memory, for small files uploaded as a single put_object
+def csvBytes(rows):
+    output=io.StringIO()
+    csv.writer(output).writerows(rows)
+    return output.getvalue().encode("utf-8")
+
+
+# binary file-like object streaming into S3, parts are uploaded as soon as the buffer is full
+# small objects (less than one part) end up as a single put_object
+class S3MultipartWriter(io.RawIOBase):
+
+    def __init__(self, client, bucket, key, partSize=DEFAULT_PART_SIZE, **extraArgs):
+        self.client=client
+        self.bucket=bucket
+        self.key=key
+        self.partSize=max(partSize, MIN_PART_SIZE)
+        self.extraArgs=extraArgs
+        self.bytesWritten=0
+        self._buffer=bytearray()
+        self._uploadId=None
+        self._parts=[]
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self.bytesWritten
+
+    def write(self, data):
+        if (self.closed):
+            raise ValueError("write to closed S3MultipartWriter, key="+self.key)
+        self._buffer.extend(data)
+        self.bytesWritten+=len(data)
+        while (len(self._buffer)>=self.partSize):
+            self._uploadPart(bytes(self._buffer[:self.partSize]))
+            del self._buffer[:self.partSize]
+        return len(data)
+
+    def _uploadPart(self, body):
+        if (self._uploadId is None):
+            response=self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extraArgs)
+            self._uploadId=response["UploadId"]
+        partNumber=len(self._parts)+1
+        response=self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._uploadId, PartNumber=partNumber, Body=body)
+        self._parts.append({"ETag": response["ETag"], "PartNumber": partNumber})
+
+    def abort(self):
+        if (self._uploadId is not None):
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._uploadId)
+            self._uploadId=None
+        self._buffer=bytearray()
+        super(S3MultipartWriter, self).close()
+
+    def close(self):
+        if (self.closed):
+            return
+        try:
+            if (self._uploadId is None):
+                self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.extraArgs)
+            else:
+                if (len(self._buffer)>0):
+                    self._uploadPart(bytes(self._buffer))
+                self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._uploadId, MultipartUpload={"Parts": self._parts})
+        except Exception:
+            self.abort()
+            raise
+        self._buffer=bytearray()
+        super(S3MultipartWriter, self).close()
+
+    def __exit__(self, excType, excValue, traceback):
+        if (excType is not None):
+            self.abort()
+        else:
+            self.close()
+        return False
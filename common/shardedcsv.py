@@ -0,0 +1,124 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import csv
+import logging
+import traceback
+import multiprocessing
+
+logger = logging.getLogger()
+
+# sharded reading of big csv files: the file is split into byte ranges, every shard owns the lines that start inside
+# its range (the line crossing the range start belongs to the previous shard), so shards never overlap or miss a line
+# sources are local paths or S3 objects (("s3", bucket, key), read with ranged GETs, nothing is downloaded twice)
+# quoted fields spanning several lines are not supported
+#
+# shards run in separate processes connected with multiprocessing.Pipe, lambda has no /dev/shm so
+# multiprocessing.Pool and Queue (semaphores in shared memory) are not available there
+READ_CHUNK_SIZE=1024*1024
+
+
+def isS3Source(source):
+    return isinstance(source, tuple) and source[0]=="s3"
+
+def sourceSize(source, client=None):
+    if (isS3Source(source)):
+        return client.head_object(Bucket=source[1], Key=source[2])["ContentLength"]
+    return os.path.getsize(source)
+
+# [(start, end)] covering [0, size), at most numOfShards ranges
+def byteRanges(size, numOfShards):
+    numOfShards=max(1, min(numOfShards, size))
+    bounds=[size*i//numOfShards for i in range(numOfShards+1)]
+    return [(bounds[i], bounds[i+1]) for i in range(numOfShards) if bounds[i]<bounds[i+1]]
+
+
+# raw chunks from offset to the end of the source
+def _iterChunks(source, offset, client):
+    if (isS3Source(source)):
+        body=client.get_object(Bucket=source[1], Key=source[2], Range="bytes="+str(offset)+"-")["Body"]
+        try:
+            for chunk in iter(lambda: body.read(READ_CHUNK_SIZE), b""):
+                yield chunk
+        finally:
+            body.close()
+    else:
+        with open(source, "rb") as inputFile:
+            inputFile.seek(offset)
+            for chunk in iter(lambda: inputFile.read(READ_CHUNK_SIZE), b""):
+                yield chunk
+
+def _iterLines(chunks):
+    pending=b""
+    for chunk in chunks:
+        lines=(pending+chunk).split(b"\n")
+        pending=lines.pop()
+        for line in lines:
+            yield line+b"\n"
+    if (len(pending)>0):
+        yield pending
+
+# lines starting inside [start, end), reading starts one byte early to find out if start is a line start
+def iterShardLines(source, start, end, client=None):
+    offset=max(start-1, 0)
+    position=offset
+    lines=_iterLines(_iterChunks(source, offset, client))
+    if (start>0):
+        skipped=next(lines, b"")
+        position+=len(skipped)
+    for line in lines:
+        if (position>=end):
+            break
+        yield line
+        position+=len(line)
+    lines.close()
+
+def iterShardRows(source, start, end, client=None):
+    return csv.reader(line.decode("utf-8") for line in iterShardLines(source, start, end, client))
+
+
+def _runShard(connection, worker, args):
+    try:
+        connection.send(("ok", worker(*args)))
+    except Exception:
+        connection.send(("error", traceback.format_exc()))
+    finally:
+        connection.close()
+
+# runs worker(*args) for every args tuple in its own process, results come back in input order
+# results are pickled through the pipe, so workers should return compact partials (arrays, not row lists)
+def runShards(worker, argsList):
+    argsList=list(argsList)
+    if (len(argsList)<=1):
+        return [worker(*args) for args in argsList]
+    processes=[]
+    for args in argsList:
+        parentConnection, childConnection=multiprocessing.Pipe(duplex=False)
+        process=multiprocessing.Process(target=_runShard, args=(childConnection, worker, args))
+        process.start()
+        childConnection.close()
+        processes.append((process, parentConnection))
+    results=[]
+    errors=[]
+    # receive before join, a child blocks on a full pipe until its result is read
+    for i, (process, connection) in enumerate(processes):
+        try:
+            status, result=connection.recv()
+        except EOFError:
+            status, result="error", "shard process exited without a result"
+        connection.close()
+        if (status!="ok"):
+            errors.append("shard "+str(i)+": "+result)
+        results.append(result)
+    for process, _ in processes:
+        process.join()
+    if (len(errors)>0):
+        raise RuntimeError("sharded processing failed for "+str(len(errors))+" shard(s)\n"+errors[0])
+    logger.debug("sharded processing finished for "+str(len(argsList))+" shard(s)")
+    return results
+
+# number of shards from a setting ("auto" = one per cpu)
+def getNumOfShards(setting):
+    if (str(setting).lower()=="auto"):
+        return multiprocessing.cpu_count()
+    return max(1, int(setting))
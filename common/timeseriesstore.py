@@ -0,0 +1,239 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import math
+from array import array
+import numpy as np
+
+# shared by rawdataprocessor and forecastMetrics (deployed as lambda layer)
+# values are kept as dense float arrays [field, day, item], missing values are NaN
+# days are date ordinals (date.toordinal()), items are interned into a column index
+
+INITIAL_DAY_CAPACITY=64
+INITIAL_ITEM_CAPACITY=64
+
+
+def toFloat(text):
+    if (text is None or text==""):
+        return math.nan
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return math.nan
+
+# keep integral values looking like the source data (123 instead of 123.0)
+def formatValue(value):
+    if (value!=value):
+        return ""
+    if (value.is_integer()):
+        return int(value)
+    return value
+
+# formatValue for a whole array (one day of one field), vectorised
+def formatValues(values):
+    formatted=values.astype(object)
+    integral=np.isfinite(values)
+    integral[integral]=values[integral]==np.trunc(values[integral])
+    inRange=integral&(np.abs(values)<2.0**62)
+    formatted[inRange]=values[inRange].astype(np.int64).astype(object)
+    # integral values beyond int64 keep their exact python int
+    for i in np.flatnonzero(integral&~inRange):
+        formatted[i]=int(values[i])
+    formatted[np.isnan(values)]=""
+    return formatted.tolist()
+
+
+# parsed rows collected in typed arrays (cheap per row, 8 bytes per number) and applied to a store at once with addRows
+# the partial is a tuple of numpy arrays, small to pickle when rows are parsed in other processes
+class RowBatch(object):
+
+    def __init__(self, numFields):
+        self.numFields=numFields
+        self.items=[]
+        self.itemCodes={}
+        self.codes=array("q")
+        self.ordinals=array("q")
+        self.values=array("d")
+
+    def add(self, ordinal, item, values):
+        code=self.itemCodes.get(item)
+        if (code is None):
+            code=len(self.items)
+            self.itemCodes[item]=code
+            self.items.append(item)
+        self.codes.append(code)
+        self.ordinals.append(ordinal)
+        self.values.extend(values)
+
+    # (item names in first appearance order, item code per row, ordinal per row, values [row, field])
+    def partial(self):
+        if (len(self.ordinals)==0):
+            return (self.items, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, self.numFields), dtype=np.float64))
+        return (self.items, np.frombuffer(self.codes, dtype=np.int64), np.frombuffer(self.ordinals, dtype=np.int64),
+                np.frombuffer(self.values, dtype=np.float64).reshape(len(self.ordinals), self.numFields))
+
+
+class TimeSeriesStore(object):
+
+    def __init__(self, fieldNames, dtype=np.float64):
+        self.fieldNames=list(fieldNames)
+        self.fieldIndex={name: i for i, name in enumerate(self.fieldNames)}
+        self.itemIndex={}
+        self.items=[]
+        self.dtype=dtype
+        self.startOrdinal=None
+        self.endOrdinal=None
+        self._baseOrdinal=None
+        self._values=np.full((len(self.fieldNames), INITIAL_DAY_CAPACITY, INITIAL_ITEM_CAPACITY), np.nan, dtype=dtype)
+
+    @property
+    def numItems(self):
+        return len(self.items)
+
+    @property
+    def numDays(self):
+        if (self.startOrdinal is None):
+            return 0
+        return self.endOrdinal-self.startOrdinal+1
+
+    @property
+    def nbytes(self):
+        return self._values.nbytes
+
+    def addItem(self, item):
+        col=self.itemIndex.get(item)
+        if (col is None):
+            col=len(self.items)
+            self.itemIndex[item]=col
+            self.items.append(item)
+            if (col>=self._values.shape[2]):
+                self._grow(0, 0, self._values.shape[2])
+        return col
+
+    def _grow(self, daysBefore, daysAfter, items):
+        fields, days, numItems=self._values.shape
+        values=np.full((fields, days+daysBefore+daysAfter, numItems+items), np.nan, dtype=self.dtype)
+        values[:, daysBefore:daysBefore+days, :numItems]=self._values
+        self._values=values
+        if (self._baseOrdinal is not None):
+            self._baseOrdinal-=daysBefore
+
+    def _dayPosition(self, ordinal):
+        if (self._baseOrdinal is None):
+            self._baseOrdinal=ordinal
+            self.startOrdinal=ordinal
+            self.endOrdinal=ordinal
+            return 0
+        capacity=self._values.shape[1]
+        if (ordinal<self._baseOrdinal):
+            self._grow(max(self._baseOrdinal-ordinal, capacity), 0, 0)
+        elif (ordinal>=self._baseOrdinal+capacity):
+            self._grow(0, max(ordinal-self._baseOrdinal-capacity+1, capacity), 0)
+        if (ordinal<self.startOrdinal):
+            self.startOrdinal=ordinal
+        if (ordinal>self.endOrdinal):
+            self.endOrdinal=ordinal
+        return ordinal-self._baseOrdinal
+
+    # set all fields of one (day, item) cell, later rows override earlier ones
+    def setValues(self, ordinal, item, values):
+        col=self.addItem(item)
+        pos=self._dayPosition(ordinal)
+        self._values[:, pos, col]=values
+
+    # bulk setValues for parsed rows: ordinals [row], item columns (from addItem) [row], values [row, field]
+    # for repeated (day, item) cells the last row wins, as with setValues row by row
+    def setRows(self, ordinals, cols, values):
+        if (len(ordinals)==0):
+            return
+        self._dayPosition(int(ordinals.min()))
+        self._dayPosition(int(ordinals.max()))
+        positions=ordinals.astype(np.int64)-self._baseOrdinal
+        cells=positions*self._values.shape[2]+cols
+        _, lastFromEnd=np.unique(cells[::-1], return_index=True)
+        rows=len(cells)-1-lastFromEnd
+        self._values[:, positions[rows], cols[rows]]=values[rows].T
+
+    # applies a RowBatch partial, items keep their first appearance order
+    def addRows(self, items, codes, ordinals, values):
+        cols=np.array([self.addItem(item) for item in items], dtype=np.int64)
+        if (len(codes)>0):
+            self.setRows(ordinals, cols[codes], values)
+
+    def setValue(self, ordinal, item, fieldName, value):
+        col=self.addItem(item)
+        pos=self._dayPosition(ordinal)
+        self._values[self.fieldIndex[fieldName], pos, col]=value
+
+    def hasDay(self, ordinal):
+        if (self.startOrdinal is None or ordinal<self.startOrdinal or ordinal>self.endOrdinal):
+            return False
+        return bool(np.any(~np.isnan(self._values[:, ordinal-self._baseOrdinal, :self.numItems])))
+
+    # one value per item (in self.items order), NaN replaced by fill if given
+    def getDay(self, ordinal, fieldName, fill=None):
+        return self.getRange(ordinal, ordinal, fieldName, fill)[0]
+
+    # [day, item] block for the inclusive ordinal range, days outside the store are missing
+    def getRange(self, startOrdinal, endOrdinal, fieldName, fill=None):
+        numDays=endOrdinal-startOrdinal+1
+        block=np.full((numDays, self.numItems), np.nan, dtype=self.dtype)
+        if (self._baseOrdinal is not None and numDays>0):
+            lo=max(startOrdinal, self.startOrdinal)
+            hi=min(endOrdinal, self.endOrdinal)
+            if (lo<=hi):
+                block[lo-startOrdinal:hi-startOrdinal+1]=self._values[self.fieldIndex[fieldName], lo-self._baseOrdinal:hi-self._baseOrdinal+1, :self.numItems]
+        if (fill is not None):
+            block[np.isnan(block)]=fill
+        return block
+
+    # column positions of the given items in this store, -1 when the item is unknown
+    def lookupItems(self, items):
+        return np.array([self.itemIndex.get(item, -1) for item in items], dtype=np.int64)
+
+    # drop every value in the inclusive ordinal range (used before re-applying restated days)
+    # the end moves back to the last day that still has a value, so a restated file ending earlier leaves no empty days
+    def clearRange(self, startOrdinal, endOrdinal):
+        if (self._baseOrdinal is None):
+            return
+        lo=max(startOrdinal, self.startOrdinal)
+        hi=min(endOrdinal, self.endOrdinal)
+        if (lo<=hi):
+            self._values[:, lo-self._baseOrdinal:hi-self._baseOrdinal+1, :]=np.nan
+            self._trimEnd()
+
+    def _trimEnd(self):
+        days=self._values[:, self.startOrdinal-self._baseOrdinal:self.endOrdinal-self._baseOrdinal+1, :self.numItems]
+        filled=np.flatnonzero(np.any(~np.isnan(days), axis=(0, 2)))
+        if (len(filled)==0):
+            self._baseOrdinal=None
+            self.startOrdinal=None
+            self.endOrdinal=None
+            return
+        self.endOrdinal=self.startOrdinal+int(filled[-1])
+
+    # compact snapshot (npz, only the covered days and items are written)
+    def save(self, fileobj):
+        if (self._baseOrdinal is None):
+            values=np.empty((len(self.fieldNames), 0, 0), dtype=self.dtype)
+            startOrdinal=-1
+        else:
+            values=self._values[:, self.startOrdinal-self._baseOrdinal:self.endOrdinal-self._baseOrdinal+1, :self.numItems]
+            startOrdinal=self.startOrdinal
+        np.savez_compressed(fileobj, fieldNames=np.array(self.fieldNames, dtype=str), items=np.array(self.items, dtype=str),
+                            startOrdinal=np.array([startOrdinal], dtype=np.int64), values=values)
+
+    @classmethod
+    def load(cls, fileobj):
+        snapshot=np.load(fileobj, allow_pickle=False)
+        values=snapshot["values"]
+        store=cls(snapshot["fieldNames"].tolist(), dtype=values.dtype)
+        for item in snapshot["items"].tolist():
+            store.addItem(item)
+        startOrdinal=int(snapshot["startOrdinal"][0])
+        if (startOrdinal>=0 and values.shape[1]>0):
+            store._baseOrdinal=startOrdinal
+            store.startOrdinal=startOrdinal
+            store.endOrdinal=startOrdinal+values.shape[1]-1
+            store._values=np.full((values.shape[0], max(values.shape[1], INITIAL_DAY_CAPACITY), max(values.shape[2], INITIAL_ITEM_CAPACITY)), np.nan, dtype=values.dtype)
+            store._values[:, :values.shape[1], :values.shape[2]]=values
+        return store
@@ -1,16 +1,15 @@
 #Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #SPDX-License-Identifier: MIT-0
+import lambdaruntime
 import os
-import io
 import json
-import boto3
-import random
 from urllib.parse import unquote_plus
-import csv
-from datetime import date
 from datetime import datetime
-from datetime import timedelta
 import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import configcache
+from forecastinventory import ForecastInventory
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -18,10 +17,12 @@ logger.setLevel(logging.INFO)
 
 S3BucketName = os.environ['S3BucketName']
 roleArn = os.environ['ForecastExecutionRole']
+# import jobs started in parallel per invocation
+MaxImportWorkers = int(os.environ.get('MaxImportWorkers','4'))
 
 
-s3_client = boto3.client('s3')
-forecast_client = boto3.client("forecast")
+s3_client = lambdaruntime.lazyClient('s3')
+forecast_client = lambdaruntime.lazyClient("forecast")
 
 
 def tranformDateToString(date):
@@ -40,22 +41,29 @@ def getDateFromString(dateString):
     return datetime.strptime(dateString, "%Y-%m-%d").date()
 
 
-def upsertDataImportJob(client, DataSetArn, S3Url):
-    # rules to use S3Url generating data import JobName
-    JobName=S3Url.split("/")[-1].replace("-","").replace(".","_")
-    #check if the data import job already exsit
-    response = client.list_dataset_import_jobs(
-    Filters=[{
-            'Key': 'DatasetArn',
-            'Value': DataSetArn,
-            'Condition': 'IS'
-            },])
-    existingJobList=response["DatasetImportJobs"]
-    for job in existingJobList:
+# dataset files are target.csv/related.csv, see outputformat in the common layer
+def getDataFileType(objectKey):
+    fileName=objectKey.split("/")[-1]
+    for dataFileType in ("target","related"):
+        if (fileName==dataFileType+".csv"):
+            return dataFileType
+    return None
+
+
+# rules to use S3Url generating data import JobName
+def getImportJobName(S3Url):
+    return S3Url.split("/")[-1].replace("-","").replace(".","_")
+
+def isExistingDataImportJob(inventory, DataSetArn, S3Url):
+    JobName=getImportJobName(S3Url)
+    for job in inventory.datasetImportJobsByDataset(DataSetArn):
         if (JobName==job["DatasetImportJobName"]):
             logger.info("DatasetImportJob already exist: "+JobName)
-            return
-    # if the job not exist
+            return True
+    return False
+
+def createDataImportJob(client, DataSetArn, S3Url):
+    JobName=getImportJobName(S3Url)
     logger.info("start the data import job for " + JobName + "; for dataset "+DataSetArn+ "; with datasource " + S3Url )
     response = client.create_dataset_import_job(
         DatasetImportJobName=JobName,
@@ -66,23 +74,21 @@ def upsertDataImportJob(client, DataSetArn, S3Url):
                 'RoleArn': roleArn,
             }
         },
-        TimestampFormat='yyyy-MM-dd'
+        TimestampFormat='yyyy-MM-dd',
+        Format='CSV'
     )
 
 
-def isExistingDataSetGroup(client, datasetGroupName):
-    response = client.list_dataset_groups()
-    for dsgroup in response["DatasetGroups"]:
-        if (datasetGroupName == dsgroup["DatasetGroupName"]):
-            return True
-    return False
+def isExistingDataSetGroup(inventory, datasetGroupName):
+    return inventory.datasetGroupByName(datasetGroupName) is not None
 
 
-def upsertDataSet(existingDataSets, client, schema, datasetName, datasetType):
-    for ds in existingDataSets:
-        if (ds["DatasetName"] == datasetName):
-            logger.info("dataset already exist: "+datasetName)
-            return ds["DatasetArn"]
+def upsertDataSet(inventory, schema, datasetName, datasetType):
+    existingDataSet=inventory.datasetByName(datasetName)
+    if (existingDataSet is not None):
+        logger.info("dataset already exist: "+datasetName)
+        return existingDataSet["DatasetArn"]
+    client=inventory.client
     response = client.create_dataset(
         DatasetName=datasetName,
         Domain='CUSTOM',
@@ -91,65 +97,101 @@ def upsertDataSet(existingDataSets, client, schema, datasetName, datasetType):
         DataFrequency='D',
         Schema=schema
     )
+    inventory.invalidate("datasets")
     return response["DatasetArn"]
 
 
+# cached across warm invocations, revalidated by ETag (see configcache in the common layer)
 def loadconfig(DGName):
+    configFile_key=configcache.datasetGroupConfigKey(DGName)
     try:
-        configFile_path = "/tmp/"+DGName+".json"
-        configFile_key="DatasetGroups/"+DGName+"/config.json"
-        response = s3_client.list_objects_v2(
-            Bucket=S3BucketName,
-            Prefix=configFile_key
-        )
-        for content in response["Contents"]:
-            s3_client.download_file(S3BucketName, configFile_key, configFile_path)
-            with open(configFile_path) as f:
-                 config = json.load(f)
-                 return config
+        return configcache.loadConfig(s3_client, S3BucketName, configFile_key)
     except Exception as e:
         logger.error("Failed to load json config bucket= " + S3BucketName + " with key=" + configFile_key)
         raise e
 
-def onEventHandler(event, context):
-    body = json.loads(event['Records'][0]['body'])
+# SQS record (SNS envelope around the S3 notification) -> [(datasetGroupName, dataFileType, s3ObjectUrl)]
+def getDataFileEvents(record):
+    body = json.loads(record['body'])
     message = json.loads(body['Message'])
     logger.debug("From SQS: " + json.dumps(message))
-    s3_object_info=message["Records"][0]["s3"]
-    sourceBucketName = s3_object_info["bucket"]["name"]
-    sourceObjectKey = s3_object_info["object"]["key"]
-    if (not "DatasetGroups" in sourceObjectKey):
-        logger.debug("s3 object key do not contain DatasetGroups, ignore and skip, objectkey="+sourceObjectKey)
-        return
-    s3ObjectUrl = "s3://" + sourceBucketName + "/" + sourceObjectKey
-
-    datasetGroupName = sourceObjectKey.split("/")[1]
+    dataFileEvents=[]
+    # s3:TestEvent notifications have no Records
+    for s3Record in message.get("Records", []):
+        s3_object_info=s3Record["s3"]
+        sourceBucketName = s3_object_info["bucket"]["name"]
+        sourceObjectKey = unquote_plus(s3_object_info["object"]["key"])
+        if (not "DatasetGroups" in sourceObjectKey):
+            logger.debug("s3 object key do not contain DatasetGroups, ignore and skip, objectkey="+sourceObjectKey)
+            continue
+        # other files (config.json) still make sure the dataset group exists, dataFileType is None for them
+        dataFileType=getDataFileType(sourceObjectKey)
+        dataFileEvents.append((sourceObjectKey.split("/")[1], dataFileType, "s3://" + sourceBucketName + "/" + sourceObjectKey))
+    return dataFileEvents
+
+# creates the datasets and the dataset group if needed, returns {dataFileType: datasetArn}
+def upsertDataSetGroup(inventory, datasetGroupName):
     logger.info("upsert forecast dataset group=" + datasetGroupName)
-
     config=loadconfig(datasetGroupName)
-    target_schema=config["target_schema"]
-    related_schema=config["related_schema"]
-    response = forecast_client.list_datasets()
-    existingDataSets = response["Datasets"]
     # upsert data set
-    targetDataSetArn = upsertDataSet(existingDataSets, forecast_client, target_schema, datasetGroupName + "_target",
-                                     "TARGET_TIME_SERIES")
-    relatedDataSetArn = upsertDataSet(existingDataSets, forecast_client, related_schema, datasetGroupName + "_related",
-                                      "RELATED_TIME_SERIES")
-
+    dataSetArns = {
+        "target": upsertDataSet(inventory, config["target_schema"], datasetGroupName + "_target", "TARGET_TIME_SERIES"),
+        "related": upsertDataSet(inventory, config["related_schema"], datasetGroupName + "_related", "RELATED_TIME_SERIES")
+    }
     # if dataGroup not exist, create
-    if (not isExistingDataSetGroup(forecast_client, datasetGroupName)):
-        response = forecast_client.create_dataset_group(
+    if (not isExistingDataSetGroup(inventory, datasetGroupName)):
+        response = inventory.client.create_dataset_group(
             DatasetGroupName=datasetGroupName,
             Domain='CUSTOM',
             DatasetArns=[
-                targetDataSetArn, relatedDataSetArn
+                dataSetArns["target"], dataSetArns["related"]
             ]
         )
+        inventory.invalidate("datasetGroups")
         logger.info("triggerred creation of forecast datasetgroup=" + datasetGroupName)
+    return dataSetArns
+
+# every record of the SQS batch is handled, messages are grouped by dataset group so each group is set up once,
+# then all missing import jobs (target and related of every group) start concurrently
+# failed messages are reported back (ReportBatchItemFailures) and only those are retried by SQS
+@lambdaruntime.handler
+def onEventHandler(event, context):
+    failedMessageIds=set()
+    messageIdsByGroup=defaultdict(set)
+    dataFilesByGroup=defaultdict(dict)
+    for record in event['Records']:
+        try:
+            for datasetGroupName, dataFileType, s3ObjectUrl in getDataFileEvents(record):
+                messageIdsByGroup[datasetGroupName].add(record.get('messageId'))
+                if (dataFileType is not None):
+                    dataFilesByGroup[datasetGroupName][(dataFileType, s3ObjectUrl)]=True
+        except Exception as e:
+            logger.error("Failed to parse message=" + str(record.get('messageId')) + ", error=" + str(e))
+            failedMessageIds.add(record.get('messageId'))
+
+    inventory = ForecastInventory(forecast_client)
+    pendingImports=[]
+    for datasetGroupName in sorted(messageIdsByGroup):
+        try:
+            dataSetArns=upsertDataSetGroup(inventory, datasetGroupName)
+            for dataFileType, s3ObjectUrl in dataFilesByGroup[datasetGroupName]:
+                if (not isExistingDataImportJob(inventory, dataSetArns[dataFileType], s3ObjectUrl)):
+                    pendingImports.append((datasetGroupName, dataSetArns[dataFileType], s3ObjectUrl))
+        except Exception as e:
+            logger.error("Failed to upsert datasetGroup= " + datasetGroupName + ", error=" + str(e))
+            failedMessageIds.update(messageIdsByGroup[datasetGroupName])
 
     # load history data
-    if ("target.csv" in s3ObjectUrl):
-        upsertDataImportJob(forecast_client, targetDataSetArn, s3ObjectUrl)
-    if ("related.csv" in s3ObjectUrl):
-        upsertDataImportJob(forecast_client, relatedDataSetArn, s3ObjectUrl)
+    if (len(pendingImports)>0):
+        with ThreadPoolExecutor(max_workers=min(MaxImportWorkers, len(pendingImports))) as executor:
+            futures=[executor.submit(createDataImportJob, forecast_client, dataSetArn, s3ObjectUrl) for _, dataSetArn, s3ObjectUrl in pendingImports]
+            for (datasetGroupName, dataSetArn, s3ObjectUrl), future in zip(pendingImports, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("Failed to start data import for " + s3ObjectUrl + ", error=" + str(e))
+                    failedMessageIds.update(messageIdsByGroup[datasetGroupName])
+        inventory.invalidate("datasetImportJobs")
+
+    # a record without messageId can't be reported back on its own, it is only logged
+    return {"batchItemFailures": [{"itemIdentifier": messageId} for messageId in sorted(failedMessageIds-{None})]}
@@ -1,118 +1,74 @@
 #Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #SPDX-License-Identifier: MIT-0
+import lambdaruntime
 import os
-import io
-import json
-import boto3
-import random
-from urllib.parse import unquote_plus
-import csv
-from datetime import date,timezone
-from datetime import datetime
-from datetime import timedelta
+import time
 import logging
+from forecastinventory import ForecastInventory
+import teardown
+import retentionpolicy
+from datetime import datetime, timezone
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-forecast_client = boto3.client("forecast")
+forecast_client = lambdaruntime.lazyClient("forecast")
+cloudwatch_client = lambdaruntime.lazyClient('cloudwatch')
 #https://docs.aws.amazon.com/forecast/latest/dg/limits.html
 numberOfForecastsToKeep=int(os.environ['NumberOfForecastsToKeep'])
+# retention per modelName (see retentionpolicy), RetentionPolicies overrides the defaults per model as json
+KeepBestByAccuracy=int(os.environ.get('KeepBestByAccuracy','0'))
+MaxForecastAgeDays=float(os.environ.get('MaxForecastAgeDays','0'))
+RetentionMetric=os.environ.get('RetentionMetric',retentionpolicy.DEFAULT_METRIC)
+RetentionQuantile=os.environ.get('RetentionQuantile',retentionpolicy.DEFAULT_QUANTILE)
+RetentionPolicies=os.environ.get('RetentionPolicies','{}')
+MetricNameSpace=os.environ.get('MetricsNameSpace','')
+# only report what would be deleted (also with {"dryRun": true} as event)
+DryRun=os.environ.get('DryRun','false').lower()=='true'
 
-def isExistingDataSet(client,datasetArn):
-    response=client.list_datasets()
-    for dataset in response["Datasets"]:
-        if(dataset["DatasetArn"]==datasetArn):
-          return True
-    return False
+# seconds kept free at the end of the invocation
+TimeMarginSeconds=int(os.environ.get('TeardownTimeMarginSeconds','30'))
+MaxTeardownWorkers=int(os.environ.get('MaxTeardownWorkers',str(teardown.DEFAULT_MAX_WORKERS)))
+# time budget when there is no lambda context (local runs): 10 minutes, below the 15 minutes lambda limit, so a run
+# started by hand stops like the deployed function would instead of waiting on slow deletes indefinitely
+NO_CONTEXT_TIME_BUDGET_SECONDS=600
 
-#https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/forecast.html#ForecastService.Client.list_datasets
-#there's situation where dataset already deleted but still registered under datasetgroup
-def noExistingDataset(client,datasetGroupArn):
-    response = client.describe_dataset_group(DatasetGroupArn=datasetGroupArn)
-    numOfExistingDataSets = len(response["DatasetArns"])
-    hasExistingDataSet=False
-    for datasetArn in response["DatasetArns"]:
-        if(noExistingDataImportJobs(client, datasetArn)):
-            if(isExistingDataSet(client,datasetArn)):
-              client.delete_dataset(DatasetArn=datasetArn)
-              logger.info("Dataset deletion triggerred, DatasetArn="+datasetArn)
-              hasExistingDataSet=True
-        else:
-            hasExistingDataSet=True
-    return (not hasExistingDataSet)
+def getPolicies():
+    defaultPolicy=retentionpolicy.newPolicy(numberOfForecastsToKeep, KeepBestByAccuracy, MaxForecastAgeDays, RetentionMetric, RetentionQuantile)
+    return retentionpolicy.loadPolicies(defaultPolicy, RetentionPolicies)
 
-# only return true if there's no existing data import jobs, if yes, then trigger the deletion
-def noExistingDataImportJobs(client,DatasetArn):
-    response = client.list_dataset_import_jobs( Filters=[
-         {
-            'Key': 'DatasetArn',
-            'Value': DatasetArn,
-            'Condition': 'IS'
-         },
-     ])
-    numOfExistingDataImportJobs = len(response["DatasetImportJobs"])
-    for importjob in response["DatasetImportJobs"]:
-        importjobArn=importjob["DatasetImportJobArn"]
-        client.delete_dataset_import_job(DatasetImportJobArn=importjobArn)
-        logger.info("DatasetImportJob deletion triggerred, DatasetImportJob="+importjobArn)
-    return (numOfExistingDataImportJobs==0)
+def getAccuracy(prefix, policy, startDay, endDay):
+    if (MetricNameSpace==""):
+        return {}
+    try:
+        return retentionpolicy.fetchAccuracy(cloudwatch_client, MetricNameSpace, prefix, policy, startDay, endDay)
+    except Exception as e:
+        # without accuracy data only keep/maxAgeDays apply
+        logger.warning("accuracy metrics not available for model="+prefix+": "+str(e))
+        return {}
 
+def getTimeLeft(context):
+    if (context is None or not hasattr(context, "get_remaining_time_in_millis")):
+        deadline=time.monotonic()+NO_CONTEXT_TIME_BUDGET_SECONDS
+        return lambda: deadline-time.monotonic()
+    return lambda: context.get_remaining_time_in_millis()/1000.0-TimeMarginSeconds
 
-# only return true if there's no existing predictors, if yes, then trigger the deletion
-def noExistingPredictors(client,datasetGroupArn):
-    response = client.list_predictors( Filters=[
-         {
-            'Key': 'DatasetGroupArn',
-            'Value': datasetGroupArn,
-            'Condition': 'IS'
-         },
-     ])
-    numOfExistingPredictors = len(response["Predictors"])
-    for predictor in response["Predictors"]:
-        predictorArn=predictor["PredictorArn"]
-        client.delete_predictor(PredictorArn=predictorArn)
-        logger.info("Predictor deletion triggerred, PredictorArn="+predictorArn)
-    return (numOfExistingPredictors==0)
-
-# only return true if there's no existing Forecasts, if yes, then trigger the deletion
-def noExistingForecasts(client,datasetGroupArn):
-    response = client.list_forecasts( Filters=[
-         {
-            'Key': 'DatasetGroupArn',
-            'Value': datasetGroupArn,
-            'Condition': 'IS'
-         },
-     ])
-    numOfExistingForecasts = len(response["Forecasts"])
-    for forecast in response["Forecasts"]:
-        forecastArn=forecast["ForecastArn"]
-        client.delete_forecast(ForecastArn=forecastArn)
-        logger.info("Forecast deletion triggerred, ForecastArn="+forecastArn)
-    return (numOfExistingForecasts==0)
-
-def trigger_deleteDS(datasetGroup):
-    dsGroupArn=datasetGroup["DatasetGroupArn"]
-    if(noExistingForecasts(forecast_client,dsGroupArn )):
-      if(noExistingPredictors(forecast_client,dsGroupArn)):
-          if(noExistingDataset(forecast_client,dsGroupArn)):
-              forecast_client.delete_dataset_group(DatasetGroupArn=dsGroupArn)
-              logger.info("DatasetGroup deletion triggerred, DatasetGroupArn="+dsGroupArn)
-
+@lambdaruntime.handler
 def onEventHandler(event, context):
-    response = forecast_client.list_dataset_groups()
-    numOfDSGroup=len(response["DatasetGroups"])
-    oldest_creationDate=datetime.now(timezone.utc)
-
-    if(numOfDSGroup>numberOfForecastsToKeep):
-        #delete the oldest
-        for datasetGroup in response["DatasetGroups"]:
-            creationTime=datasetGroup["CreationTime"]
-            if(oldest_creationDate>=creationTime):
-               oldest_creationDate=creationTime
-               oldest_datasetGroup=datasetGroup
-        logger.info ("the oldest forecast is going to be deleted, datasetGroupName="+ datasetGroup["DatasetGroupName"])
-        logger.debug(datasetGroup)
-        trigger_deleteDS(datasetGroup)
-    else:
+    inventory = ForecastInventory(forecast_client)
+    datasetGroups = inventory.datasetGroups()
+    numOfDSGroup=len(datasetGroups)
+    decisions=retentionpolicy.evaluate(datasetGroups, getPolicies(), datetime.now(timezone.utc), getAccuracy)
+    expiredDatasetGroups=retentionpolicy.expiredDatasetGroups(decisions)
+    if (DryRun or (isinstance(event, dict) and event.get("dryRun"))):
+        report=retentionpolicy.formatReport(decisions)
+        logger.info("retention dry run, "+str(len(expiredDatasetGroups))+" of "+str(numOfDSGroup)+" DatasetGroups would be deleted\n"+"\n".join(report))
+        return {"dryRun": True, "expired": [decision["datasetGroupName"] for decision in expiredDatasetGroups], "report": report}
+    if(len(expiredDatasetGroups)==0):
         logger.info("number for DatasetGroups="+str(numOfDSGroup)+",  limitation="+str(numberOfForecastsToKeep)+ ", nothing to do")
+        return
+    logger.info("expired forecasts are going to be deleted, datasetGroupNames="+",".join(decision["datasetGroupName"] for decision in expiredDatasetGroups))
+    plans=[teardown.buildPlan(inventory, inventory.datasetGroupByArn(decision["datasetGroupArn"])) for decision in expiredDatasetGroups]
+    result=teardown.teardown(forecast_client, plans, getTimeLeft(context), MaxTeardownWorkers)
+    logger.info("teardown result: deleted="+",".join(result["deleted"])+", failed="+",".join(result["failed"])+", remaining="+",".join(result["remaining"]))
+    return result
@@ -0,0 +1,109 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import re
+import json
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger()
+
+# retention of dataset groups, applied per model: groups are partitioned by the modelName prefix of their name
+# (<modelName>_<yyyymmdd start>_<yyyymmdd end>, see rawdataprocessor getDatasetGroupName) in a single pass, then per model
+#   keep       the newest `keep` groups are always retained
+#   keepBest   besides the newest ones, the `keepBest` groups with the lowest accuracy `metric` (for quantile `quantile`) are retained,
+#              read from the metrics forecastMetrics publishes (ModelConfig/P dimensions, timestamp = forecast start day)
+#   maxAgeDays groups older than this are expired even when they are among the best (0 = no limit)
+# everything else is expired; groups whose name doesn't follow the pattern form one more partition under the default
+# policy's keep and maxAgeDays (no forecast start day, so no keepBest)
+# ties are broken towards the newer group (same creation time: by name)
+DEFAULT_METRIC="wQL"
+DEFAULT_QUANTILE="p50"
+GROUP_NAME_PATTERN=re.compile(r"^(?P<prefix>.+)_(?P<start>\d{8})_(?P<end>\d{8})$")
+SECONDS_PER_DAY=86400
+
+
+# (modelName prefix, forecast start day) or (None, None)
+def parseGroupName(datasetGroupName):
+    match=GROUP_NAME_PATTERN.match(datasetGroupName)
+    if (match is None):
+        return None, None
+    endDay=datetime.strptime(match.group("end"), "%Y%m%d").date()
+    return match.group("prefix"), endDay+timedelta(days=1)
+
+def newPolicy(keep, keepBest=0, maxAgeDays=0, metric=DEFAULT_METRIC, quantile=DEFAULT_QUANTILE):
+    return {"keep": int(keep), "keepBest": int(keepBest), "maxAgeDays": float(maxAgeDays), "metric": metric, "quantile": quantile}
+
+# default policy, overridden per modelName prefix by a json object {"<modelName>": {"keep": 3, ...}}
+def loadPolicies(defaultPolicy, overridesJson=None):
+    policies={"": defaultPolicy}
+    for prefix, override in json.loads(overridesJson or "{}").items():
+        policy=dict(defaultPolicy)
+        policy.update(override)
+        policies[prefix]=newPolicy(**policy)
+    return policies
+
+def policyFor(policies, prefix):
+    return policies.get(prefix, policies[""])
+
+
+# accuracy per forecast start day for one model, lower is better (MAPE, WAPE, RMSE, wQL)
+def fetchAccuracy(cloudwatchClient, namespace, prefix, policy, startDay, endDay):
+    response=cloudwatchClient.get_metric_statistics(
+        Namespace=namespace, MetricName=policy["metric"],
+        Dimensions=[{"Name": "ModelConfig", "Value": prefix}, {"Name": "P", "Value": policy["quantile"]}],
+        StartTime=datetime(startDay.year, startDay.month, startDay.day, tzinfo=timezone.utc),
+        EndTime=datetime(endDay.year, endDay.month, endDay.day, tzinfo=timezone.utc)+timedelta(days=1),
+        Period=SECONDS_PER_DAY, Statistics=["Average"])
+    return {datapoint["Timestamp"].date(): datapoint["Average"] for datapoint in response.get("Datapoints", [])}
+
+# accuracyLookup(prefix, policy, startDay, endDay) -> {forecast start day: value}, or None to skip keepBest
+def evaluate(datasetGroups, policies, now, accuracyLookup=None):
+    partitions={}
+    decisions=[]
+    for datasetGroup in datasetGroups:
+        prefix, forecastStartDay=parseGroupName(datasetGroup["DatasetGroupName"])
+        decision={"datasetGroupName": datasetGroup["DatasetGroupName"], "datasetGroupArn": datasetGroup["DatasetGroupArn"],
+                  "modelName": prefix, "creationTime": datasetGroup["CreationTime"], "forecastStartDay": forecastStartDay,
+                  "ageDays": round((now-datasetGroup["CreationTime"]).total_seconds()/SECONDS_PER_DAY, 2), "accuracy": None,
+                  "expired": False, "reasons": []}
+        decisions.append(decision)
+        if (prefix is None):
+            decision["reasons"].append("name doesn't match <modelName>_<start>_<end>, default policy")
+        partitions.setdefault(prefix, []).append(decision)
+
+    for prefix, members in partitions.items():
+        policy=policies[""] if prefix is None else policyFor(policies, prefix)
+        newest=set(id(decision) for decision in heapq.nlargest(policy["keep"], members, key=lambda decision: (decision["creationTime"], decision["datasetGroupName"])))
+        tooOld=set(id(decision) for decision in members if policy["maxAgeDays"]>0 and decision["ageDays"]>policy["maxAgeDays"])
+        best=set()
+        if (prefix is not None and policy["keepBest"]>0 and accuracyLookup is not None):
+            accuracy=accuracyLookup(prefix, policy, min(decision["forecastStartDay"] for decision in members), max(decision["forecastStartDay"] for decision in members))
+            # the best groups are kept on top of the newest ones
+            candidates=[]
+            for decision in members:
+                decision["accuracy"]=accuracy.get(decision["forecastStartDay"])
+                if (decision["accuracy"] is not None and id(decision) not in newest and id(decision) not in tooOld):
+                    candidates.append(decision)
+            best=set(id(decision) for decision in heapq.nsmallest(policy["keepBest"], candidates, key=lambda decision: (decision["accuracy"], -decision["creationTime"].timestamp())))
+        for decision in members:
+            if (id(decision) in newest):
+                decision["reasons"].append("among the newest "+str(policy["keep"]))
+            elif (id(decision) in best):
+                decision["reasons"].append("among the best "+str(policy["keepBest"])+" by "+policy["metric"]+"/"+policy["quantile"])
+            else:
+                decision["expired"]=True
+                decision["reasons"].append("older than "+str(policy["maxAgeDays"])+" days" if id(decision) in tooOld else "not retained by keep/keepBest")
+    return decisions
+
+def expiredDatasetGroups(decisions):
+    # oldest first, so a partial teardown clears the oldest groups first
+    return sorted([decision for decision in decisions if decision["expired"]], key=lambda decision: decision["creationTime"])
+
+# dry-run report, one line per dataset group
+def formatReport(decisions):
+    lines=[]
+    for decision in sorted(decisions, key=lambda decision: (str(decision["modelName"]), decision["creationTime"])):
+        lines.append(("EXPIRE " if decision["expired"] else "KEEP   ")+decision["datasetGroupName"]+" age="+str(decision["ageDays"])+"d"
+                     +" accuracy="+str(decision["accuracy"])+" ("+"; ".join(decision["reasons"])+")")
+    return lines
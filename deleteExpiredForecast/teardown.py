@@ -0,0 +1,162 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger()
+
+# teardown of whole dataset groups, children before parents:
+#   export jobs -> forecasts -> predictors -> import jobs -> datasets -> dataset group
+# every group advances on its own, a level is deleted once the previous level of the same group is gone.
+# deletes and status checks of all groups run in parallel, the status checks back off while nothing changes,
+# and the run stops when the time budget is used up; the next run rebuilds the plan from what is left
+FORECAST_EXPORT_JOB="forecastExportJob"
+FORECAST="forecast"
+PREDICTOR="predictor"
+DATASET_IMPORT_JOB="datasetImportJob"
+DATASET="dataset"
+DATASET_GROUP="datasetGroup"
+LEVELS=[FORECAST_EXPORT_JOB, FORECAST, PREDICTOR, DATASET_IMPORT_JOB, DATASET, DATASET_GROUP]
+
+# kind -> (delete operation, describe operation, arn parameter)
+OPERATIONS={
+    FORECAST_EXPORT_JOB: ("delete_forecast_export_job", "describe_forecast_export_job", "ForecastExportJobArn"),
+    FORECAST: ("delete_forecast", "describe_forecast", "ForecastArn"),
+    PREDICTOR: ("delete_predictor", "describe_predictor", "PredictorArn"),
+    DATASET_IMPORT_JOB: ("delete_dataset_import_job", "describe_dataset_import_job", "DatasetImportJobArn"),
+    DATASET: ("delete_dataset", "describe_dataset", "DatasetArn"),
+    DATASET_GROUP: ("delete_dataset_group", "describe_dataset_group", "DatasetGroupArn"),
+}
+
+# resource states: PENDING (delete to be requested), DELETING (requested), GONE, FAILED
+PENDING="PENDING"
+DELETING="DELETING"
+GONE="GONE"
+FAILED="FAILED"
+
+DEFAULT_MAX_WORKERS=8
+# deletes ending in DELETE_FAILED are retried this many times
+MAX_DELETE_ATTEMPTS=3
+POLL_BASE_SECONDS=5
+POLL_MAX_SECONDS=60
+POLL_BACKOFF_FACTOR=2
+
+
+def errorCode(error):
+    return error.response.get("Error", {}).get("Code") if isinstance(error, ClientError) else None
+
+def newResource(kind, arn):
+    return {"kind": kind, "arn": arn, "state": PENDING, "deleteAttempts": 0, "error": None}
+
+# every resource of the dataset group by level, from the inventory (plus describe_dataset_group for the dataset arns)
+def buildPlan(inventory, datasetGroup):
+    datasetGroupArn=datasetGroup["DatasetGroupArn"]
+    forecasts=inventory.forecastsByDatasetGroup(datasetGroupArn)
+    datasetArns=inventory.client.describe_dataset_group(DatasetGroupArn=datasetGroupArn)["DatasetArns"]
+    resources={
+        FORECAST_EXPORT_JOB: [job["ForecastExportJobArn"] for forecast in forecasts for job in inventory.forecastExportJobsByForecast(forecast["ForecastArn"])],
+        FORECAST: [forecast["ForecastArn"] for forecast in forecasts],
+        PREDICTOR: [predictor["PredictorArn"] for predictor in inventory.predictorsByDatasetGroup(datasetGroupArn)],
+        DATASET_IMPORT_JOB: [job["DatasetImportJobArn"] for datasetArn in datasetArns for job in inventory.datasetImportJobsByDataset(datasetArn)],
+        # a dataset can still be registered in the group after it was deleted
+        DATASET: [datasetArn for datasetArn in datasetArns if inventory.datasetByArn(datasetArn) is not None],
+        DATASET_GROUP: [datasetGroupArn],
+    }
+    return {"datasetGroupName": datasetGroup["DatasetGroupName"], "level": 0,
+            "levels": [[newResource(kind, arn) for arn in resources[kind]] for kind in LEVELS]}
+
+def currentResources(plan):
+    return plan["levels"][plan["level"]] if plan["level"]<len(LEVELS) else []
+
+def isDone(plan):
+    return plan["level"]>=len(LEVELS)
+
+def isFailed(plan):
+    return any(resource["state"]==FAILED for resource in currentResources(plan))
+
+# moves on while the current level is gone, returns True if the group advanced
+def advance(plan):
+    advanced=False
+    while (not isDone(plan) and all(resource["state"]==GONE for resource in currentResources(plan))):
+        plan["level"]+=1
+        advanced=True
+        if (not isDone(plan)):
+            logger.info("dataset group="+plan["datasetGroupName"]+" teardown at level="+LEVELS[plan["level"]]+" ("+str(len(currentResources(plan)))+" resource(s))")
+    return advanced
+
+
+def requestDelete(client, resource):
+    operation, _, parameter=OPERATIONS[resource["kind"]]
+    resource["deleteAttempts"]+=1
+    try:
+        getattr(client, operation)(**{parameter: resource["arn"]})
+        resource["state"]=DELETING
+        logger.info(resource["kind"]+" deletion triggered, arn="+resource["arn"])
+    except ClientError as e:
+        code=errorCode(e)
+        if (code=="ResourceNotFoundException"):
+            resource["state"]=GONE
+        elif (code in ("ResourceInUseException", "LimitExceededException")):
+            # still being created, or a child isn't gone yet on the service side, retried on a later round (bounded by the time budget)
+            resource["deleteAttempts"]-=1
+            resource["state"]=PENDING
+        else:
+            resource["state"]=FAILED
+            resource["error"]=str(e)
+            logger.error(resource["kind"]+" deletion failed, arn="+resource["arn"]+": "+str(e))
+    return resource
+
+def checkResource(client, resource):
+    _, operation, parameter=OPERATIONS[resource["kind"]]
+    try:
+        status=getattr(client, operation)(**{parameter: resource["arn"]}).get("Status", "")
+    except ClientError as e:
+        if (errorCode(e)=="ResourceNotFoundException"):
+            resource["state"]=GONE
+        else:
+            # checked again on the next round
+            logger.warning(resource["kind"]+" status check failed, arn="+resource["arn"]+": "+str(e))
+        return resource
+    if (status=="DELETE_FAILED"):
+        resource["state"]=PENDING if resource["deleteAttempts"]<MAX_DELETE_ATTEMPTS else FAILED
+    return resource
+
+def runParallel(fn, client, resources, maxWorkers):
+    if (len(resources)<=1 or maxWorkers<=1):
+        return [fn(client, resource) for resource in resources]
+    with ThreadPoolExecutor(max_workers=min(maxWorkers, len(resources))) as executor:
+        return list(executor.map(lambda resource: fn(client, resource), resources))
+
+
+# runs the plans until every group is gone or failed, or timeLeft() (seconds) can't cover the next wait
+# returns {"deleted": [names], "failed": [names], "remaining": [names]}
+def teardown(client, plans, timeLeft, maxWorkers=DEFAULT_MAX_WORKERS, sleep=time.sleep):
+    for plan in plans:
+        advance(plan)
+    delay=POLL_BASE_SECONDS
+    while True:
+        active=[plan for plan in plans if not isDone(plan) and not isFailed(plan)]
+        if (len(active)==0):
+            break
+        toDelete=[resource for plan in active for resource in currentResources(plan) if resource["state"]==PENDING]
+        runParallel(requestDelete, client, toDelete, maxWorkers)
+        toCheck=[resource for plan in active for resource in currentResources(plan) if resource["state"]==DELETING]
+        runParallel(checkResource, client, toCheck, maxWorkers)
+        progressed=False
+        for plan in active:
+            progressed=advance(plan) or progressed
+        if (progressed):
+            delay=POLL_BASE_SECONDS
+            continue
+        if (timeLeft()<delay):
+            logger.info("teardown time budget used up, the remaining resources are picked up by the next run")
+            break
+        sleep(delay)
+        delay=min(POLL_MAX_SECONDS, delay*POLL_BACKOFF_FACTOR)
+    result={"deleted": [], "failed": [], "remaining": []}
+    for plan in plans:
+        key="deleted" if isDone(plan) else ("failed" if isFailed(plan) else "remaining")
+        result[key].append(plan["datasetGroupName"])
+    return result
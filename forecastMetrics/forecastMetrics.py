@@ -1,27 +1,44 @@
 #Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #SPDX-License-Identifier: MIT-0
+import lambdaruntime
 import os
 import io
 import json
-import boto3
-import random
 import csv
-import botocore
-from datetime import date
 from datetime import datetime
 from datetime import timedelta
-from urllib.parse import unquote_plus
 import vars
+import numpy as np
+from timeseriesstore import TimeSeriesStore, RowBatch, toFloat
+import keycodec
+from actualsstore import ActualsStore
+from metricpublisher import MetricPublisher
+import forecastaccuracy
+from s3batch import S3BatchTransfer
+import s3stream
+import configcache
+import archivemover
+import forecastresources
+import instrumentation
 import logging
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 S3BucketName=os.environ['S3BucketName']
-s3_client = boto3.client('s3')
-cloudwatch_client = boto3.client('cloudwatch')
-s3_resource = boto3.resource('s3')
+s3_client = lambdaruntime.lazyClient('s3')
+# the batch layers retry throttled calls themselves, their clients don't retry in botocore
+s3_transfer = S3BatchTransfer(lambdaruntime.lazyClient('s3', lambdaruntime.NO_RETRIES))
+cloudwatch_client = lambdaruntime.lazyClient('cloudwatch', lambdaruntime.NO_RETRIES)
 MetricNameSpace=os.environ['MetricsNameSpace']
+# api (put_metric_data), emf (embedded metric format log lines) or both
+MetricsOutput=os.environ.get('MetricsOutput','api')
+# every item adds its own custom metrics (ItemId dimension, billed per metric), so they are off by default
+PerItemMetrics=os.environ.get('PerItemMetrics','false').lower()=='true'
+MetricsMaxWorkers=int(os.environ.get('MetricsMaxWorkers','4'))
+# archiving stops when less time than this is left in the invocation, the next run resumes it
+ArchiveTimeMarginMillis=int(os.environ.get('ArchiveTimeMarginMillis','10000'))
+dayOrdinals=keycodec.dayOrdinals
 
 
 def tranformDateToString(date):
@@ -35,184 +52,225 @@ def getDateFromString(dateString):
 def getCurrentDayRealData(currentDay):
     targetfile='target_'+tranformDateToString(currentDay)+".csv"
     targetfile_key='covid-19-daily/'+targetfile
-    download_path='/tmp/'+targetfile
+    currentDayRealData={}
     try:
-        s3_client.download_file(S3BucketName,targetfile_key,download_path)
-    except:
-        logger.info("no historical data found for " + tranformDateToString(currentDay) + " in bucket=" + S3BucketName + " , with key=" + targetfile_key)
+        # daily files have no header row
+        readerObj=s3stream.iterCsvRows(s3_client,S3BucketName,targetfile_key)
+        for row in readerObj:
+           currentDayRealData[row[1]]=row[2]
+    except s3_client.exceptions.NoSuchKey:
+        logger.debug("no historical data found for " + tranformDateToString(currentDay) + " in bucket=" + S3BucketName + " , with key=" + targetfile_key)
         return None
-    inputFile=open(download_path,'r')
-    readerObj=csv.reader(inputFile)
-    next(readerObj)
-    currentDayRealData={}
-    for row in readerObj:
-       currentDayRealData[row[1]]=row[2]
     return currentDayRealData
 
 
 def getTimestampByDate(currentDay):
     return datetime(currentDay.year, currentDay.month, currentDay.day)
 
-def getMetricData(metricTimeStamp, modelConfig, abs, p):
-    MetricData={
-                'MetricName': 'ForecastPerformance',
-                'Dimensions': [
-                    {
-                        'Name': 'ModelConfig',
-                        'Value': modelConfig
-                    },
-                    {
-                        'Name': 'P',
-                        'Value': p
-                    },
-                ],
-                'Timestamp': metricTimeStamp,
-                'Value': abs,
-                'Unit': 'None'
-            }
-    return MetricData
-
-def publishMetrics(currentDay,currentDayRealData,config):
-    total_dif=0
-    metricDataList=[]
-    metricTimeStamp=getTimestampByDate(currentDay)
+def getActuals():
+    if (vars.Actuals is None):
+        vars.Actuals=ActualsStore(s3_client,S3BucketName)
+    return vars.Actuals
+
+# real values for every day of the horizon, [day, item] aligned with the forecast store items, NaN where there's no real data
+# read from the monthly actuals partitions, the daily files are only used before the raw data processor wrote the first manifest
+@instrumentation.timed("actuals")
+def getHorizonRealData(startDay,endDay):
+    actuals=getActuals()
+    if (actuals.exists()):
+        return actuals.getRange(vars.ItemList,startDay.toordinal(),endDay.toordinal())
+    numOfDays=(endDay-startDay).days+1
+    realValues=np.full((numOfDays,len(vars.ItemList)), np.nan)
+    currentDay=startDay
+    for i in range(numOfDays):
+        currentDayRealData=getCurrentDayRealData(currentDay)
+        if(not currentDayRealData is None):
+            realValues[i]=[toFloat(currentDayRealData.get(item)) for item in vars.ItemList]
+        currentDay=currentDay+timedelta(days=1)
+    return realValues
+
+@instrumentation.timed("upload")
+def writeItemAccuracyReport(datasetGroupName,accuracy):
+    output=io.StringIO()
+    csvWriter=csv.writer(output)
+    csvWriter.writerow(["item_id","p"]+forecastaccuracy.METRIC_NAMES)
     for p in vars.forecastPList:
-      metricDataList=[]
-      for item in vars.ItemList:
-          if (item.upper() in currentDayRealData):
-              realValue=float(currentDayRealData[item.upper()])
-              forcastValue=float(vars.ForcastData[tranformDateToString(currentDay)][item.lower()][p])
-              if (realValue is None or realValue==0):
-                  state_abs=0
-              else:
-                  state_abs=(abs((forcastValue-realValue)/realValue))*100
-              total_dif=total_dif+state_abs
-              # currently not need by state data for model monitor
-              #metricDataList.append(getMetricData(metricTimeStamp, item, state_abs, p))
-      avarage_abs=total_dif/len(vars.ItemList)
-      logger.info("averageABS is "+str(avarage_abs) +  "============for :"+tranformDateToString(currentDay) +"====for p=" +p)
-      metricDataList.append(getMetricData(metricTimeStamp, config["modelName"], avarage_abs, p))
-      putForecastMetricsData(metricDataList)
-
-def putForecastMetricsData(metricDataList):
-    response = cloudwatch_client.put_metric_data(
-       Namespace=MetricNameSpace,
-       MetricData=metricDataList
-   )
-    logger.debug("metric put: "+ str (response))
-
-
-def processForecastCSV(csvPath):
-    inputFile=open(csvPath,'r')
-    readerObj=csv.reader(inputFile)
-    # get start and end date, get Rawdata Map
-    cur_startDate=date.today()
-    cur_endDate=None
-    colNameList=[]
+        csvWriter.writerow(["ALL",p]+[accuracy["aggregate"][p][name] for name in forecastaccuracy.METRIC_NAMES])
+        itemMetrics=[accuracy["items"][p][name].tolist() for name in forecastaccuracy.METRIC_NAMES]
+        for i, item in enumerate(vars.ItemList):
+            csvWriter.writerow([item,p]+[values[i] for values in itemMetrics])
+    reportKey="ForecastAccuracy/"+datasetGroupName+"/accuracy.csv"
+    s3_client.put_object(Bucket=S3BucketName, Key=reportKey, Body=output.getvalue().encode("utf-8"))
+    logger.info("per item accuracy report uploaded to bucket="+S3BucketName+", with key="+reportKey)
+
+# ForecastPerformance keeps its meaning for the dashboard (MAPE of the first forecast day),
+# MAPE/WAPE/RMSE/wQL cover every day of the horizon with real data available, they are published for the whole horizon,
+# per horizon day (HorizonDay dimension), per item (ItemId dimension, PerItemMetrics) and as the distribution over
+# the items (Item<metric>, one statistic set per quantile); all datums of a dataset group go out in batched calls
+def publishMetrics(startDay,realValues,config,datasetGroupName):
+    numOfDays=realValues.shape[0]
+    with instrumentation.span("accuracy"):
+        forecastValues={p: vars.ForcastData.getRange(startDay.toordinal(),startDay.toordinal()+numOfDays-1,p) for p in vars.forecastPList}
+        accuracy=forecastaccuracy.computeAccuracy(realValues,forecastValues,vars.forecastPList)
+    writeItemAccuracyReport(datasetGroupName,accuracy)
+    metricTimeStamp=getTimestampByDate(startDay)
+    publisher=MetricPublisher(cloudwatch_client, MetricNameSpace, MetricsOutput, MetricsMaxWorkers)
+    for p in vars.forecastPList:
+      dimensions=[("ModelConfig",config["modelName"]),("P",p)]
+      firstDayMAPE=accuracy["days"][p]["MAPE"][0]
+      if (not np.isnan(firstDayMAPE)):
+          logger.debug("averageABS is "+str(firstDayMAPE) +  "============for :"+tranformDateToString(startDay) +"====for p=" +p)
+          publisher.add("ForecastPerformance", dimensions, firstDayMAPE, metricTimeStamp)
+      for name in forecastaccuracy.METRIC_NAMES:
+          publisher.add(name, dimensions, accuracy["aggregate"][p][name], metricTimeStamp)
+          for day, value in enumerate(accuracy["days"][p][name].tolist()):
+              publisher.add(name, dimensions+[("HorizonDay",day+1)], value, metricTimeStamp)
+          itemValues=accuracy["items"][p][name]
+          publisher.addValues("Item"+name, dimensions, itemValues, metricTimeStamp)
+          if (PerItemMetrics):
+              for item, value in zip(vars.ItemList, itemValues.tolist()):
+                  publisher.add(name, dimensions+[("ItemId",item)], value, metricTimeStamp)
+      logger.info("horizon accuracy for p="+p+": "+json.dumps(accuracy["aggregate"][p]))
+    instrumentation.count("metricDatums", len(publisher))
+    with instrumentation.span("publish"):
+        publisher.flush()
+
+def parseForecastRows(readerObj, startOrdinal=None, endOrdinal=None):
+    quantiles=None
+    batch=None
     for row in readerObj:
        # header
        if(row[0]=="item_id"):
-          if (len(vars.forecastPList)==0):
-             for i in range(2,len(row)):
-                 vars.forecastPList.append(row[i])
+          if (quantiles is None):
+             quantiles=row[2:]
           continue
-       tmp_date_string=row[1][:10]
-       tmp_date=getDateFromString(tmp_date_string)
-       tmp_item_string=row[0]
-       if (not tmp_item_string in vars.ItemList):
-           vars.ItemList.append(tmp_item_string)
-       if (not tmp_date_string in vars.ForcastData):
-           vars.ForcastData[tmp_date_string]={}
-       if (not tmp_item_string in vars.ForcastData[tmp_date_string]):
-           vars.ForcastData[tmp_date_string][tmp_item_string]={}
-       tmp_object={}
-       i=2
-       for p in vars.forecastPList:
-          tmp_object[p]=row[i]
-          i=i+1
-       vars.ForcastData[tmp_date_string][tmp_item_string]=tmp_object
-    inputFile.close()
-
-def loopAllForecastExports(exportFolder):
-    response = s3_client.list_objects_v2(
-            Bucket=S3BucketName,
-            Prefix=exportFolder
-    )
-    for content in response["Contents"]:
-        key=content["Key"]
-        if(".csv" in key):
-            filePath="/tmp/"+key.split("/")[-1]
-            s3_client.download_file(S3BucketName, key, filePath)
-            processForecastCSV(filePath)
+       if (batch is None):
+          batch=RowBatch(len(quantiles if quantiles is not None else vars.forecastPList))
+       tmp_ordinal=dayOrdinals[row[1]]
+       if ((startOrdinal is not None and tmp_ordinal<startOrdinal) or (endOrdinal is not None and tmp_ordinal>endOrdinal)):
+          continue
+       # forecast export item ids are lower case, real data uses upper case state codes
+       batch.add(tmp_ordinal,row[0].upper(),[toFloat(value) for value in row[2:2+batch.numFields]])
+    return quantiles, None if batch is None else batch.partial()
+
+# partials are merged in shard order, the first header defines the quantiles (vars.forecastPList)
+def mergeForecastPartial(quantiles, partial):
+    if (len(vars.forecastPList)==0):
+       if (quantiles is None):
+          return
+       vars.forecastPList.extend(quantiles)
+       vars.ForcastData=TimeSeriesStore(vars.forecastPList)
+       vars.ItemList=vars.ForcastData.items
+    if (partial is not None):
+       vars.ForcastData.addRows(*partial)
+
+# csvSource is a local path or a binary file object
+def processForecastCSV(csvSource, startOrdinal=None, endOrdinal=None):
+    with (open(csvSource,'rb') if isinstance(csvSource,str) else csvSource) as inputFile:
+        quantiles, partial=parseForecastRows(s3stream.csvReader(inputFile), startOrdinal, endOrdinal)
+    mergeForecastPartial(quantiles, partial)
+
+# one export shard streamed from S3 and parsed, runs on the transfer thread pool
+def parseForecastShard(bucket, key, startOrdinal, endOrdinal):
+    return parseForecastRows(s3stream.iterCsvRows(s3_transfer.client, bucket, key), startOrdinal, endOrdinal)
+
+def resetForecastData():
+    vars.forecastPList=[]
+    vars.ForcastData=None
+    vars.ItemList=[]
+
+@instrumentation.timed("list")
+def listForecastExportShards(exportFolder):
+    keys=[]
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=S3BucketName, Prefix=exportFolder):
+        for content in page.get("Contents", []):
+            if(".csv" in content["Key"]):
+                keys.append(content["Key"])
+    return keys
+
+# all shards of the export (paginated listing) are streamed and parsed concurrently into per shard partials,
+# then merged in listing order; startDay/endDay limit the data to the evaluated dates
+def loopAllForecastExports(exportFolder, startDay=None, endDay=None):
+    resetForecastData()
+    startOrdinal=None if startDay is None else startDay.toordinal()
+    endOrdinal=None if endDay is None else endDay.toordinal()
+    shardKeys=listForecastExportShards(exportFolder)
+    with instrumentation.span("parse"):
+        partials=s3_transfer.run("parseForecastShard", parseForecastShard, [(S3BucketName, key, startOrdinal, endOrdinal) for key in shardKeys])
+        for quantiles, partial in partials:
+            mergeForecastPartial(quantiles, partial)
+    instrumentation.count("forecastShards", len(shardKeys))
+    logger.info("forecast export loaded from " + str(len(shardKeys)) + " shards under " + exportFolder + ", items=" + str(len(vars.ItemList)))
 
 
 def calculatePublishMetrics(forecastDatasetGroupName,config,exportFolder):
-    loopAllForecastExports(exportFolder)
-    forecast_starttime=config["forecast_starttime"]
-    # Only evaluate the first day's forcast Performance
-    currentDay=getDateFromString(forecast_starttime)
-    currentDayRealData=getCurrentDayRealData(currentDay)
-    if(not currentDayRealData is None):
-       publishMetrics(currentDay,currentDayRealData,config)
+    startDay=getDateFromString(config["forecast_starttime"])
+    endDay=getDateFromString(config["forecast_endtime"])
+    loopAllForecastExports(exportFolder,startDay,endDay)
+    if (vars.ForcastData is None or vars.ForcastData.numItems==0):
+        logger.info("no forecast data found under export folder=" + exportFolder)
+        return
+    realValues=getHorizonRealData(startDay,endDay)
+    if(not np.isnan(realValues).all()):
+       publishMetrics(startDay,realValues,config,forecastDatasetGroupName)
 
 def loadconfig(DGName):
+    configFile_key=configcache.datasetGroupConfigKey(DGName)
     try:
-        configFile_path = "/tmp/"+DGName+".json"
-        configFile_key="DatasetGroups/"+DGName+"/config.json"
-        response = s3_client.list_objects_v2(
-            Bucket=S3BucketName,
-            Prefix=configFile_key
-        )
-        for content in response["Contents"]:
-            s3_client.download_file(S3BucketName, configFile_key, configFile_path)
-            with open(configFile_path) as f:
-                 config = json.load(f)
-                 return config
+        return configcache.loadConfig(s3_client, S3BucketName, configFile_key)
     except Exception as e:
         logger.error("Failed to load json config bucket= " + S3BucketName + " with key=" + configFile_key)
         raise e
 
-def getExistingHistoricalDataKeyList():
-    dailyDataResponse = s3_client.list_objects_v2(
-        Bucket=S3BucketName,
-        Prefix='covid-19-daily'
-        )
-    existingDailyDataKeyList=[]
-    for content in dailyDataResponse["Contents"]:
-        existingDailyDataKeyList.append(content["Key"])
-    return existingDailyDataKeyList
-
-def checkHistoricalDataAvailable(existingDailyDataKeyList,startDate,endDate):
-    currentDay=startDate
-    while (currentDay<=endDate):
-        historyDataKey="covid-19-daily/target_"+tranformDateToString(currentDay)+".csv"
-        if (not historyDataKey in existingDailyDataKeyList):
-            return False
-        currentDay=currentDay+timedelta(days=1)
-    return True
+# ordinals of the days with real data, from the actuals manifest (or the daily files listing without a manifest)
+@instrumentation.timed("availability")
+def getAvailableHistoricalDays():
+    actuals=getActuals()
+    if (actuals.exists()):
+        return actuals.availableOrdinals()
+    availableDays=set()
+    paginator=s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=S3BucketName, Prefix="covid-19-daily/target_"):
+        for content in page.get("Contents",[]):
+            availableDays.add(dayOrdinals[content["Key"][len("covid-19-daily/target_"):-len(".csv")]])
+    return availableDays
+
+def checkHistoricalDataAvailable(availableDays,startDate,endDate):
+    return all(ordinal in availableDays for ordinal in range(startDate.toordinal(),endDate.toordinal()+1))
+
 
+# resumable move (see archivemover), the marker is deleted last so an interrupted archive is picked up again on the next run
+@instrumentation.timed("archive")
+def move_then_delete_path_v2(s3_client, bucket, path1, path2, shouldStop=None, markerKey=None):
+    return archivemover.movePrefix(s3_client, s3_transfer, bucket, path1, path2, shouldStop=shouldStop,
+                                   lastKeys=[] if markerKey is None else [markerKey])
+
+def getShouldStop(context):
+    if (context is None or not hasattr(context, "get_remaining_time_in_millis")):
+        return None
+    return lambda: context.get_remaining_time_in_millis()<ArchiveTimeMarginMillis
 
-def move_then_delete_path_v2(s3_client, bucket, path1, path2):
-    exportResponse = s3_client.list_objects_v2(
-        Bucket=bucket,
-        Prefix=path1
-        )
-    for content in exportResponse["Contents"]:
-        key=content["Key"]
-        newkey=key.replace(path1,path2)
-        copy_source = {'Bucket': bucket,'Key': key}
-        s3_client.copy_object(CopySource=copy_source, Bucket=bucket, Key=newkey)
-        s3_client.delete_object(Bucket=bucket, Key=key)
+# the pipeline orchestrator invokes the function with {"datasetGroupName": ...} once that group's export finished,
+# only its export folder is evaluated then; the scheduled run (no group) goes through every export
+def getExportPrefix(event):
+    if (isinstance(event, dict) and event.get("datasetGroupName")):
+        return 'ForecastExports/'+forecastresources.forecastName(event["datasetGroupName"])+'/'
+    return 'ForecastExports'
 
+@lambdaruntime.handler
 def onEventHandler(event, context):
-    existingDailyDataKeyList=getExistingHistoricalDataKeyList()
-    exportResponse = s3_client.list_objects_v2(
-        Bucket=S3BucketName,
-        Prefix='ForecastExports'
-        )
+    # manifest and month partitions are read once per invocation
+    vars.Actuals=None
+    availableDays=getAvailableHistoricalDays()
+    shouldStop=getShouldStop(context)
     ## Filter out all available successful exports, generating metrics and publish to cloudwatch
-    for content in exportResponse["Contents"]:
-        key=content["Key"]
+    with instrumentation.span("list"):
+        exportKeys=archivemover.listKeys(s3_client, S3BucketName, getExportPrefix(event))
+    for key in exportKeys:
+        # close to the timeout, the remaining exports (archives and evaluations) are left to the next run
+        if (shouldStop is not None and shouldStop()):
+            logger.info("stopping before the lambda timeout, the remaining exports are processed on the next run")
+            break
         try:
             # archieve already export already with metrics published
             if("_ARCHIVED" in key):
@@ -220,7 +278,8 @@ def onEventHandler(event, context):
                config=loadconfig(forecastDatasetGroupName)
                exportFolderKey=key.replace("/_ARCHIVED","")
                newExportFolderKey="Archived/"+exportFolderKey
-               move_then_delete_path_v2(s3_client, S3BucketName, exportFolderKey, newExportFolderKey)
+               if (not move_then_delete_path_v2(s3_client, S3BucketName, exportFolderKey+"/", newExportFolderKey+"/", shouldStop, key)):
+                   logger.info("archive of export folder=" + exportFolderKey + " will be resumed on the next run")
         except Exception as e:
             logger.error("Failed to archive forecast performance, export folder= " + exportFolderKey + ", will skip and continue to process next export")
             logger.error(e)
@@ -232,7 +291,7 @@ def onEventHandler(event, context):
                forecast_starttime=config["forecast_starttime"]
                forecast_endtime=config["forecast_endtime"]
                #loop through to make sure all the historical data exist
-               dataAvailable=checkHistoricalDataAvailable(existingDailyDataKeyList,getDateFromString(forecast_starttime),getDateFromString(forecast_endtime))
+               dataAvailable=checkHistoricalDataAvailable(availableDays,getDateFromString(forecast_starttime),getDateFromString(forecast_endtime))
                exportFolderKey=key.replace("/_SUCCESS","")
                calculatePublishMetrics(forecastDatasetGroupName,config,exportFolderKey)
                if(dataAvailable):
@@ -0,0 +1,63 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import numpy as np
+
+# https://docs.aws.amazon.com/forecast/latest/dg/metrics.html
+# all metrics are computed in batch over [quantile, day, item] arrays, NaN marks missing real or forecast values
+METRIC_NAMES=["MAPE","WAPE","RMSE","wQL"]
+
+
+# "p10" -> 0.1, "0.9" -> 0.9, anything else (like "mean") has no quantile level
+def quantileFromName(name):
+    value=name[1:] if name[:1] in ("p","P") else name
+    try:
+        level=float(value)
+    except ValueError:
+        return None
+    if (level>=1):
+        level=level/100
+    if (level<=0 or level>=1):
+        return None
+    return level
+
+def safeDivide(numerator, denominator):
+    numerator=np.asarray(numerator, dtype=np.float64)
+    denominator=np.asarray(denominator, dtype=np.float64)
+    result=np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=result, where=(denominator!=0))
+    return result
+
+# realValues [day, item], forecastValues {quantileName: [day, item]}
+# returns {"items": {quantileName: {metric: [item]}}, "days": {quantileName: {metric: [day]}}, "aggregate": {quantileName: {metric: value}}}
+def computeAccuracy(realValues, forecastValues, quantileNames):
+    real=np.asarray(realValues, dtype=np.float64)[np.newaxis]
+    forecast=np.stack([np.asarray(forecastValues[p], dtype=np.float64) for p in quantileNames])
+    levels=np.array([quantileFromName(p) for p in quantileNames], dtype=np.float64)[:, np.newaxis, np.newaxis]
+
+    valid=~np.isnan(real) & ~np.isnan(forecast)
+    nonZero=valid & (real!=0)
+    error=np.where(valid, forecast-real, 0.0)
+    absError=np.abs(error)
+    absReal=np.where(valid, np.abs(real), 0.0)
+    absPercentageError=np.zeros(forecast.shape)
+    np.divide(absError, absReal, out=absPercentageError, where=nonZero)
+    quantileLoss=np.where(valid, levels*np.maximum(-error, 0)+(1-levels)*np.maximum(error, 0), 0.0)
+
+    result={"items": {}, "days": {}, "aggregate": {}}
+    # sum over days for per-item results, over items for per-day results, over days and items for the aggregate
+    for axes, key in (((1,), "items"), ((2,), "days"), ((1, 2), "aggregate")):
+        sumAbsReal=absReal.sum(axis=axes)
+        metrics={
+            "MAPE": safeDivide(absPercentageError.sum(axis=axes)*100, nonZero.sum(axis=axes)),
+            "WAPE": safeDivide(absError.sum(axis=axes), sumAbsReal),
+            "RMSE": np.sqrt(safeDivide((error*error).sum(axis=axes),valid.sum(axis=axes))),
+            "wQL": safeDivide(2*quantileLoss.sum(axis=axes), sumAbsReal),
+        }
+        # wQL is only defined for quantile forecasts
+        metrics["wQL"][np.isnan(levels[:, 0, 0])]=np.nan
+        for i, p in enumerate(quantileNames):
+            if (key!="aggregate"):
+                result[key][p]={name: metrics[name][i] for name in METRIC_NAMES}
+            else:
+                result[key][p]={name: float(metrics[name][i]) for name in METRIC_NAMES}
+    return result
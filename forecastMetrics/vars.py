@@ -1,5 +1,9 @@
 #Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #SPDX-License-Identifier: MIT-0
+# item ids (upper case) in forecast store column order
 ItemList=[]
-ForcastData={}
+# timeseriesstore.TimeSeriesStore with one field per forecast quantile
+ForcastData=None
 forecastPList=[]
+# actualsstore.ActualsStore of the current invocation
+Actuals=None
@@ -0,0 +1,118 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import lambdaruntime
+import os
+import json
+import time
+import logging
+import configcache
+import pipelinestate
+import forecastresources
+from forecastinventory import ForecastInventory
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+S3BucketName = os.environ['S3BucketName']
+roleArn = os.environ['ForecastExecutionRole']
+MetricsFunctionName = os.environ.get('MetricsFunctionName', 'sam_forecast_forecastMetrics')
+PipelineStateKey = "PipelineState/state.json"
+
+forecast_client = lambdaruntime.lazyClient("forecast")
+s3_client = lambdaruntime.lazyClient('s3')
+lambda_client = lambdaruntime.lazyClient('lambda')
+
+
+# Forecast side of the pipeline for one run, resource names follow the same convention as the scheduled lambdas
+# (<dg>_target/<dg>_related, <dg>_Predictor, <dg>_Forecast, <dg>_Forecast_export)
+class ForecastPipelineActions(object):
+
+    def __init__(self, inventory, s3Client, lambdaClient):
+        self.inventory=inventory
+        self.s3Client=s3Client
+        self.lambdaClient=lambdaClient
+
+    # latest import job of both datasets
+    def importStatus(self, datasetGroupName):
+        latestJobs=[]
+        for datasetName in [datasetGroupName+"_target", datasetGroupName+"_related"]:
+            dataset=self.inventory.datasetByName(datasetName)
+            jobs=[] if dataset is None else self.inventory.datasetImportJobsByDataset(dataset["DatasetArn"])
+            if (len(jobs)==0):
+                return None
+            latestJobs.append(max(jobs, key=lambda job: job["CreationTime"]))
+        return pipelinestate.resourceStatus(latestJobs)
+
+    def predictorStatus(self, datasetGroupName):
+        predictor=self.inventory.predictorByName(forecastresources.predictorName(datasetGroupName))
+        return pipelinestate.resourceStatus([] if predictor is None else [predictor])
+
+    def forecastStatus(self, datasetGroupName):
+        forecast=self.inventory.forecastByName(forecastresources.forecastName(datasetGroupName))
+        return pipelinestate.resourceStatus([] if forecast is None else [forecast])
+
+    def exportStatus(self, datasetGroupName):
+        forecast=self.inventory.forecastByName(forecastresources.forecastName(datasetGroupName))
+        if (forecast is None):
+            return None
+        jobName=forecastresources.exportJobName(forecast["ForecastName"])
+        jobs=[job for job in self.inventory.forecastExportJobsByForecast(forecast["ForecastArn"]) if job["ForecastExportJobName"]==jobName]
+        return pipelinestate.resourceStatus(jobs)
+
+    def createPredictor(self, datasetGroupName):
+        config=configcache.loadDatasetGroupConfig(self.s3Client, S3BucketName, datasetGroupName)
+        datasetGroup=self.inventory.datasetGroupByName(datasetGroupName)
+        forecastresources.createPredictor(self.inventory.client, datasetGroup["DatasetGroupArn"], forecastresources.predictorName(datasetGroupName), config)
+        self.inventory.invalidate("predictors")
+
+    def createForecast(self, datasetGroupName):
+        predictor=self.inventory.predictorByName(forecastresources.predictorName(datasetGroupName))
+        forecastresources.createForecast(self.inventory.client, forecastresources.forecastName(datasetGroupName), predictor["PredictorArn"])
+        self.inventory.invalidate("forecasts")
+
+    def createExport(self, datasetGroupName):
+        forecast=self.inventory.forecastByName(forecastresources.forecastName(datasetGroupName))
+        forecastresources.createExportJob(self.inventory.client, forecastresources.exportJobName(forecast["ForecastName"]), forecast["ForecastArn"],
+                                          forecastresources.exportPath(S3BucketName, forecast["ForecastName"]), roleArn)
+        self.inventory.invalidate("forecastExportJobs")
+
+    # metrics are computed right after the export instead of waiting for the next scheduled run
+    def evaluate(self, datasetGroupName):
+        self.lambdaClient.invoke(
+            FunctionName=MetricsFunctionName,
+            InvocationType='Event',
+            Payload=json.dumps({"datasetGroupName": datasetGroupName}).encode("utf-8"))
+        logger.info("triggerred metrics evaluation for datasetGroupName=" + datasetGroupName)
+
+
+# advances every due dataset group (or the ones named in the event) and persists the state
+def runPipeline(event, forecastClient, s3Client, lambdaClient, bucket, now):
+    inventory=ForecastInventory(forecastClient)
+    actions=ForecastPipelineActions(inventory, s3Client, lambdaClient)
+    state=pipelinestate.loadState(s3Client, bucket, PipelineStateKey)
+    pipelinestate.reconcile(state, [datasetGroup["DatasetGroupName"] for datasetGroup in inventory.datasetGroups()], now)
+
+    # direct invocation ({"datasetGroupName": ...}) checks that group now, whatever its backoff
+    requested=event.get("datasetGroupNames", [event["datasetGroupName"]] if "datasetGroupName" in event else [])
+    for datasetGroupName in requested:
+        record=state["datasetGroups"].get(datasetGroupName)
+        if (record is not None and record["state"]!=pipelinestate.EVALUATED):
+            record["nextCheckAt"]=now
+
+    for datasetGroupName, record in sorted(state["datasetGroups"].items()):
+        if (not pipelinestate.isDue(record, now)):
+            continue
+        try:
+            pipelinestate.advance(record, actions, now)
+        except Exception as e:
+            logger.error("Failed to advance pipeline for datasetGroup= " + datasetGroupName + ", will retry later")
+            logger.error(e)
+            pipelinestate.scheduleNextCheck(record, now)
+    pipelinestate.saveState(s3Client, bucket, PipelineStateKey, state)
+    logger.info("pipeline run done, forecast api calls="+str(inventory.apiCalls))
+    return state
+
+
+@lambdaruntime.handler
+def onEventHandler(event, context):
+    runPipeline(event if isinstance(event, dict) else {}, forecast_client, s3_client, lambda_client, S3BucketName, int(time.time()))
@@ -0,0 +1,162 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import json
+import logging
+
+logger = logging.getLogger()
+
+# per dataset group state machine
+#   IMPORTING -> TRAINING -> FORECASTING -> EXPORTING -> EVALUATED
+# every state waits for one Forecast resource (import jobs, predictor, forecast, export job) to become ACTIVE,
+# then triggers the next one; a CREATE_FAILED resource or a state that never finishes ends in FAILED
+# a FAILED group is re-checked every FAILED_RECHECK_SECONDS and goes back to the state that failed as soon as the status of
+# its resource changes (a new import job, a failed predictor deleted and recreated by trainDefaultPredictor, ...)
+IMPORTING="IMPORTING"
+TRAINING="TRAINING"
+FORECASTING="FORECASTING"
+EXPORTING="EXPORTING"
+EVALUATED="EVALUATED"
+FAILED="FAILED"
+TERMINAL_STATES=set([EVALUATED, FAILED])
+
+# adaptive polling, first check after the base delay of the state, then exponential backoff up to the cap
+POLL_BASE_SECONDS={IMPORTING: 300, TRAINING: 900, FORECASTING: 300, EXPORTING: 120}
+POLL_MAX_SECONDS=3600
+POLL_BACKOFF_FACTOR=2
+# a state taking longer than this is considered stuck
+STATE_TIMEOUT_SECONDS=2*24*3600
+FAILED_RECHECK_SECONDS=3600
+
+
+def nextPollDelay(state, attempts):
+    return min(POLL_MAX_SECONDS, POLL_BASE_SECONDS.get(state, POLL_MAX_SECONDS)*(POLL_BACKOFF_FACTOR**attempts))
+
+
+def newRecord(datasetGroupName, now):
+    record={"datasetGroupName": datasetGroupName, "history": []}
+    transition(record, IMPORTING, now, "dataset group discovered")
+    return record
+
+def transition(record, state, now, reason):
+    record["state"]=state
+    record["enteredAt"]=now
+    record["attempts"]=0
+    if (state==FAILED):
+        record["nextCheckAt"]=now+FAILED_RECHECK_SECONDS
+    else:
+        record["nextCheckAt"]=now if state not in TERMINAL_STATES else None
+    record["reason"]=reason
+    record["history"].append({"state": state, "at": now, "reason": reason})
+    logger.info("dataset group="+record["datasetGroupName"]+" moved to "+state+" ("+reason+")")
+
+def scheduleNextCheck(record, now):
+    record["nextCheckAt"]=now+nextPollDelay(record["state"], record["attempts"])
+    record["attempts"]+=1
+
+def isDue(record, now):
+    return record["state"]!=EVALUATED and record["nextCheckAt"] is not None and record["nextCheckAt"]<=now
+
+
+# status of the resource a state waits for: None (not created yet), or the Forecast status string
+def resourceStatus(resources):
+    if (len(resources)==0):
+        return None
+    statuses=[resource["Status"] for resource in resources]
+    if (any(status=="CREATE_FAILED" for status in statuses)):
+        return "CREATE_FAILED"
+    if (all(status=="ACTIVE" for status in statuses)):
+        return "ACTIVE"
+    return "CREATE_IN_PROGRESS"
+
+
+# actions is an object with the Forecast/S3/Lambda side effects of the pipeline:
+#   importStatus(name), predictorStatus(name), forecastStatus(name), exportStatus(name)   -> None | status string
+#   createPredictor(name), createForecast(name), createExport(name), evaluate(name)
+# status of the resource the state waits for
+def stateStatus(state, actions, name):
+    if (state==IMPORTING):
+        return actions.importStatus(name)
+    if (state==TRAINING):
+        return actions.predictorStatus(name)
+    if (state==FORECASTING):
+        return actions.forecastStatus(name)
+    return actions.exportStatus(name)
+
+def fail(record, state, status, now, reason):
+    record["failedState"]=state
+    record["failedStatus"]=status
+    transition(record, FAILED, now, reason)
+
+# back to the state that failed when its resource changed since, returns whether the record was reopened
+def reopenFailed(record, actions, now):
+    failedState=record.get("failedState")
+    if (failedState is None):
+        return False
+    status=stateStatus(failedState, actions, record["datasetGroupName"])
+    if (status==record.get("failedStatus")):
+        return False
+    transition(record, failedState, now, failedState+" resource changed after the failure (now "+str(status)+")")
+    return True
+
+# one call advances the record as far as the current resource statuses allow
+def advance(record, actions, now):
+    name=record["datasetGroupName"]
+    if (record["state"]==FAILED and not reopenFailed(record, actions, now)):
+        record["nextCheckAt"]=now+FAILED_RECHECK_SECONDS
+        return record
+    while (record["state"] not in TERMINAL_STATES):
+        state=record["state"]
+        if (state==IMPORTING):
+            status=actions.importStatus(name)
+            nextState, startNext=TRAINING, actions.createPredictor
+            currentStatus=actions.predictorStatus
+        elif (state==TRAINING):
+            status=actions.predictorStatus(name)
+            nextState, startNext=FORECASTING, actions.createForecast
+            currentStatus=actions.forecastStatus
+        elif (state==FORECASTING):
+            status=actions.forecastStatus(name)
+            nextState, startNext=EXPORTING, actions.createExport
+            currentStatus=actions.exportStatus
+        else:
+            status=actions.exportStatus(name)
+            nextState, startNext, currentStatus=EVALUATED, actions.evaluate, None
+
+        if (status=="CREATE_FAILED"):
+            fail(record, state, status, now, state+" resource failed")
+            return record
+        if (status!="ACTIVE"):
+            if (now-record["enteredAt"]>STATE_TIMEOUT_SECONDS):
+                fail(record, state, status, now, state+" timed out")
+            else:
+                scheduleNextCheck(record, now)
+            return record
+        # idempotent: resources left by a previous run (or by the scheduled lambdas) are not created twice
+        if (currentStatus is None or currentStatus(name) is None):
+            startNext(name)
+        transition(record, nextState, now, state+" finished")
+    return record
+
+
+def loadState(client, bucket, key):
+    try:
+        return json.loads(client.get_object(Bucket=bucket, Key=key)["Body"].read())
+    except client.exceptions.NoSuchKey:
+        return {"datasetGroups": {}}
+
+def saveState(client, bucket, key, state):
+    client.put_object(Bucket=bucket, Key=key, Body=json.dumps(state, indent=1, sort_keys=True).encode("utf-8"))
+
+# adds newly discovered dataset groups and drops the ones deleted from Forecast
+# finished groups stay in the state as long as the group exists (deleteExpiredForecast bounds them), a dropped record
+# would be rediscovered as IMPORTING and replayed up to a second evaluation
+def reconcile(state, datasetGroupNames, now):
+    records=state["datasetGroups"]
+    existing=set(datasetGroupNames)
+    for datasetGroupName in datasetGroupNames:
+        if (datasetGroupName not in records):
+            records[datasetGroupName]=newRecord(datasetGroupName, now)
+    for datasetGroupName in list(records):
+        if (datasetGroupName not in existing):
+            del records[datasetGroupName]
+    return state
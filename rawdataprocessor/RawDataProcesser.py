@@ -1,24 +1,58 @@
 #Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 #SPDX-License-Identifier: MIT-0
+import lambdaruntime
 import os
 import io
 import json
-import boto3
-import random
-import csv
-import botocore
 from datetime import date
 from datetime import datetime
 from datetime import timedelta
-from urllib.parse import unquote_plus
 import vars
+from timeseriesstore import TimeSeriesStore, RowBatch, toFloat, formatValues
+import keycodec
+import s3stream
+import shardedcsv
+import actualsstore
+from s3stream import S3MultipartWriter
+import outputformat
+import configcache
+import instrumentation
+import sourcefingerprint
+from s3batch import S3BatchTransfer
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 S3BucketName=os.environ['S3BucketName']
-s3_client = boto3.client('s3')
+dayOrdinals=keycodec.dayOrdinals
+dayStrings=keycodec.dayStrings
+# incremental mode keeps a history snapshot and only re-parses rows newer than (watermark - RestatementDays)
+IncrementalMode=os.environ.get('IncrementalMode','true').lower()=='true'
+RestatementDays=int(os.environ.get('RestatementDays','7'))
+HistorySnapshotKey="covid-19-history/snapshot.npz"
+HistoryWatermarkKey="covid-19-history/watermark.json"
+# raw files of at least ShardedIngestionMinBytes are parsed by IngestionShards processes ("auto" = one per cpu) over ranged GETs
+IngestionShards=os.environ.get('IngestionShards','1')
+ShardedIngestionMinBytes=int(os.environ.get('ShardedIngestionMinBytes',str(64*1024*1024)))
+# an unchanged raw file (same ETag/size, or same content hash when re-uploaded) with an unchanged model config is a no-op,
+# ForceReprocess (or {"forceReprocess": true} in the event) processes it anyway
+ChangeDetection=os.environ.get('ChangeDetection','true').lower()=='true'
+ForceReprocess=os.environ.get('ForceReprocess','false').lower()=='true'
+SourceFingerprintKey="covid-19-history/source-fingerprint.json"
+RawDataBucket='covid19-lake'
+RawDataKey='rearc-covid-19-testing-data/csv/states_daily/states_daily.csv'
+# models prepared in parallel from the same parsed raw data
+MaxModelWorkers=int(os.environ.get('MaxModelWorkers','4'))
+# raw column layout used when a model config doesn't set it (states_daily.csv: date, state, positive, ..., totalTestResults at 17)
+DEFAULT_TIMESTAMP_COL=0
+DEFAULT_ITEM_COL=1
+DEFAULT_TARGET_COL=2
+DEFAULT_RELATED_COLS=[17]
+s3_client = lambdaruntime.lazyClient('s3')
+# the batch layer retries throttled calls itself, its client doesn't retry in botocore
+s3_transfer = S3BatchTransfer(lambdaruntime.lazyClient('s3', lambdaruntime.NO_RETRIES))
 
 
 def tranformDateToString(date):
@@ -34,177 +68,329 @@ def transformDateStringFormat(datestring):
 def getDateFromString(dateString):
     return datetime.strptime(dateString, "%Y-%m-%d").date()
 
-# simplify backfill logic , use 0 ; remove recursive
-def getRowValueForTheDay(currentDay,item,cellName):
-    currentDayString=tranformDateToString(currentDay)
-
-    # if currentDayString has no data
-    if (currentDayString not in vars.RawData):
-       return 0
+# raw columns are kept in the store under their column number
+def columnField(col):
+    return "col"+str(col)
+
+def getModelColumns(mconfig):
+    return mconfig.get("target_col",DEFAULT_TARGET_COL), list(mconfig.get("related_cols",DEFAULT_RELATED_COLS))
+
+# the raw file is parsed once for all models, so they have to agree on the row key; returns the key and the union of value columns
+def getRawColumns(models):
+    keyCols=set((mconfig.get("timestamp_col",DEFAULT_TIMESTAMP_COL), mconfig.get("item_col",DEFAULT_ITEM_COL)) for mconfig in models)
+    if (len(keyCols)!=1):
+        raise ValueError("all models must use the same timestamp_col and item_col, found "+str(sorted(keyCols)))
+    timestampCol, itemCol=keyCols.pop()
+    valueCols=set()
+    for mconfig in models:
+        targetCol, relatedCols=getModelColumns(mconfig)
+        valueCols.add(targetCol)
+        valueCols.update(relatedCols)
+    return timestampCol, itemCol, sorted(valueCols)
 
-    if (not (item in vars.RawData[currentDayString])):
-       return 0
+# simplify backfill logic , use 0 ; remove recursive
+# values for every item of the day (in vars.ItemList order), missing cells are filled with 0
+def getRowValuesForTheDay(currentDay,cellName):
+    return formatValues(vars.RawData.getDay(currentDay.toordinal(),cellName,fill=0))
 
-    if ((not (cellName in vars.RawData[currentDayString][item])) or (vars.RawData[currentDayString][item][cellName] is None) or (vars.RawData[currentDayString][item][cellName]=="")):
-            return 0
-    else:
-            return vars.RawData[tranformDateToString(currentDay)][item][cellName]
+# only re-write recent day's data (ignore redundant historical data)
+def isRecentDay(currentDay):
+    return abs((vars.EndDate - currentDay).days)<=vars.NumberOfRecentDays
 
-def writeDataAndUpload(currentDay, dataListForCurrentTimePoint):
-    # only re-write recent day's data (ignore redundant historical data)
-    numOfDays=abs((vars.EndDate - currentDay).days)
-    if(numOfDays>5):
+# daily files are rendered in memory, with pendingUploads they are only queued so all recent days are uploaded as one concurrent batch
+def writeDataAndUpload(currentDay, dataListForCurrentTimePoint, pendingUploads=None):
+    if(not isRecentDay(currentDay)):
         return
     targetFileName="target_"+tranformDateToString(currentDay)+".csv"
     relatedFileName="related_"+tranformDateToString(currentDay)+".csv"
 
-    targetFile = open("/tmp/"+targetFileName,'w',newline='')
-    csvWriterTarget = csv.writer(targetFile)
-    relatedFile = open("/tmp/"+relatedFileName,'w',newline='')
-    csvWriterRelated = csv.writer(relatedFile)
-
-    for item in dataListForCurrentTimePoint:
-        targetRow=[item[0],item[1],item[2]]
-        relatedRow=[item[0],item[1],item[3]]
-        csvWriterTarget.writerow(targetRow)
-        csvWriterRelated.writerow(relatedRow)
-    targetFile.close()
-    relatedFile.close()
-    s3_client.upload_file("/tmp/"+targetFileName, S3BucketName, "covid-19-daily/"+targetFileName)
-    s3_client.upload_file("/tmp/"+relatedFileName, S3BucketName, "covid-19-daily/"+relatedFileName)
-    logger.info("daily data uploaded to bucket="+S3BucketName+", under path key=covid-19-daily for date=" + tranformDateToString(currentDay))
-
-
-# this will also fill empty data for rawdata
-def generateDataForCurrentDay(currentDay):
-    dataListForCurrentTimePoint=[]
-    for item in vars.ItemList:
-        rowItemForTheDay=[]
-        rowItemForTheDay.append(tranformDateToString(currentDay))
-        rowItemForTheDay.append(item)
-        rowItemForTheDay.append(getRowValueForTheDay(currentDay,item,"targetValue"))
-        rowItemForTheDay.append(getRowValueForTheDay(currentDay,item,"relatedValue1"))
-        dataListForCurrentTimePoint.append(rowItemForTheDay)
-    return dataListForCurrentTimePoint
-
-
-def processRawCSV(rawDataLocalPath):
-    inputFile=open(rawDataLocalPath,'r')
-    readerObj=csv.reader(inputFile)
-    next(readerObj)
-    cur_itemList=[]
-    # get start and end date, get Rawdata Map
-    cur_startDate=date.today()
-    cur_endDate=None
+    uploads=[(s3stream.csvBytes((item[0],item[1],item[2]) for item in dataListForCurrentTimePoint), S3BucketName, "covid-19-daily/"+targetFileName),
+             (s3stream.csvBytes(item[:2]+item[3:] for item in dataListForCurrentTimePoint), S3BucketName, "covid-19-daily/"+relatedFileName)]
+    if (pendingUploads is not None):
+        pendingUploads.extend(uploads)
+        return
+    s3_transfer.putObjects(uploads)
+    logger.debug("daily data uploaded to bucket="+S3BucketName+", under path key=covid-19-daily for date=" + tranformDateToString(currentDay))
+
+
+# this will also fill empty data for rawdata, rows are generated lazily so the full history is never materialized
+# rows are (date, item, target, related...) with the columns of the model (default columns without a model config)
+def generateDataForCurrentDay(currentDay, mconfig=None):
+    currentDayString=dayStrings[currentDay.toordinal()]
+    targetCol, relatedCols=getModelColumns(mconfig or {})
+    columnValues=[getRowValuesForTheDay(currentDay,columnField(col)) for col in [targetCol]+relatedCols]
+    for i, item in enumerate(vars.ItemList):
+        yield (currentDayString,item)+tuple(values[i] for values in columnValues)
+
+
+# single pass over the raw csv (local path or binary file object) into the columnar store, one field per value column
+# with a history snapshot, rows on or before cutoffDate are skipped and the days after it are replaced by the raw data
+@instrumentation.timed("parse")
+def processRawCSV(rawDataSource, rawData=None, cutoffDate=None, valueCols=None, timestampCol=DEFAULT_TIMESTAMP_COL, itemCol=DEFAULT_ITEM_COL):
+    if (valueCols is None):
+        valueCols=[DEFAULT_TARGET_COL]+DEFAULT_RELATED_COLS
+    if (rawData is None):
+        rawData=TimeSeriesStore([columnField(col) for col in valueCols])
+    cutoffOrdinal=None
+    if (cutoffDate is not None):
+        cutoffOrdinal=cutoffDate.toordinal()
+        rawData.clearRange(cutoffOrdinal+1,date.max.toordinal())
+    with (open(rawDataSource,'rb') if isinstance(rawDataSource,str) else rawDataSource) as inputFile:
+        readerObj=s3stream.csvReader(inputFile)
+        next(readerObj)
+        partial=parseRawRows(readerObj, cutoffOrdinal, valueCols, timestampCol, itemCol)
+        rawData.addRows(*partial)
+    instrumentation.count("rawRows", len(partial[1]))
+    setRawData(rawData)
+
+# rows into a RowBatch partial, every distinct date string is parsed once (dayOrdinals)
+def parseRawRows(readerObj, cutoffOrdinal, valueCols, timestampCol, itemCol):
+    batch=RowBatch(len(valueCols))
     for row in readerObj:
-       tmp_date_string=transformDateStringFormat(row[0])
-       tmp_date=getDateFromString(tmp_date_string)
-       tmp_item_string=row[1]
-       if (not tmp_item_string in cur_itemList):
-           cur_itemList.append(tmp_item_string)
-       if (not tmp_date_string in vars.RawData):
-           vars.RawData[tmp_date_string]={}
-       if (not tmp_item_string in vars.RawData[tmp_date_string]):
-           vars.RawData[tmp_date_string][tmp_item_string]={}
-       tmp_object={}
-       tmp_object["targetValue"]=row[2]
-       tmp_object["relatedValue1"]=row[17]
-       vars.RawData[tmp_date_string][tmp_item_string]=tmp_object
-       #process start and end date
-       if(tmp_date<cur_startDate):
-           cur_startDate=tmp_date
-       if (cur_endDate is None):
-           cur_endDate=tmp_date
-       if(tmp_date>cur_endDate):
-           cur_endDate=tmp_date
-    inputFile.close()
-
-    vars.StartDate=cur_startDate
-    vars.EndDate=cur_endDate
-    vars.ItemList=cur_itemList
-
-def updateFullHistryItem(currentDayItems):
-    for item in currentDayItems:
-        vars.FullHistoryList.append(item)
-
-
-def writePreparedDataForModel(mconfig):
-    logger.debug(mconfig)
+        tmp_ordinal=dayOrdinals[row[timestampCol]]
+        if (cutoffOrdinal is not None and tmp_ordinal<=cutoffOrdinal):
+            continue
+        batch.add(tmp_ordinal,row[itemCol],[toFloat(row[col]) for col in valueCols])
+    return batch.partial()
+
+def setRawData(rawData):
+    vars.RawData=rawData
+    vars.StartDate=date.fromordinal(rawData.startOrdinal) if rawData.startOrdinal is not None else date.today()
+    vars.EndDate=date.fromordinal(rawData.endOrdinal) if rawData.endOrdinal is not None else date.today()
+    vars.ItemList=rawData.items
+
+
+# one shard of the raw file (runs in its own process), rows are parsed exactly like processRawCSV
+# returns the partial as arrays: item names in first appearance order, item code / ordinal / values per row
+def parseRawShard(rawSource, start, end, cutoffOrdinal, valueCols, timestampCol, itemCol):
+    client=lambdaruntime.newClient('s3') if shardedcsv.isS3Source(rawSource) else None
+    readerObj=shardedcsv.iterShardRows(rawSource, start, end, client)
+    if (start==0):
+        next(readerObj, None)
+    return parseRawRows(readerObj, cutoffOrdinal, valueCols, timestampCol, itemCol)
+
+# sharded processRawCSV for big raw files (local path or ("s3", bucket, key)), the shard partials are merged in file order
+# so items get the same positions and repeated cells the same values as with the serial path
+@instrumentation.timed("parse")
+def processRawCSVSharded(rawSource, numOfShards, rawData=None, cutoffDate=None, valueCols=None, timestampCol=DEFAULT_TIMESTAMP_COL, itemCol=DEFAULT_ITEM_COL):
+    if (valueCols is None):
+        valueCols=[DEFAULT_TARGET_COL]+DEFAULT_RELATED_COLS
+    if (rawData is None):
+        rawData=TimeSeriesStore([columnField(col) for col in valueCols])
+    cutoffOrdinal=None
+    if (cutoffDate is not None):
+        cutoffOrdinal=cutoffDate.toordinal()
+        rawData.clearRange(cutoffOrdinal+1,date.max.toordinal())
+    ranges=shardedcsv.byteRanges(shardedcsv.sourceSize(rawSource, s3_client), numOfShards)
+    partials=shardedcsv.runShards(parseRawShard, [(rawSource, start, end, cutoffOrdinal, valueCols, timestampCol, itemCol) for start, end in ranges])
+    for partial in partials:
+        rawData.addRows(*partial)
+    instrumentation.count("rawRows", sum(len(partial[1]) for partial in partials))
+    logger.info("raw data parsed in "+str(len(ranges))+" shards, "+str(sum(len(partial[1]) for partial in partials))+" rows")
+    setRawData(rawData)
+
+# sharded for big raw files when IngestionShards>1, the serial path reads the object into memory (or /tmp) first
+def isShardedIngestion(sourceSize):
+    return shardedcsv.getNumOfShards(IngestionShards)>1 and sourceSize>=ShardedIngestionMinBytes
+
+# rawSource is an s3 source, a local path or an already downloaded file object (never sharded)
+def processRawData(rawSource, rawData=None, cutoffDate=None, valueCols=None, timestampCol=DEFAULT_TIMESTAMP_COL, itemCol=DEFAULT_ITEM_COL, sourceSize=None):
+    if (not hasattr(rawSource, "read") and shardedcsv.getNumOfShards(IngestionShards)>1):
+        if (sourceSize is None):
+            sourceSize=shardedcsv.sourceSize(rawSource, s3_client)
+        if (isShardedIngestion(sourceSize)):
+            processRawCSVSharded(rawSource, shardedcsv.getNumOfShards(IngestionShards), rawData, cutoffDate, valueCols, timestampCol, itemCol)
+            return
+    if (shardedcsv.isS3Source(rawSource)):
+        with instrumentation.span("download"):
+            rawSource=s3stream.readObject(s3_client, rawSource[1], rawSource[2])
+    processRawCSV(rawSource, rawData, cutoffDate, valueCols, timestampCol, itemCol)
+
+
+# returns (store, watermark date), or (None, None) when there's no usable snapshot yet
+# a snapshot missing one of the value columns (model config changed) is not usable
+@instrumentation.timed("loadSnapshot")
+def loadHistorySnapshot(valueCols=None):
+    try:
+        watermark=json.loads(s3_client.get_object(Bucket=S3BucketName, Key=HistoryWatermarkKey)["Body"].read())
+        snapshotBody=s3_client.get_object(Bucket=S3BucketName, Key=HistorySnapshotKey)["Body"].read()
+    except s3_client.exceptions.NoSuchKey:
+        logger.info("no history snapshot found in bucket="+S3BucketName+", with key="+HistorySnapshotKey+", will process full history")
+        return None, None
+    rawData=TimeSeriesStore.load(io.BytesIO(snapshotBody))
+    if (valueCols is not None and rawData.fieldNames!=[columnField(col) for col in valueCols]):
+        logger.info("history snapshot columns "+str(rawData.fieldNames)+" don't match the model configs, will process full history")
+        return None, None
+    return rawData, getDateFromString(watermark["watermark"])
+
+@instrumentation.timed("saveSnapshot")
+def saveHistorySnapshot():
+    snapshot=io.BytesIO()
+    vars.RawData.save(snapshot)
+    s3_client.put_object(Bucket=S3BucketName, Key=HistorySnapshotKey, Body=snapshot.getvalue())
+    watermark={"watermark": tranformDateToString(vars.EndDate), "startDate": tranformDateToString(vars.StartDate), "numOfItems": len(vars.ItemList)}
+    s3_client.put_object(Bucket=S3BucketName, Key=HistoryWatermarkKey, Body=json.dumps(watermark).encode("utf-8"))
+    logger.info("history snapshot saved to bucket="+S3BucketName+", with key="+HistorySnapshotKey+", watermark="+watermark["watermark"])
+
+def getDatasetGroupName(mconfig):
     #The dataset group name must have 1 to 63 characters. Valid characters: a-z, A-Z, 0-9, and _
-    datasetGroupName = mconfig["modelName"]+"_"+tranformDateToString(vars.StartDate).replace("-","")+"_"+tranformDateToString(vars.EndDate).replace("-","")
-    FullHistoryTargetFileName="history.target."+tranformDateToString(vars.StartDate)+"."+ tranformDateToString(vars.EndDate)+".csv"
-    FullHistoryRelatedFileName="history.related."+tranformDateToString(vars.StartDate)+"."+ tranformDateToString(vars.EndDate)+".csv"
-    modelconfigfile= "/tmp/"+datasetGroupName+".json"
+    return mconfig["modelName"]+"_"+tranformDateToString(vars.StartDate).replace("-","")+"_"+tranformDateToString(vars.EndDate).replace("-","")
+
+
+# walk every day once, streaming each row to the history files (multipart upload, no /tmp copy) and to the recent daily files
+# the daily files are the real data used for the model metrics, only one model (the first) writes them
+@instrumentation.timed("prepare")
+def writePreparedDataForModel(mconfig, writeDailyData=True):
+    logger.debug(mconfig)
+    datasetGroupName = getDatasetGroupName(mconfig)
+    outputFormat = outputformat.checkFormat(mconfig.get("output_format","csv"))
     simulateStartDate=vars.EndDate+timedelta(days=1)
     simulateEndDate=vars.EndDate+timedelta(days=mconfig["preditor"]["ForecastHorizon"])
-    with open(modelconfigfile, 'w') as outfile:
-        mconfig["data_starttime"]= tranformDateToString(vars.StartDate)
-        mconfig["data_endtime"]= tranformDateToString(vars.EndDate)
-        mconfig["forecast_starttime"]= tranformDateToString(simulateStartDate)
-        mconfig["forecast_endtime"]= tranformDateToString(simulateEndDate)
-        json.dump(mconfig, outfile)
-    s3_client.upload_file(modelconfigfile, S3BucketName, "DatasetGroups/"+datasetGroupName+"/config.json")
+    mconfig["data_starttime"]= tranformDateToString(vars.StartDate)
+    mconfig["data_endtime"]= tranformDateToString(vars.EndDate)
+    mconfig["forecast_starttime"]= tranformDateToString(simulateStartDate)
+    mconfig["forecast_endtime"]= tranformDateToString(simulateEndDate)
+    s3stream.writeJson(s3_client, S3BucketName, "DatasetGroups/"+datasetGroupName+"/config.json", mconfig)
     logger.info("Dataset Group config config.json uploaded to bucket="+S3BucketName+", under path key=DatasetGroups/"+datasetGroupName)
 
-
-    targetFile = open("/tmp/"+FullHistoryTargetFileName,'w',newline='')
-    csvWritertarget = csv.writer(targetFile)
-    relatedFile = open("/tmp/"+FullHistoryRelatedFileName,'w',newline='')
-    csvWriterRelated = csv.writer(relatedFile)
-    for item in vars.FullHistoryList:
-        targetRow=[item[0],item[1],item[2]]
-        relatedRow=[item[0],item[1],item[3]]
-        csvWritertarget.writerow(targetRow)
-        csvWriterRelated.writerow(relatedRow)
-
-    currentDay=simulateStartDate
-    while(currentDay<=simulateEndDate):
-       for item in vars.ItemList:
-          rowItemForTheDay=[]
-          rowItemForTheDay.append(tranformDateToString(currentDay))
-          rowItemForTheDay.append(item)
-          rowItemForTheDay.append(getRowValueForTheDay(vars.EndDate,item,"relatedValue1"))
-          csvWriterRelated.writerow(rowItemForTheDay)
-       currentDay=currentDay+timedelta(days=1)
-    targetFile.close()
-    relatedFile.close()
-    s3_client.upload_file("/tmp/"+FullHistoryTargetFileName, S3BucketName, "DatasetGroups/"+datasetGroupName+"/target.csv")
-    s3_client.upload_file("/tmp/"+FullHistoryRelatedFileName, S3BucketName, "DatasetGroups/"+datasetGroupName+"/related.csv")
-    logger.info("processed data uploaded to bucket="+S3BucketName+", under path key=DatasetGroups/"+datasetGroupName)
-
+    targetKey="DatasetGroups/"+datasetGroupName+"/target"+outputformat.fileExtension(outputFormat)
+    relatedKey="DatasetGroups/"+datasetGroupName+"/related"+outputformat.fileExtension(outputFormat)
+    targetStream=S3MultipartWriter(s3_client, S3BucketName, targetKey)
+    relatedStream=S3MultipartWriter(s3_client, S3BucketName, relatedKey)
+    dailyUploads=[]
+    try:
+        targetWriter=outputformat.openRowWriter(outputFormat, targetStream)
+        relatedWriter=outputformat.openRowWriter(outputFormat, relatedStream)
+        currentDay=vars.StartDate
+        logger.debug("raw data start from " + str(vars.StartDate) +",ending at " + str(vars.EndDate))
+        while (currentDay<=vars.EndDate):
+            recentDay=writeDailyData and isRecentDay(currentDay)
+            currentDayItems=[]
+            for item in generateDataForCurrentDay(currentDay, mconfig):
+                targetWriter.writerow((item[0],item[1],item[2]))
+                relatedWriter.writerow(item[:2]+item[3:])
+                #everyday item will only used for metrics
+                if(recentDay):
+                    currentDayItems.append(item)
+            if(recentDay):
+                writeDataAndUpload(currentDay,currentDayItems,dailyUploads)
+            currentDay=currentDay+timedelta(days=1)
+
+        # related data has to cover the forecast horizon, the last known values are repeated
+        lastRelatedRows=[item[3:] for item in generateDataForCurrentDay(vars.EndDate, mconfig)]
+        currentDay=simulateStartDate
+        while(currentDay<=simulateEndDate):
+           currentDayString=dayStrings[currentDay.toordinal()]
+           for item, relatedValues in zip(vars.ItemList,lastRelatedRows):
+              relatedWriter.writerow((currentDayString,item)+relatedValues)
+           currentDay=currentDay+timedelta(days=1)
+        targetWriter.close()
+        relatedWriter.close()
+    except Exception:
+        targetStream.abort()
+        relatedStream.abort()
+        raise
+    instrumentation.count("preparedRows", targetWriter.rowCount+relatedWriter.rowCount)
+    instrumentation.count("preparedBytes", targetStream.bytesWritten+relatedStream.bytesWritten)
+    if (writeDailyData):
+        with instrumentation.span("upload"):
+            s3_transfer.putObjects(dailyUploads)
+        logger.info("daily data uploaded to bucket="+S3BucketName+", under path key=covid-19-daily, "+str(len(dailyUploads))+" files")
+    logger.info("processed data uploaded to bucket="+S3BucketName+", key="+targetKey+" ("+str(targetStream.bytesWritten)+" bytes), key="+relatedKey+" ("+str(relatedStream.bytesWritten)+" bytes)")
+
+
+
+# the models only read the shared store, so their files are written concurrently
+def writePreparedDataForModels(models):
+    if (len(models)<=1 or MaxModelWorkers<=1):
+        for i, mconfig in enumerate(models):
+            writePreparedDataForModel(mconfig, i==0)
+        return
+    with ThreadPoolExecutor(max_workers=min(MaxModelWorkers, len(models))) as executor:
+        futures=[executor.submit(writePreparedDataForModel, mconfig, i==0) for i, mconfig in enumerate(models)]
+        for mconfig, future in zip(models, futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("Failed to prepare data for model=" + mconfig["modelName"])
+                raise e
+
+
+# actuals for the model evaluation (month partitions + manifest), from the target column of the first model like the daily files
+# the months of every day that may have been restated are rewritten: the recent days, RestatementDays back, and
+# everything after the cutoff of an incremental parse (which goes further back when runs were skipped)
+@instrumentation.timed("actuals")
+def writeActuals(mconfig, cutoffDate=None):
+    targetCol, _=getModelColumns(mconfig)
+    fromOrdinal=(vars.EndDate-timedelta(days=max(RestatementDays, vars.NumberOfRecentDays))).toordinal()
+    if (cutoffDate is not None):
+        fromOrdinal=min(fromOrdinal, cutoffDate.toordinal()+1)
+    actualsstore.writePartitions(s3_client, s3_transfer, S3BucketName, vars.RawData, columnField(targetCol), fromOrdinal)
 
 
 def loadconfig():
     try:
-        configFile_path = '/tmp/config.json'
-        s3_client.download_file(S3BucketName, 'forecast-model-config.json', configFile_path)
-        with open(configFile_path) as f:
-             config = json.load(f)
+        config = configcache.loadConfig(s3_client, S3BucketName, 'forecast-model-config.json')
         logger.debug(config)
-        return config
     except Exception as e:
         logger.error("Failed to load global model json config file. bucket= " + S3BucketName + " , key=forecast-model-config.json" )
         raise e
+    # an output format this layer can't write fails the run before any work
+    for mconfig in config["models"]:
+        outputformat.checkFormat(mconfig.get("output_format","csv"))
+    return config
+
+def isForced(event):
+    return ForceReprocess or (isinstance(event, dict) and event.get("forceReprocess") is True)
 
+@lambdaruntime.handler
 def onEventHandler(event, context):
   config = loadconfig()
+  configHash=sourcefingerprint.configDigest(config)
+
+  # one HEAD of the raw file: ETag/size for the change detection, size for the copies and the sharding decision
+  with instrumentation.span("changeDetection"):
+    source=sourcefingerprint.headSource(s3_client, RawDataBucket, RawDataKey)
+    previous=None
+    if (ChangeDetection and not isForced(event)):
+      previous=sourcefingerprint.loadFingerprint(s3_client, S3BucketName, SourceFingerprintKey)
+  if (sourcefingerprint.isSameObject(previous, source, configHash)):
+    logger.info("raw data unchanged since the last run, bucket="+RawDataBucket+", key="+RawDataKey+", etag="+source["etag"]+", nothing to do")
+    instrumentation.count("unchangedSkips")
+    return
+
+  rawSource=("s3", RawDataBucket, RawDataKey)
+  contentHash=None
+  if (ChangeDetection and not isShardedIngestion(source["size"])):
+    # new ETag, the file is downloaded once anyway, so its content hash catches a re-upload of the same data
+    with instrumentation.span("download"):
+      rawSource=s3stream.readObject(s3_client, RawDataBucket, RawDataKey)
+    with instrumentation.span("changeDetection"):
+      contentHash=sourcefingerprint.contentDigest(rawSource)
+    if (sourcefingerprint.isSameContent(previous, contentHash, configHash)):
+      sourcefingerprint.saveFingerprint(s3_client, S3BucketName, SourceFingerprintKey, sourcefingerprint.newFingerprint(source, configHash, contentHash))
+      logger.info("raw data re-uploaded with the same content, bucket="+RawDataBucket+", key="+RawDataKey+", etag="+source["etag"]+", nothing to do")
+      instrumentation.count("unchangedSkips")
+      return
 
   tmpkey=tranformDateToString(date.today())+".csv"
-  #download raw data and process
-  download_path = '/tmp/'+tmpkey
-  s3_client.download_file('covid19-lake', 'rearc-covid-19-testing-data/csv/states_daily/states_daily.csv', download_path)
-  s3_client.upload_file(download_path, S3BucketName, "latest/states_daily.csv")
-  s3_client.upload_file(download_path, S3BucketName, "covid-19-raw/states_daily_raw"+tmpkey)
-  logger.info("raw data downloaded from bucket=covid19-lake, key=rearc-covid-19-testing-data/csv/states_daily/states_daily.csv, uploaded to bucket="+S3BucketName+", with key=covid-19-raw/states_daily_raw" + tmpkey)
-
-  processRawCSV(download_path)
-
-  currentDay=vars.StartDate
-  logger.debug("raw data start from " + str(vars.StartDate) +",ending at " + str(vars.EndDate))
-  while (currentDay<=vars.EndDate):
-      currentDayItems=generateDataForCurrentDay(currentDay)
-      updateFullHistryItem(currentDayItems)
-      #everyday item will only used for metrics
-      writeDataAndUpload(currentDay,currentDayItems)
-      currentDay=currentDay+timedelta(days=1)
-  writePreparedDataForModel(config["models"][0])
+  #the raw copies are made server side (copy_object, the known size skips the HEAD of the managed copy)
+  with instrumentation.span("copy"):
+    s3_transfer.copyObjects([(RawDataBucket, RawDataKey, S3BucketName, "latest/states_daily.csv", source["size"]),
+                             (RawDataBucket, RawDataKey, S3BucketName, "covid-19-raw/states_daily_raw"+tmpkey, source["size"])])
+  logger.info("raw data copied from bucket="+RawDataBucket+", key="+RawDataKey+", to bucket="+S3BucketName+", with key=covid-19-raw/states_daily_raw" + tmpkey)
+
+  # raw data is parsed once, with the columns of all the models
+  timestampCol, itemCol, valueCols=getRawColumns(config["models"])
+  cutoffDate=None
+  if (IncrementalMode):
+      rawData, watermark=loadHistorySnapshot(valueCols)
+      cutoffDate=None if watermark is None else watermark-timedelta(days=RestatementDays)
+      processRawData(rawSource, rawData, cutoffDate, valueCols, timestampCol, itemCol, source["size"])
+      saveHistorySnapshot()
+  else:
+      processRawData(rawSource, None, None, valueCols, timestampCol, itemCol, source["size"])
+  writePreparedDataForModels(config["models"])
+  writeActuals(config["models"][0], cutoffDate)
+  # saved last, a run failing before this point is retried by the next one
+  sourcefingerprint.saveFingerprint(s3_client, S3BucketName, SourceFingerprintKey, sourcefingerprint.newFingerprint(source, configHash, contentHash))
@@ -0,0 +1,54 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger()
+
+# fingerprint of the raw source the last successful run processed, saved next to the history snapshot
+#   etag/size      from one HEAD of the source, an unchanged ETag and size means the same object, the run is a no-op
+#   contentDigest  sha256 streamed over the downloaded file, catches a re-upload of identical content (new ETag)
+#   configDigest   sha256 of the model config, a changed config always reprocesses the same raw data
+# it's only written once all the outputs are written, so a failed run is retried in full by the next one
+HASH_CHUNK_SIZE=1024*1024
+
+
+def configDigest(config):
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+# sha256 of a seekable file object, read in chunks and rewound for the parser
+def contentDigest(fileobj):
+    digest=hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+def headSource(client, bucket, key):
+    response=client.head_object(Bucket=bucket, Key=key)
+    return {"bucket": bucket, "key": key, "etag": response["ETag"], "size": response["ContentLength"]}
+
+def newFingerprint(source, configHash, contentHash=None):
+    fingerprint=dict(source)
+    fingerprint["configDigest"]=configHash
+    fingerprint["contentDigest"]=contentHash
+    return fingerprint
+
+# returns the saved fingerprint, or None when there's none yet
+def loadFingerprint(client, bucket, key):
+    try:
+        return json.loads(client.get_object(Bucket=bucket, Key=key)["Body"].read())
+    except client.exceptions.NoSuchKey:
+        return None
+
+def saveFingerprint(client, bucket, key, fingerprint):
+    client.put_object(Bucket=bucket, Key=key, Body=json.dumps(fingerprint, sort_keys=True).encode("utf-8"))
+
+def isSameObject(previous, source, configHash):
+    return (previous is not None and previous.get("configDigest")==configHash and previous.get("bucket")==source["bucket"]
+            and previous.get("key")==source["key"] and previous.get("etag")==source["etag"] and previous.get("size")==source["size"])
+
+def isSameContent(previous, contentHash, configHash):
+    return (previous is not None and contentHash is not None and previous.get("configDigest")==configHash
+            and previous.get("contentDigest")==contentHash)
@@ -5,5 +5,7 @@ from datetime import date
 StartDate=date.today()
 EndDate=date.today()
 ItemList=[]
-RawData={}
-FullHistoryList=[]
+# timeseriesstore.TimeSeriesStore with one field per raw value column of the models (col<number>, e.g. col2, col17)
+RawData=None
+# number of days before EndDate that are also published as daily files for metrics
+NumberOfRecentDays=5
@@ -0,0 +1,37 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import sys
+import importlib
+
+# imports lambda handler modules offline: the common layer on the path, fake credentials, and a fresh vars module for
+# every lambda folder (each folder has its own vars.py)
+REPO_ROOT=os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+BUCKET="forecast-test-bucket"
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("S3BucketName", BUCKET)
+os.environ.setdefault("MetricsNameSpace", "ForecastTest")
+os.environ.setdefault("ForecastExecutionRole", "arn:aws:iam::123456789012:role/forecast")
+os.environ.setdefault("NumberOfForecastsToKeep", "2")
+os.environ.setdefault("InstrumentationOutput", "off")
+if (os.path.join(REPO_ROOT, "common") not in sys.path):
+    sys.path.insert(0, os.path.join(REPO_ROOT, "common"))
+
+
+def loadLambdaModule(folder, moduleName):
+    sys.modules.pop("vars", None)
+    sys.path.insert(0, os.path.join(REPO_ROOT, folder))
+    try:
+        return importlib.import_module(moduleName)
+    finally:
+        sys.path.pop(0)
+        sys.modules.pop("vars", None)
+
+# a module of a lambda folder without a handler (no vars), e.g. forecastaccuracy
+def loadModule(folder, moduleName):
+    if (os.path.join(REPO_ROOT, folder) not in sys.path):
+        sys.path.insert(0, os.path.join(REPO_ROOT, folder))
+    return importlib.import_module(moduleName)
@@ -0,0 +1,92 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import unittest
+
+import lambdaloader
+import boto3
+import s3stream
+import archivemover
+from s3batch import S3BatchTransfer
+
+SOURCE="ForecastExports/dg_Forecast/export/"
+DESTINATION="Archived/ForecastExports/dg_Forecast/export/"
+KEYS=[SOURCE+"part"+str(part)+".csv" for part in range(5)]+[SOURCE+"_ARCHIVED"]
+
+
+# shouldStop that asks to stop from its n-th call on
+def stopAfter(calls):
+    count=[0]
+    def shouldStop():
+        count[0]+=1
+        return count[0]>calls
+    return shouldStop
+
+
+class MovePrefixTest(unittest.TestCase):
+
+    def setUp(self):
+        from moto import mock_aws
+        self.mock=mock_aws()
+        self.mock.start()
+        self.client=boto3.client("s3")
+        self.client.create_bucket(Bucket=lambdaloader.BUCKET)
+        for key in KEYS:
+            self.client.put_object(Bucket=lambdaloader.BUCKET, Key=key, Body=key.encode())
+        self.calls=[]
+        self.client.meta.events.register("before-call.s3.*", self.recordCall)
+        self.transfer=S3BatchTransfer(self.client, maxWorkers=2)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def recordCall(self, model, **kwargs):
+        self.calls.append(model.name)
+
+    def move(self, shouldStop=None):
+        return archivemover.movePrefix(self.client, self.transfer, lambdaloader.BUCKET, SOURCE, DESTINATION, chunkSize=2,
+                                       shouldStop=shouldStop, lastKeys=[SOURCE+"_ARCHIVED"])
+
+    def manifest(self):
+        return s3stream.readJson(self.client, lambdaloader.BUCKET, archivemover.manifestKey(DESTINATION))
+
+    def testResumesFromManifest(self):
+        self.assertFalse(self.move(stopAfter(1)))
+        manifest=self.manifest()
+        self.assertEqual(manifest["status"], archivemover.STATUS_COPYING)
+        self.assertEqual(manifest["keys"], sorted(KEYS))
+        self.assertEqual(manifest["copied"], sorted(KEYS)[:2])
+        self.assertEqual(self.calls.count("CopyObject"), 2)
+        # nothing deleted yet, the marker still triggers the next run
+        self.assertEqual(sorted(archivemover.listKeys(self.client, lambdaloader.BUCKET, SOURCE)), sorted(KEYS))
+
+        self.calls=[]
+        self.assertTrue(self.move())
+        # only the copies that were left, and the listed sizes spare the HEAD of every object
+        self.assertEqual(self.calls.count("CopyObject"), len(KEYS)-2)
+        self.assertNotIn("HeadObject", self.calls)
+        self.assertNotIn("ListObjectsV2", self.calls)
+        self.assertEqual(archivemover.listKeys(self.client, lambdaloader.BUCKET, SOURCE), [])
+        for key in KEYS:
+            body=self.client.get_object(Bucket=lambdaloader.BUCKET, Key=archivemover.destinationKey(key, SOURCE, DESTINATION))["Body"].read()
+            self.assertEqual(body, key.encode())
+        self.assertEqual(self.manifest()["status"], archivemover.STATUS_COMPLETE)
+
+    def testManifestWithoutSizes(self):
+        self.assertFalse(self.move(stopAfter(1)))
+        manifest=self.manifest()
+        del manifest["sizes"]
+        s3stream.writeJson(self.client, lambdaloader.BUCKET, archivemover.manifestKey(DESTINATION), manifest)
+        self.assertTrue(self.move())
+        self.assertEqual(archivemover.listKeys(self.client, lambdaloader.BUCKET, SOURCE), [])
+        self.assertEqual(len(archivemover.listKeys(self.client, lambdaloader.BUCKET, DESTINATION)), len(KEYS)+1)
+
+    def testCompleteMoveIsNoop(self):
+        self.assertTrue(self.move())
+        self.calls=[]
+        self.assertTrue(self.move())
+        self.assertNotIn("CopyObject", self.calls)
+        self.assertNotIn("DeleteObjects", self.calls)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import json
+import unittest
+
+import lambdaloader
+import boto3
+from botocore.stub import Stubber
+import configcache
+
+createForecastDataSetGroup=lambdaloader.loadLambdaModule("createForecastDataSetGroup", "createForecastDataSetGroup")
+ACCOUNT="arn:aws:forecast:us-east-1:123456789012:"
+SCHEMA={"Attributes": [{"AttributeName": "timestamp", "AttributeType": "timestamp"}]}
+
+
+# SQS record around the SNS envelope around the S3 notification
+def sqsRecord(messageId, objectKey):
+    message={"Records": [{"s3": {"bucket": {"name": lambdaloader.BUCKET}, "object": {"key": objectKey}}}]}
+    record={"body": json.dumps({"Message": json.dumps(message)})}
+    if (messageId is not None):
+        record["messageId"]=messageId
+    return record
+
+def dataset(name):
+    return {"DatasetName": name, "DatasetArn": ACCOUNT+"dataset/"+name}
+
+
+class MixedBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        from moto import mock_aws
+        self.mock=mock_aws()
+        self.mock.start()
+        s3=boto3.client("s3")
+        s3.create_bucket(Bucket=lambdaloader.BUCKET)
+        for datasetGroupName in ["failingGroup", "goodGroup"]:
+            config={"target_schema": SCHEMA, "related_schema": SCHEMA}
+            s3.put_object(Bucket=lambdaloader.BUCKET, Key=configcache.datasetGroupConfigKey(datasetGroupName), Body=json.dumps(config))
+        configcache.getCache().invalidate()
+        self.forecast=boto3.client("forecast")
+        self.stubber=Stubber(self.forecast)
+        createForecastDataSetGroup.forecast_client=self.forecast
+
+    def tearDown(self):
+        self.stubber.deactivate()
+        self.mock.stop()
+
+    # one unreadable record (and one without messageId), one group that fails in Forecast, one group that imports
+    def testOnlyFailedMessagesReported(self):
+        goodDatasets=[dataset("goodGroup_target"), dataset("goodGroup_related")]
+        self.stubber.add_response("list_datasets", {"Datasets": goodDatasets})
+        self.stubber.add_client_error("create_dataset", "LimitExceededException", expected_params={
+            "DatasetName": "failingGroup_target", "Domain": "CUSTOM", "DatasetType": "TARGET_TIME_SERIES",
+            "DataFrequency": "D", "Schema": SCHEMA})
+        self.stubber.add_response("list_dataset_groups", {"DatasetGroups": [
+            {"DatasetGroupName": "goodGroup", "DatasetGroupArn": ACCOUNT+"dataset-group/goodGroup"}]})
+        self.stubber.add_response("list_dataset_import_jobs", {"DatasetImportJobs": []})
+        s3Url="s3://"+lambdaloader.BUCKET+"/DatasetGroups/goodGroup/target.csv"
+        self.stubber.add_response("create_dataset_import_job", {"DatasetImportJobArn": ACCOUNT+"dataset-import-job/goodGroup_target/target_csv"}, expected_params={
+            "DatasetImportJobName": "target_csv", "DatasetArn": goodDatasets[0]["DatasetArn"],
+            "DataSource": {"S3Config": {"Path": s3Url, "RoleArn": createForecastDataSetGroup.roleArn}},
+            "TimestampFormat": "yyyy-MM-dd", "Format": "CSV"})
+        self.stubber.activate()
+
+        event={"Records": [
+            {"messageId": "bad", "body": "not json"},
+            {"body": "not json either"},
+            sqsRecord("failing", "DatasetGroups/failingGroup/target.csv"),
+            sqsRecord("good", "DatasetGroups/goodGroup/target.csv"),
+        ]}
+        response=createForecastDataSetGroup.onEventHandler(event, None)
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "bad"}, {"itemIdentifier": "failing"}]})
+        self.stubber.assert_no_pending_responses()
+
+
+if __name__=="__main__":
+    unittest.main()
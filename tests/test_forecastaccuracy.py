@@ -0,0 +1,113 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import math
+import unittest
+import numpy as np
+
+import lambdaloader
+
+forecastaccuracy=lambdaloader.loadModule("forecastMetrics", "forecastaccuracy")
+NAN=float("nan")
+
+
+# scalar reference over the (day, item) cells of the selection, straight from the metric definitions
+def referenceMetrics(real, forecast, level, cells):
+    pairs=[(real[day][item], forecast[day][item]) for day, item in cells
+           if not math.isnan(real[day][item]) and not math.isnan(forecast[day][item])]
+    nonZero=[(realValue, forecastValue) for realValue, forecastValue in pairs if realValue!=0]
+    sumAbsReal=sum(abs(realValue) for realValue, forecastValue in pairs)
+    metrics={"MAPE": NAN, "WAPE": NAN, "RMSE": NAN, "wQL": NAN}
+    if (len(nonZero)>0):
+        metrics["MAPE"]=100*sum(abs((forecastValue-realValue)/realValue) for realValue, forecastValue in nonZero)/len(nonZero)
+    if (len(pairs)>0):
+        metrics["RMSE"]=math.sqrt(sum((forecastValue-realValue)**2 for realValue, forecastValue in pairs)/len(pairs))
+    if (sumAbsReal!=0):
+        metrics["WAPE"]=sum(abs(forecastValue-realValue) for realValue, forecastValue in pairs)/sumAbsReal
+        if (level is not None):
+            loss=sum(level*max(realValue-forecastValue, 0)+(1-level)*max(forecastValue-realValue, 0) for realValue, forecastValue in pairs)
+            metrics["wQL"]=2*loss/sumAbsReal
+    return metrics
+
+# ForecastPerformance as published before the accuracy engine, for one quantile and one day
+def oldForecastPerformance(realDay, forecastDay):
+    total=0
+    for realValue, forecastValue in zip(realDay, forecastDay):
+        total+=0 if realValue==0 else abs((forecastValue-realValue)/realValue)*100
+    return total/len(realDay)
+
+
+class ComputeAccuracyTest(unittest.TestCase):
+
+    def setUp(self):
+        # [day, item]: NaN actuals, a NaN forecast, zero actuals and a day without any real value
+        self.real=[[10.0, 0.0, 5.0, NAN],
+                   [12.0, 3.0, NAN, 8.0],
+                   [NAN, NAN, NAN, NAN],
+                   [0.0, 0.0, 4.0, 2.0]]
+        self.forecasts={
+            "p10": [[8.0, 1.0, 4.0, 3.0], [11.0, NAN, 2.0, 6.0], [1.0, 1.0, 1.0, 1.0], [1.0, 0.0, 3.0, 2.5]],
+            "p50": [[11.0, 0.5, 6.0, 3.0], [12.0, 2.0, 2.0, 9.0], [1.0, 1.0, 1.0, 1.0], [0.0, 1.0, 4.0, 1.0]],
+            "mean": [[9.0, 0.0, 5.5, 3.0], [13.0, 4.0, 2.0, 7.0], [1.0, 1.0, 1.0, 1.0], [0.5, 0.5, 3.5, 2.0]],
+        }
+        self.quantileNames=["p10", "p50", "mean"]
+        self.result=forecastaccuracy.computeAccuracy(self.real, self.forecasts, self.quantileNames)
+
+    def assertMetrics(self, actual, expected, message):
+        for name in forecastaccuracy.METRIC_NAMES:
+            if (math.isnan(expected[name])):
+                self.assertTrue(np.isnan(actual[name]), message+" "+name)
+            else:
+                self.assertAlmostEqual(float(actual[name]), expected[name], places=9, msg=message+" "+name)
+
+    def testMatchesScalarReference(self):
+        numOfDays, numOfItems=len(self.real), len(self.real[0])
+        for p in self.quantileNames:
+            level=forecastaccuracy.quantileFromName(p)
+            forecast=self.forecasts[p]
+            for item in range(numOfItems):
+                expected=referenceMetrics(self.real, forecast, level, [(day, item) for day in range(numOfDays)])
+                self.assertMetrics({name: values[item] for name, values in self.result["items"][p].items()}, expected, p+" item "+str(item))
+            for day in range(numOfDays):
+                expected=referenceMetrics(self.real, forecast, level, [(day, item) for item in range(numOfItems)])
+                self.assertMetrics({name: values[day] for name, values in self.result["days"][p].items()}, expected, p+" day "+str(day))
+            allCells=[(day, item) for day in range(numOfDays) for item in range(numOfItems)]
+            self.assertMetrics(self.result["aggregate"][p], referenceMetrics(self.real, forecast, level, allCells), p+" aggregate")
+
+    def testMissingValuesIgnored(self):
+        # day 2 has no real value: every metric is NaN, not 0
+        for name in forecastaccuracy.METRIC_NAMES:
+            self.assertTrue(np.isnan(self.result["days"]["p50"][name][2]), name)
+        # item 1 on day 1 has a NaN p10 forecast, only day 0 and day 3 (zero actuals) are left for p10
+        self.assertAlmostEqual(float(self.result["items"]["p10"]["RMSE"][1]), math.sqrt((1.0+0.0)/2))
+
+    def testZeroActualsExcludedFromMape(self):
+        # item 1: actuals 0, 3, NaN, 0, so MAPE only covers day 1
+        self.assertAlmostEqual(float(self.result["items"]["p50"]["MAPE"][1]), 100*abs(2.0-3.0)/3.0)
+        # only zero actuals: no MAPE, WAPE undefined as well
+        onlyZeros=forecastaccuracy.computeAccuracy([[0.0, 0.0]], {"p50": [[1.0, 2.0]]}, ["p50"])
+        self.assertTrue(np.isnan(onlyZeros["aggregate"]["p50"]["MAPE"]))
+        self.assertTrue(np.isnan(onlyZeros["aggregate"]["p50"]["WAPE"]))
+        self.assertAlmostEqual(onlyZeros["aggregate"]["p50"]["RMSE"], math.sqrt(2.5))
+
+    def testNoWqlWithoutQuantile(self):
+        self.assertIsNone(forecastaccuracy.quantileFromName("mean"))
+        self.assertTrue(np.isnan(self.result["aggregate"]["mean"]["wQL"]))
+        self.assertTrue(np.isnan(self.result["items"]["mean"]["wQL"]).all())
+        self.assertTrue(np.isnan(self.result["days"]["mean"]["wQL"]).all())
+        self.assertFalse(np.isnan(self.result["aggregate"]["mean"]["MAPE"]))
+
+    def testQuantileNames(self):
+        self.assertEqual([forecastaccuracy.quantileFromName(name) for name in ["p10", "P90", "0.5", "50", "p0", "p100"]],
+                         [0.1, 0.9, 0.5, 0.5, None, None])
+
+    # with every item present and no zero actuals, the first-day MAPE is the ForecastPerformance value published before
+    def testFirstDayMapeParity(self):
+        generator=np.random.RandomState(3)
+        real=generator.uniform(1, 1000, size=(7, 50))
+        forecast=real*generator.uniform(0.5, 1.5, size=real.shape)
+        result=forecastaccuracy.computeAccuracy(real, {"p50": forecast}, ["p50"])
+        self.assertAlmostEqual(float(result["days"]["p50"]["MAPE"][0]), oldForecastPerformance(real[0], forecast[0]), places=9)
+
+
+if __name__=="__main__":
+    unittest.main()
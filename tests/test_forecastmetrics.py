@@ -0,0 +1,39 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import unittest
+
+import lambdaloader
+import boto3
+import archivemover
+
+forecastMetrics=lambdaloader.loadLambdaModule("forecastMetrics", "forecastMetrics")
+
+
+class ExportPrefixTest(unittest.TestCase):
+
+    def setUp(self):
+        from moto import mock_aws
+        self.mock=mock_aws()
+        self.mock.start()
+        self.client=boto3.client("s3")
+        self.client.create_bucket(Bucket=lambdaloader.BUCKET)
+        for datasetGroupName in ["dg1", "dg10", "dg2"]:
+            self.client.put_object(Bucket=lambdaloader.BUCKET, Key="ForecastExports/"+datasetGroupName+"_Forecast/export/_SUCCESS", Body=b"")
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def exportKeys(self, event):
+        return archivemover.listKeys(self.client, lambdaloader.BUCKET, forecastMetrics.getExportPrefix(event))
+
+    # invoked by the pipeline orchestrator: only the export of that dataset group, not the ones sharing its name prefix
+    def testOnlyRequestedGroup(self):
+        self.assertEqual(self.exportKeys({"datasetGroupName": "dg1"}), ["ForecastExports/dg1_Forecast/export/_SUCCESS"])
+
+    def testScheduledRunListsEveryExport(self):
+        self.assertEqual(len(self.exportKeys({})), 3)
+        self.assertEqual(len(self.exportKeys(None)), 3)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import importlib
+import unittest
+from unittest import mock
+
+import lambdaloader
+import instrumentation
+
+
+class RuntimeNamespaceTest(unittest.TestCase):
+
+    def tearDown(self):
+        importlib.reload(instrumentation)
+
+    def namespace(self, environ):
+        with mock.patch.dict(os.environ, environ):
+            for name in ("MetricsNameSpace", "RuntimeMetricsNameSpace"):
+                if (name not in environ):
+                    os.environ.pop(name, None)
+            return importlib.reload(instrumentation).RUNTIME_NAMESPACE
+
+    # runtime metrics never land in the namespace of the accuracy metrics
+    def testSeparateFromAccuracyMetrics(self):
+        self.assertEqual(self.namespace({"MetricsNameSpace": "ForecastTest"}), "ForecastTest/Runtime")
+
+    def testOverride(self):
+        self.assertEqual(self.namespace({"MetricsNameSpace": "ForecastTest", "RuntimeMetricsNameSpace": "Runtime"}), "Runtime")
+
+    def testWithoutMetricsNamespace(self):
+        self.assertEqual(self.namespace({}), "ForecastLambda/Runtime")
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import io
+import json
+import unittest
+from datetime import datetime
+from unittest import mock
+
+import lambdaloader
+import boto3
+from botocore.stub import Stubber
+import metricpublisher
+from metricpublisher import MetricPublisher
+
+TIMESTAMP=datetime(2020, 5, 1)
+
+
+class CapturingClient(object):
+
+    def __init__(self):
+        self.calls=[]
+
+    def put_metric_data(self, Namespace, MetricData):
+        self.calls.append(MetricData)
+        return {}
+
+
+class BatchingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client=CapturingClient()
+        self.publisher=MetricPublisher(self.client, "ForecastTest", maxWorkers=1)
+
+    def testThousandDatumsPerCall(self):
+        for index in range(2500):
+            self.publisher.add("MAPE", [("ModelConfig", "model"), ("HorizonDay", index)], index, TIMESTAMP)
+        self.assertEqual(self.publisher.flush(), 3)
+        self.assertEqual([len(call) for call in self.client.calls], [1000, 1000, 500])
+        # insertion order is kept
+        self.assertEqual([datum["Value"] for call in self.client.calls for datum in call], [float(index) for index in range(2500)])
+        self.assertEqual(len(self.publisher), 0)
+
+    def testRequestSizeLimit(self):
+        dimensions=[("Dimension"+str(index), "v"*250) for index in range(30)]
+        for index in range(300):
+            self.publisher.add("MAPE", dimensions, index, TIMESTAMP)
+        datumSize=metricpublisher.estimateDatumSize(self.publisher.datums[0])
+        self.assertGreater(datumSize*300, metricpublisher.MAX_REQUEST_BYTES)
+        self.publisher.flush()
+        self.assertGreater(len(self.client.calls), 1)
+        for call in self.client.calls:
+            self.assertLessEqual(sum(metricpublisher.estimateDatumSize(datum) for datum in call), metricpublisher.MAX_REQUEST_BYTES)
+        self.assertEqual(sum(len(call) for call in self.client.calls), 300)
+
+    def testValuesSplitAt150(self):
+        values=[float(index%400) for index in range(1000)]+[float("nan"), float("inf")]
+        self.publisher.addValues("APE", {"ModelConfig": "model"}, values, TIMESTAMP)
+        self.assertEqual([len(datum["Values"]) for datum in self.publisher.datums], [150, 150, 100])
+        self.assertEqual(sum(sum(datum["Counts"]) for datum in self.publisher.datums), 1000)
+        self.assertEqual(self.publisher.datums[0]["Counts"][0], 3.0)
+        self.publisher.flush()
+        self.assertEqual(len(self.client.calls), 1)
+
+    def testNonFiniteValuesDropped(self):
+        self.publisher.add("MAPE", {}, float("nan"), TIMESTAMP)
+        self.publisher.addValues("APE", {}, [float("nan")], TIMESTAMP)
+        self.assertEqual(self.publisher.flush(), 0)
+        self.assertEqual(self.client.calls, [])
+
+    def testEmfOutput(self):
+        stream=io.StringIO()
+        publisher=MetricPublisher(self.client, "ForecastTest", output="emf", emfStream=stream)
+        publisher.addValues("APE", {"ModelConfig": "model"}, range(250), TIMESTAMP)
+        publisher.add("MAPE", {"ModelConfig": "model"}, 1.5, TIMESTAMP)
+        self.assertEqual(publisher.flush(), 0)
+        self.assertEqual(self.client.calls, [])
+        events=[json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(sum(len(event["APE"]) for event in events), 250)
+        self.assertTrue(all(len(event["APE"])<=metricpublisher.MAX_EMF_VALUES for event in events))
+        self.assertEqual([event["MAPE"] for event in events if "MAPE" in event], [1.5])
+
+
+class RetryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client=boto3.client("cloudwatch")
+        self.stubber=Stubber(self.client)
+        self.publisher=MetricPublisher(self.client, "ForecastTest", maxWorkers=1, maxAttempts=3)
+        self.publisher.add("MAPE", {"ModelConfig": "model"}, 1.0, TIMESTAMP)
+
+    def tearDown(self):
+        self.stubber.deactivate()
+
+    def flush(self):
+        with mock.patch.object(metricpublisher.time, "sleep") as sleep:
+            try:
+                return self.publisher.flush()
+            finally:
+                self.sleeps=sleep.call_count
+
+    def testThrottlingRetried(self):
+        self.stubber.add_client_error("put_metric_data", "Throttling")
+        self.stubber.add_client_error("put_metric_data", "ServiceUnavailable")
+        self.stubber.add_response("put_metric_data", {})
+        self.stubber.activate()
+        self.assertEqual(self.flush(), 1)
+        self.assertEqual(self.sleeps, 2)
+        self.stubber.assert_no_pending_responses()
+
+    def testGivesUpAfterMaxAttempts(self):
+        for _ in range(3):
+            self.stubber.add_client_error("put_metric_data", "Throttling")
+        self.stubber.activate()
+        with self.assertRaises(Exception):
+            self.flush()
+        self.assertEqual(self.sleeps, 2)
+        self.stubber.assert_no_pending_responses()
+
+    def testOtherErrorsNotRetried(self):
+        self.stubber.add_client_error("put_metric_data", "InvalidParameterValue")
+        self.stubber.activate()
+        with self.assertRaises(Exception):
+            self.flush()
+        self.assertEqual(self.sleeps, 0)
+
+    # a failed batch doesn't stop the others, the error is raised once all calls are done
+    def testParallelBatchFailure(self):
+        client=CapturingClient()
+        calls=[]
+        def putMetricData(Namespace, MetricData):
+            calls.append(len(MetricData))
+            if (len(calls)==1):
+                raise ValueError("rejected")
+            return {}
+        client.put_metric_data=putMetricData
+        publisher=MetricPublisher(client, "ForecastTest", maxWorkers=2)
+        for index in range(3000):
+            publisher.add("MAPE", {"HorizonDay": index}, index, TIMESTAMP)
+        with self.assertRaises(ValueError):
+            publisher.flush()
+        self.assertEqual(sorted(calls), [1000, 1000, 1000])
+
+
+if __name__=="__main__":
+    unittest.main()
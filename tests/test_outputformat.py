@@ -0,0 +1,43 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import io
+import unittest
+
+import lambdaloader
+import outputformat
+
+createForecastDataSetGroup=lambdaloader.loadLambdaModule("createForecastDataSetGroup", "createForecastDataSetGroup")
+
+
+class UnclosedBytesIO(io.BytesIO):
+
+    def close(self):
+        self.closedValue=self.getvalue()
+        super(UnclosedBytesIO, self).close()
+
+
+class OutputFormatTest(unittest.TestCase):
+
+    def testOnlyPlainCsv(self):
+        self.assertEqual(outputformat.fileExtension("csv"), ".csv")
+        for outputFormat in ("csv.gz", "parquet", None):
+            with self.assertRaises(ValueError):
+                outputformat.checkFormat(outputFormat)
+
+    def testRowsWithoutHeader(self):
+        fileobj=UnclosedBytesIO()
+        writer=outputformat.openRowWriter("csv", fileobj)
+        writer.writerow(("2020-05-01", "CA", 1.5))
+        writer.writerow(("2020-05-02", "CA", ""))
+        writer.close()
+        self.assertEqual(writer.rowCount, 2)
+        self.assertEqual(fileobj.closedValue, b"2020-05-01,CA,1.5\r\n2020-05-02,CA,\r\n")
+
+    # only the files the raw data processor writes start an import job
+    def testImportedFileNames(self):
+        self.assertEqual([createForecastDataSetGroup.getDataFileType("DatasetGroups/dg/"+name) for name in ("target.csv", "related.csv", "target.csv.gz", "related.parquet", "config.json")],
+                         ["target", "related", None, None, None])
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,252 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipelineOrchestrator"))
+
+import pipelinestate
+from pipelinestate import IMPORTING, TRAINING, FORECASTING, EXPORTING, EVALUATED, FAILED
+
+NOW=1600000000
+DAY=24*3600
+
+
+# Forecast side of the pipeline as plain statuses, created resources start in CREATE_IN_PROGRESS
+class StubActions(object):
+
+    def __init__(self, **statuses):
+        self.statuses={"import": None, "predictor": None, "forecast": None, "export": None}
+        self.statuses.update(statuses)
+        self.created=[]
+        self.evaluated=[]
+
+    def importStatus(self, name):
+        return self.statuses["import"]
+
+    def predictorStatus(self, name):
+        return self.statuses["predictor"]
+
+    def forecastStatus(self, name):
+        return self.statuses["forecast"]
+
+    def exportStatus(self, name):
+        return self.statuses["export"]
+
+    def _create(self, kind, name):
+        self.created.append(kind)
+        self.statuses[kind]="CREATE_IN_PROGRESS"
+
+    def createPredictor(self, name):
+        self._create("predictor", name)
+
+    def createForecast(self, name):
+        self._create("forecast", name)
+
+    def createExport(self, name):
+        self._create("export", name)
+
+    def evaluate(self, name):
+        self.evaluated.append(name)
+
+
+def states(record):
+    return [entry["state"] for entry in record["history"]]
+
+
+class PollScheduleTest(unittest.TestCase):
+
+    def testBackoffDoublesUpToCap(self):
+        self.assertEqual([pipelinestate.nextPollDelay(IMPORTING, attempts) for attempts in range(6)], [300, 600, 1200, 2400, 3600, 3600])
+        self.assertEqual([pipelinestate.nextPollDelay(TRAINING, attempts) for attempts in range(3)], [900, 1800, 3600])
+        self.assertEqual([pipelinestate.nextPollDelay(EXPORTING, attempts) for attempts in range(2)], [120, 240])
+
+    def testScheduledChecksFollowBackoff(self):
+        record=pipelinestate.newRecord("dg", NOW)
+        actions=StubActions(**{"import": "CREATE_IN_PROGRESS"})
+        now=NOW
+        delays=[]
+        for _ in range(4):
+            self.assertTrue(pipelinestate.isDue(record, now))
+            pipelinestate.advance(record, actions, now)
+            delays.append(record["nextCheckAt"]-now)
+            self.assertFalse(pipelinestate.isDue(record, now))
+            now=record["nextCheckAt"]
+        self.assertEqual(delays, [300, 600, 1200, 2400])
+        self.assertEqual(record["state"], IMPORTING)
+
+    def testTransitionResetsBackoff(self):
+        record=pipelinestate.newRecord("dg", NOW)
+        actions=StubActions(**{"import": "CREATE_IN_PROGRESS"})
+        pipelinestate.advance(record, actions, NOW)
+        pipelinestate.advance(record, actions, NOW+300)
+        actions.statuses["import"]="ACTIVE"
+        pipelinestate.advance(record, actions, NOW+900)
+        self.assertEqual(record["state"], TRAINING)
+        self.assertEqual(record["nextCheckAt"], NOW+900+900)
+        self.assertEqual(record["attempts"], 1)
+
+
+class AdvanceTest(unittest.TestCase):
+
+    def testEveryTransition(self):
+        record=pipelinestate.newRecord("dg", NOW)
+        actions=StubActions(**{"import": "ACTIVE"})
+        expected=[(TRAINING, "predictor"), (FORECASTING, "forecast"), (EXPORTING, "export")]
+        now=NOW
+        for state, kind in expected:
+            pipelinestate.advance(record, actions, now)
+            self.assertEqual(record["state"], state)
+            self.assertEqual(actions.created[-1], kind)
+            actions.statuses[kind]="ACTIVE"
+            now+=DAY
+        pipelinestate.advance(record, actions, now)
+        self.assertEqual(record["state"], EVALUATED)
+        self.assertEqual(states(record), [IMPORTING, TRAINING, FORECASTING, EXPORTING, EVALUATED])
+        self.assertEqual(actions.created, ["predictor", "forecast", "export"])
+        self.assertEqual(actions.evaluated, ["dg"])
+        self.assertIsNone(record["nextCheckAt"])
+        self.assertFalse(pipelinestate.isDue(record, now+30*DAY))
+
+    def testFinishedResourcesAdvanceInOneCall(self):
+        record=pipelinestate.newRecord("dg", NOW)
+        actions=StubActions(**{"import": "ACTIVE", "predictor": "ACTIVE", "forecast": "ACTIVE", "export": "ACTIVE"})
+        pipelinestate.advance(record, actions, NOW)
+        self.assertEqual(record["state"], EVALUATED)
+        self.assertEqual(actions.created, [])
+        self.assertEqual(actions.evaluated, ["dg"])
+
+    def testExistingResourceNotCreatedTwice(self):
+        record=pipelinestate.newRecord("dg", NOW)
+        actions=StubActions(**{"import": "ACTIVE", "predictor": "CREATE_IN_PROGRESS"})
+        pipelinestate.advance(record, actions, NOW)
+        self.assertEqual(record["state"], TRAINING)
+        self.assertEqual(actions.created, [])
+
+    def testCreateFailedInEveryState(self):
+        for kind, state in [("import", IMPORTING), ("predictor", TRAINING), ("forecast", FORECASTING), ("export", EXPORTING)]:
+            statuses={"import": "ACTIVE", "predictor": "ACTIVE", "forecast": "ACTIVE", "export": "ACTIVE"}
+            statuses[kind]="CREATE_FAILED"
+            record=pipelinestate.newRecord("dg", NOW)
+            actions=StubActions(**statuses)
+            pipelinestate.advance(record, actions, NOW)
+            self.assertEqual(record["state"], FAILED, kind)
+            self.assertEqual(record["reason"], state+" resource failed")
+            self.assertEqual(actions.evaluated, [])
+            self.assertFalse(pipelinestate.isDue(record, NOW+1))
+            self.assertTrue(pipelinestate.isDue(record, NOW+pipelinestate.FAILED_RECHECK_SECONDS))
+
+    def testTimeout(self):
+        record=pipelinestate.newRecord("dg", NOW)
+        actions=StubActions(**{"import": "CREATE_IN_PROGRESS"})
+        pipelinestate.advance(record, actions, NOW+pipelinestate.STATE_TIMEOUT_SECONDS)
+        self.assertEqual(record["state"], IMPORTING)
+        pipelinestate.advance(record, actions, NOW+pipelinestate.STATE_TIMEOUT_SECONDS+1)
+        self.assertEqual(record["state"], FAILED)
+        self.assertEqual(record["reason"], IMPORTING+" timed out")
+
+    def testMissingResourceTimesOut(self):
+        record=pipelinestate.newRecord("dg", NOW)
+        pipelinestate.advance(record, StubActions(), NOW+pipelinestate.STATE_TIMEOUT_SECONDS+1)
+        self.assertEqual(record["state"], FAILED)
+
+
+class FailedRecheckTest(unittest.TestCase):
+
+    def failedRecord(self, actions):
+        record=pipelinestate.newRecord("dg", NOW)
+        pipelinestate.advance(record, actions, NOW)
+        self.assertEqual(record["state"], FAILED)
+        return record
+
+    def testStaysFailedWhileResourceUnchanged(self):
+        actions=StubActions(**{"import": "ACTIVE", "predictor": "CREATE_FAILED"})
+        record=self.failedRecord(actions)
+        now=NOW+pipelinestate.FAILED_RECHECK_SECONDS
+        pipelinestate.advance(record, actions, now)
+        self.assertEqual(record["state"], FAILED)
+        self.assertEqual(record["nextCheckAt"], now+pipelinestate.FAILED_RECHECK_SECONDS)
+        self.assertEqual(actions.created, [])
+
+    # trainDefaultPredictor deletes the failed predictor and trains a new one the next day
+    def testRecreatedPredictorResumesPipeline(self):
+        actions=StubActions(**{"import": "ACTIVE", "predictor": "CREATE_FAILED"})
+        record=self.failedRecord(actions)
+        actions.statuses["predictor"]=None
+        now=NOW+pipelinestate.FAILED_RECHECK_SECONDS
+        pipelinestate.advance(record, actions, now)
+        self.assertEqual(record["state"], TRAINING)
+        self.assertEqual(actions.created, [])
+        actions.statuses.update({"predictor": "ACTIVE", "forecast": "ACTIVE", "export": "ACTIVE"})
+        pipelinestate.advance(record, actions, now+DAY)
+        self.assertEqual(record["state"], EVALUATED)
+        self.assertEqual(states(record), [IMPORTING, TRAINING, FAILED, TRAINING, FORECASTING, EXPORTING, EVALUATED])
+        self.assertEqual(actions.evaluated, ["dg"])
+
+    def testNewImportJobAfterFailedImport(self):
+        actions=StubActions(**{"import": "CREATE_FAILED"})
+        record=self.failedRecord(actions)
+        actions.statuses["import"]="CREATE_IN_PROGRESS"
+        pipelinestate.advance(record, actions, NOW+pipelinestate.FAILED_RECHECK_SECONDS)
+        self.assertEqual(record["state"], IMPORTING)
+        self.assertEqual(record["attempts"], 1)
+
+    def testTimedOutStateResumesWhenResourceFinishes(self):
+        actions=StubActions(**{"import": "CREATE_IN_PROGRESS"})
+        record=pipelinestate.newRecord("dg", NOW)
+        now=NOW+pipelinestate.STATE_TIMEOUT_SECONDS+1
+        pipelinestate.advance(record, actions, now)
+        self.assertEqual(record["state"], FAILED)
+        pipelinestate.advance(record, actions, now+pipelinestate.FAILED_RECHECK_SECONDS)
+        self.assertEqual(record["state"], FAILED)
+        actions.statuses["import"]="ACTIVE"
+        pipelinestate.advance(record, actions, now+2*pipelinestate.FAILED_RECHECK_SECONDS)
+        self.assertEqual(record["state"], TRAINING)
+        self.assertEqual(actions.created, ["predictor"])
+
+
+class ReconcileTest(unittest.TestCase):
+
+    def testAddsNewAndDropsDeletedGroups(self):
+        state={"datasetGroups": {}}
+        pipelinestate.reconcile(state, ["dg1", "dg2"], NOW)
+        self.assertEqual(sorted(state["datasetGroups"]), ["dg1", "dg2"])
+        self.assertEqual(state["datasetGroups"]["dg1"]["state"], IMPORTING)
+        pipelinestate.reconcile(state, ["dg2", "dg3"], NOW+DAY)
+        self.assertEqual(sorted(state["datasetGroups"]), ["dg2", "dg3"])
+
+    def testKeepsRecordsInProgress(self):
+        state={"datasetGroups": {}}
+        pipelinestate.reconcile(state, ["dg"], NOW)
+        record=state["datasetGroups"]["dg"]
+        pipelinestate.advance(record, StubActions(**{"import": "ACTIVE"}), NOW)
+        pipelinestate.reconcile(state, ["dg"], NOW+DAY)
+        self.assertIs(state["datasetGroups"]["dg"], record)
+        self.assertEqual(record["state"], TRAINING)
+
+    # a finished group that still exists in Forecast is never replayed, so it isn't evaluated a second time
+    def testFinishedGroupsNotReplayed(self):
+        state={"datasetGroups": {}}
+        actions=StubActions(**{"import": "ACTIVE", "predictor": "ACTIVE", "forecast": "ACTIVE", "export": "ACTIVE"})
+        for day in range(60):
+            now=NOW+day*DAY
+            pipelinestate.reconcile(state, ["dg"], now)
+            for record in state["datasetGroups"].values():
+                if (pipelinestate.isDue(record, now)):
+                    pipelinestate.advance(record, actions, now)
+        self.assertEqual(state["datasetGroups"]["dg"]["state"], EVALUATED)
+        self.assertEqual(actions.evaluated, ["dg"])
+
+    def testFailedGroupsKeptWhileTheyExist(self):
+        state={"datasetGroups": {}}
+        pipelinestate.reconcile(state, ["dg"], NOW)
+        pipelinestate.advance(state["datasetGroups"]["dg"], StubActions(**{"import": "CREATE_FAILED"}), NOW)
+        pipelinestate.reconcile(state, ["dg"], NOW+60*DAY)
+        self.assertEqual(state["datasetGroups"]["dg"]["state"], FAILED)
+        pipelinestate.reconcile(state, [], NOW+61*DAY)
+        self.assertEqual(state["datasetGroups"], {})
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import unittest
+from datetime import date, datetime, timedelta, timezone
+
+import lambdaloader
+
+retentionpolicy=lambdaloader.loadModule("deleteExpiredForecast", "retentionpolicy")
+NOW=datetime(2020, 6, 1, tzinfo=timezone.utc)
+FIRST_DAY=date(2020, 5, 1)
+
+
+# one group per day for a model, created the day after its data ends, oldest first
+def dailyGroups(modelName, numOfDays, firstDay=FIRST_DAY):
+    datasetGroups=[]
+    for day in range(numOfDays):
+        endDay=firstDay+timedelta(days=day)
+        name=modelName+"_20200101_"+endDay.strftime("%Y%m%d")
+        datasetGroups.append({"DatasetGroupName": name, "DatasetGroupArn": "arn:"+name,
+                              "CreationTime": datetime(endDay.year, endDay.month, endDay.day, tzinfo=timezone.utc)+timedelta(days=1)})
+    return datasetGroups
+
+def kept(decisions):
+    return sorted(decision["datasetGroupName"] for decision in decisions if not decision["expired"])
+
+def names(datasetGroups, indexes):
+    return sorted(datasetGroups[index]["DatasetGroupName"] for index in indexes)
+
+# accuracy per forecast start day, by index of the group
+def accuracyByIndex(datasetGroups, values):
+    accuracy={}
+    for datasetGroup, value in zip(datasetGroups, values):
+        prefix, forecastStartDay=retentionpolicy.parseGroupName(datasetGroup["DatasetGroupName"])
+        if (value is not None):
+            accuracy[forecastStartDay]=value
+    return lambda prefix, policy, startDay, endDay: accuracy
+
+
+class RetentionPolicyTest(unittest.TestCase):
+
+    def policies(self, keep, keepBest=0, maxAgeDays=0, overridesJson=None):
+        return retentionpolicy.loadPolicies(retentionpolicy.newPolicy(keep, keepBest, maxAgeDays), overridesJson)
+
+    def testKeepsNewest(self):
+        datasetGroups=dailyGroups("model", 5)
+        decisions=retentionpolicy.evaluate(datasetGroups, self.policies(2), NOW)
+        self.assertEqual(kept(decisions), names(datasetGroups, [3, 4]))
+        # oldest expired first
+        self.assertEqual([decision["datasetGroupName"] for decision in retentionpolicy.expiredDatasetGroups(decisions)],
+                         [datasetGroup["DatasetGroupName"] for datasetGroup in datasetGroups[:3]])
+
+    def testKeepBestOnTopOfNewest(self):
+        datasetGroups=dailyGroups("model", 6)
+        lookup=accuracyByIndex(datasetGroups, [0.5, 0.1, 0.4, 0.2, 0.9, 0.0])
+        decisions=retentionpolicy.evaluate(datasetGroups, self.policies(1, keepBest=2), NOW, lookup)
+        # index 5 is the newest (and the best overall), the best two of the others are 1 and 3
+        self.assertEqual(kept(decisions), names(datasetGroups, [1, 3, 5]))
+
+    def testAccuracyTieKeepsNewer(self):
+        datasetGroups=dailyGroups("model", 5)
+        lookup=accuracyByIndex(datasetGroups, [0.1, 0.1, 0.1, 0.5, 0.5])
+        decisions=retentionpolicy.evaluate(list(reversed(datasetGroups)), self.policies(1, keepBest=2), NOW, lookup)
+        self.assertEqual(kept(decisions), names(datasetGroups, [1, 2, 4]))
+
+    def testCreationTimeTieByName(self):
+        datasetGroups=dailyGroups("model", 3)
+        for datasetGroup in datasetGroups:
+            datasetGroup["CreationTime"]=NOW-timedelta(days=1)
+        for order in (datasetGroups, list(reversed(datasetGroups))):
+            self.assertEqual(kept(retentionpolicy.evaluate(order, self.policies(1), NOW)), names(datasetGroups, [2]))
+
+    # a group evaluated without a datapoint (metrics not published yet, or the lookup came back empty) isn't a candidate
+    def testMissingDatapoint(self):
+        datasetGroups=dailyGroups("model", 5)
+        lookup=accuracyByIndex(datasetGroups, [None, 0.3, None, 0.2, 0.9])
+        decisions=retentionpolicy.evaluate(datasetGroups, self.policies(1, keepBest=2), NOW, lookup)
+        self.assertEqual(kept(decisions), names(datasetGroups, [1, 3, 4]))
+        missing=[decision for decision in decisions if decision["datasetGroupName"]==datasetGroups[0]["DatasetGroupName"]][0]
+        self.assertIsNone(missing["accuracy"])
+        self.assertTrue(missing["expired"])
+
+    def testMaxAgeExpiresBestGroups(self):
+        datasetGroups=dailyGroups("model", 5)
+        lookup=accuracyByIndex(datasetGroups, [0.0, 0.1, 0.5, 0.5, 0.5])
+        decisions=retentionpolicy.evaluate(datasetGroups, self.policies(1, keepBest=2, maxAgeDays=29), NOW, lookup)
+        # index 0 (created 2020-05-02) is 30 days old, 2 and 3 tie and the newer one is kept
+        self.assertEqual(kept(decisions), names(datasetGroups, [1, 3, 4]))
+
+    def testPolicyPerModel(self):
+        datasetGroups=dailyGroups("modelA", 4)+dailyGroups("modelB", 4)
+        decisions=retentionpolicy.evaluate(datasetGroups, self.policies(1, overridesJson='{"modelB": {"keep": 3}}'), NOW)
+        self.assertEqual(kept(decisions), names(datasetGroups, [3, 5, 6, 7]))
+
+    def testUnmatchedNamesUnderDefaultKeep(self):
+        datasetGroups=[{"DatasetGroupName": "manual"+str(index), "DatasetGroupArn": "arn:manual"+str(index),
+                        "CreationTime": NOW-timedelta(days=10-index)} for index in range(4)]
+        lookups=[]
+        def lookup(prefix, policy, startDay, endDay):
+            lookups.append(prefix)
+            return {}
+        decisions=retentionpolicy.evaluate(datasetGroups+dailyGroups("model", 2), self.policies(2, keepBest=1), NOW, lookup)
+        expired=[decision["datasetGroupName"] for decision in decisions if decision["expired"]]
+        self.assertEqual(expired, ["manual0", "manual1"])
+        self.assertEqual(lookups, ["model"])
+
+
+if __name__=="__main__":
+    unittest.main()
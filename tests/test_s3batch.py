@@ -0,0 +1,138 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+import boto3
+from botocore.stub import Stubber
+from botocore.exceptions import ClientError
+import s3batch
+from s3batch import S3BatchTransfer, S3BatchError
+
+# offline: botocore Stubber for the call sequences, moto for the copies
+
+
+def clientError(code):
+    return ClientError({"Error": {"Code": code, "Message": code}}, "Test")
+
+def newS3Client():
+    return boto3.client("s3", region_name="us-east-1")
+
+
+class RunTest(unittest.TestCase):
+
+    def testResultsInInputOrder(self):
+        transfer=S3BatchTransfer(None, maxWorkers=4)
+        self.assertEqual(transfer.run("square", lambda value: value*value, [(value,) for value in range(20)]), [value*value for value in range(20)])
+
+    def testFailuresRaisedTogether(self):
+        def fail(value):
+            if (value%2==1):
+                raise ValueError("odd "+str(value))
+            return value
+        transfer=S3BatchTransfer(None, maxWorkers=4)
+        with self.assertRaises(S3BatchError) as raised:
+            transfer.run("even", fail, [(value,) for value in range(6)])
+        self.assertEqual(raised.exception.operation, "even")
+        self.assertEqual([args for args, error in raised.exception.failures], [(1,), (3,), (5,)])
+        self.assertIn("3 object(s)", str(raised.exception))
+
+    def testEmpty(self):
+        self.assertEqual(S3BatchTransfer(None).run("noop", None, []), [])
+
+
+class RetryTest(unittest.TestCase):
+
+    def attempts(self, error, maxAttempts=4):
+        calls=[]
+        def call():
+            calls.append(1)
+            raise error
+        transfer=S3BatchTransfer(None, maxAttempts=maxAttempts)
+        with mock.patch.object(s3batch.time, "sleep") as sleep:
+            with self.assertRaises(type(error)):
+                transfer._withRetry(call, ())
+        return len(calls), sleep.call_count
+
+    def testSlowDownRetried(self):
+        self.assertEqual(self.attempts(clientError("SlowDown")), (4, 3))
+
+    def testAccessDeniedNotRetried(self):
+        self.assertEqual(self.attempts(clientError("AccessDenied")), (1, 0))
+
+    def testRecoversAfterThrottling(self):
+        calls=[]
+        def call():
+            calls.append(1)
+            if (len(calls)<3):
+                raise clientError("SlowDown")
+            return "done"
+        with mock.patch.object(s3batch.time, "sleep"):
+            self.assertEqual(S3BatchTransfer(None)._withRetry(call, ()), "done")
+        self.assertEqual(len(calls), 3)
+
+
+class DeleteObjectsTest(unittest.TestCase):
+
+    def testBatchesOf1000(self):
+        client=newS3Client()
+        keys=["key"+str(i) for i in range(2500)]
+        with Stubber(client) as stubber:
+            for start in range(0, 2500, 1000):
+                batch=keys[start:start+1000]
+                stubber.add_response("delete_objects", {},
+                                     {"Bucket": "bucket", "Delete": {"Objects": [{"Key": key} for key in batch], "Quiet": True}})
+            self.assertEqual(S3BatchTransfer(client, maxWorkers=1).deleteObjects("bucket", keys), 2500)
+            stubber.assert_no_pending_responses()
+
+    def testPerKeyErrorsRaise(self):
+        client=newS3Client()
+        with Stubber(client) as stubber:
+            stubber.add_response("delete_objects", {"Errors": [{"Key": "key1", "Code": "AccessDenied", "Message": "denied"}]})
+            with self.assertRaises(S3BatchError) as raised:
+                S3BatchTransfer(client, maxWorkers=1).deleteObjects("bucket", ["key0", "key1"])
+        error=raised.exception.failures[0][1]
+        self.assertEqual(error.response["Error"]["Code"], "AccessDenied")
+        self.assertIn("first key=key1", str(error))
+
+
+class CopyObjectsTest(unittest.TestCase):
+
+    def setUp(self):
+        from moto import mock_aws
+        self.mock=mock_aws()
+        self.mock.start()
+        self.client=newS3Client()
+        self.client.create_bucket(Bucket="source")
+        self.client.create_bucket(Bucket="target")
+        self.client.put_object(Bucket="source", Key="small", Body=b"0123456789")
+        self.operations=[]
+        self.client.meta.events.register("before-call.s3", lambda model=None, **kwargs: self.operations.append(model.name))
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def testKnownSmallSizeUsesSingleCopyObject(self):
+        S3BatchTransfer(self.client).copyObjects([("source", "small", "target", "copy", 10)])
+        self.assertEqual(self.operations, ["CopyObject"])
+        self.assertEqual(self.client.get_object(Bucket="target", Key="copy")["Body"].read(), b"0123456789")
+
+    def testUnknownSizeUsesManagedCopy(self):
+        S3BatchTransfer(self.client).copyObjects([("source", "small", "target", "copy")])
+        self.assertEqual(self.operations, ["HeadObject", "CopyObject"])
+        self.assertEqual(self.client.get_object(Bucket="target", Key="copy")["Body"].read(), b"0123456789")
+
+    def testKnownLargeSizeUsesManagedCopy(self):
+        S3BatchTransfer(self.client).copyObjects([("source", "small", "target", "copy", s3batch.TRANSFER_CONFIG.multipart_threshold)])
+        self.assertEqual(self.operations[0], "HeadObject")
+
+
+if __name__=="__main__":
+    unittest.main()
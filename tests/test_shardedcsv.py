@@ -0,0 +1,106 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import os
+import csv
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+import numpy as np
+
+import lambdaloader
+import shardedcsv
+
+RawDataProcesser=lambdaloader.loadLambdaModule("rawdataprocessor", "RawDataProcesser")
+
+
+# states_daily.csv shaped file (date, state, positive, ..., totalTestResults at 17), with missing values, repeated
+# (date, state) cells and lines of very different lengths so the byte range boundaries land inside lines
+def writeRawCsv(path, numOfItems=12, numOfDays=40, seed=7):
+    generator=random.Random(seed)
+    startDay=date(2020, 3, 1)
+    with open(path, "w", newline="") as rawFile:
+        writer=csv.writer(rawFile)
+        writer.writerow(["date", "state", "positive"]+["col"+str(col) for col in range(3, 18)])
+        for day in range(numOfDays-1, -1, -1):
+            dayString=(startDay+timedelta(days=day)).strftime("%Y%m%d")
+            for item in range(numOfItems):
+                row=[dayString, "S"+str(item)]+["" if generator.random()<0.1 else str(generator.randint(0, 10**generator.randint(1, 9))) for _ in range(16)]
+                writer.writerow(row)
+                if (generator.random()<0.05):
+                    row[2]=str(generator.randint(0, 100))
+                    writer.writerow(row)
+
+def assertSameStore(test, expected, actual):
+    test.assertEqual(actual.items, expected.items)
+    test.assertEqual(actual.fieldNames, expected.fieldNames)
+    test.assertEqual((actual.startOrdinal, actual.endOrdinal), (expected.startOrdinal, expected.endOrdinal))
+    for fieldName in expected.fieldNames:
+        # NaN positions have to match too
+        np.testing.assert_array_equal(actual.getRange(actual.startOrdinal, actual.endOrdinal, fieldName),
+                                      expected.getRange(expected.startOrdinal, expected.endOrdinal, fieldName))
+
+
+class ShardLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir=tempfile.mkdtemp()
+        self.path=os.path.join(self.workDir, "raw.csv")
+        writeRawCsv(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir)
+
+    def testShardsCoverEveryLineOnce(self):
+        with open(self.path, "rb") as rawFile:
+            lines=rawFile.read().splitlines(True)
+        size=os.path.getsize(self.path)
+        for numOfShards in (2, 3, 4, 17, 101):
+            ranges=shardedcsv.byteRanges(size, numOfShards)
+            shardLines=[]
+            for start, end in ranges:
+                shardLines.extend(shardedcsv.iterShardLines(self.path, start, end))
+            self.assertEqual(shardLines, lines, numOfShards)
+
+    def testBoundariesInsideLines(self):
+        with open(self.path, "rb") as rawFile:
+            content=rawFile.read()
+        starts=[start for start, end in shardedcsv.byteRanges(len(content), 4)[1:]]
+        self.assertTrue(any(content[start-1:start]!=b"\n" for start in starts))
+
+
+class ShardedParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workDir=tempfile.mkdtemp()
+        self.path=os.path.join(self.workDir, "raw.csv")
+        writeRawCsv(self.path)
+        self.valueCols=[2, 17]
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir)
+
+    def parseSerial(self, rawData=None, cutoffDate=None):
+        RawDataProcesser.processRawCSV(self.path, rawData, cutoffDate, self.valueCols)
+        return RawDataProcesser.vars.RawData
+
+    def parseSharded(self, numOfShards, rawData=None, cutoffDate=None):
+        RawDataProcesser.processRawCSVSharded(self.path, numOfShards, rawData, cutoffDate, self.valueCols)
+        return RawDataProcesser.vars.RawData
+
+    def testSameStoreAsSerial(self):
+        serial=self.parseSerial()
+        self.assertGreater(int(np.isnan(serial.getRange(serial.startOrdinal, serial.endOrdinal, "col2")).sum()), 0)
+        for numOfShards in (2, 4):
+            assertSameStore(self, serial, self.parseSharded(numOfShards))
+
+    def testSameStoreWithCutoff(self):
+        cutoffDate=date(2020, 3, 30)
+        serial=self.parseSerial(self.parseSerial(), cutoffDate)
+        for numOfShards in (2, 4):
+            assertSameStore(self, serial, self.parseSharded(numOfShards, self.parseSerial(), cutoffDate))
+
+
+if __name__=="__main__":
+    unittest.main()
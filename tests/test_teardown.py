@@ -0,0 +1,149 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import threading
+import unittest
+from botocore.exceptions import ClientError
+
+import lambdaloader
+
+teardown=lambdaloader.loadModule("deleteExpiredForecast", "teardown")
+OPERATION_KINDS={}
+for kind, (deleteOperation, describeOperation, parameter) in teardown.OPERATIONS.items():
+    OPERATION_KINDS[deleteOperation]=("delete", kind, parameter)
+    OPERATION_KINDS[describeOperation]=("describe", kind, parameter)
+
+
+def clientError(code, operation):
+    return ClientError({"Error": {"Code": code, "Message": code}}, operation)
+
+
+# Forecast delete_*/describe_* on a tree of resources: a delete is refused (ResourceInUseException) while a child exists,
+# a deleted resource is gone after `checks` describe calls
+class FakeForecastClient(object):
+
+    def __init__(self, checks=1):
+        self.checks=checks
+        self.parents={}
+        self.kinds={}
+        self.deleting={}
+        self.gone=set()
+        self.deletes=[]
+        self.outOfOrder=[]
+        self._lock=threading.Lock()
+
+    def add(self, kind, arn, parentArn=None):
+        self.kinds[arn]=kind
+        self.parents[arn]=parentArn
+
+    def children(self, arn):
+        return [child for child, parent in self.parents.items() if parent==arn and child not in self.gone]
+
+    def __getattr__(self, operation):
+        if (operation not in OPERATION_KINDS):
+            raise AttributeError(operation)
+        call, kind, parameter=OPERATION_KINDS[operation]
+        def method(**kwargs):
+            with self._lock:
+                return getattr(self, "_"+call)(operation, kwargs[parameter])
+        return method
+
+    def _delete(self, operation, arn):
+        if (arn in self.gone):
+            raise clientError("ResourceNotFoundException", operation)
+        if (len(self.children(arn))>0):
+            self.outOfOrder.append(arn)
+            raise clientError("ResourceInUseException", operation)
+        self.deletes.append(arn)
+        self.deleting.setdefault(arn, self.checks)
+        return {}
+
+    def _describe(self, operation, arn):
+        if (arn in self.gone):
+            raise clientError("ResourceNotFoundException", operation)
+        if (arn in self.deleting):
+            self.deleting[arn]-=1
+            if (self.deleting[arn]<=0):
+                self.gone.add(arn)
+                raise clientError("ResourceNotFoundException", operation)
+            return {"Status": "DELETE_IN_PROGRESS"}
+        return {"Status": "ACTIVE"}
+
+
+# dataset group with one dataset, two import jobs, two predictors and a forecast with an export job per predictor
+def addDatasetGroup(client, name):
+    arns={kind: [] for kind in teardown.LEVELS}
+    def add(kind, arn, parentArn=None):
+        client.add(kind, arn, parentArn)
+        arns[kind].append(arn)
+        return arn
+    datasetGroup=add(teardown.DATASET_GROUP, name)
+    dataset=add(teardown.DATASET, name+"/dataset", datasetGroup)
+    for job in range(2):
+        add(teardown.DATASET_IMPORT_JOB, name+"/import"+str(job), dataset)
+    for predictor in range(2):
+        predictorArn=add(teardown.PREDICTOR, name+"/predictor"+str(predictor), dataset)
+        forecastArn=add(teardown.FORECAST, predictorArn+"/forecast", predictorArn)
+        add(teardown.FORECAST_EXPORT_JOB, forecastArn+"/export", forecastArn)
+    return {"datasetGroupName": name, "level": 0,
+            "levels": [[teardown.newResource(kind, arn) for arn in arns[kind]] for kind in teardown.LEVELS]}
+
+
+class FakeClock(object):
+
+    def __init__(self, budget):
+        self.budget=budget
+        self.now=0.0
+        self.sleeps=[]
+
+    def timeLeft(self):
+        return self.budget-self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now+=seconds
+
+
+class TeardownTest(unittest.TestCase):
+
+    def testChildrenDeletedBeforeParents(self):
+        client=FakeForecastClient(checks=2)
+        plans=[addDatasetGroup(client, "dg"+str(group)) for group in range(3)]
+        clock=FakeClock(3600)
+        result=teardown.teardown(client, plans, clock.timeLeft, maxWorkers=4, sleep=clock.sleep)
+        self.assertEqual(result, {"deleted": ["dg0", "dg1", "dg2"], "failed": [], "remaining": []})
+        self.assertEqual(client.outOfOrder, [])
+        self.assertEqual(set(client.deletes), set(client.kinds))
+        self.assertEqual(len(client.deletes), len(set(client.deletes)))
+        # every group goes level by level: a delete never comes before one of a deeper level of the same group
+        for group in range(3):
+            levels=[teardown.LEVELS.index(client.kinds[arn]) for arn in client.deletes if arn.startswith("dg"+str(group)+"/") or arn=="dg"+str(group)]
+            self.assertEqual(levels, sorted(levels))
+
+    def testStopsWhenBudgetRunsOut(self):
+        client=FakeForecastClient(checks=1000)
+        plans=[addDatasetGroup(client, "dg")]
+        clock=FakeClock(100)
+        result=teardown.teardown(client, plans, clock.timeLeft, sleep=clock.sleep)
+        self.assertEqual(result, {"deleted": [], "failed": [], "remaining": ["dg"]})
+        # the waits back off and never go past the budget
+        self.assertEqual(clock.sleeps, [5, 10, 20, 40])
+        self.assertLessEqual(clock.now, clock.budget)
+        # only the export jobs were requested, nothing deeper
+        self.assertEqual(sorted(client.deletes), ["dg/predictor0/forecast/export", "dg/predictor1/forecast/export"])
+
+    # the next run rebuilds the plan from what is left and finishes it, deletes already requested are found gone
+    def testNextRunFinishes(self):
+        client=FakeForecastClient(checks=3)
+        firstRun=FakeClock(8)
+        self.assertEqual(teardown.teardown(client, [addDatasetGroup(client, "dg")], firstRun.timeLeft, sleep=firstRun.sleep)["remaining"], ["dg"])
+        self.assertNotIn("dg", client.gone)
+        plan=addDatasetGroup(FakeForecastClient(), "dg")
+        clock=FakeClock(3600)
+        result=teardown.teardown(client, [plan], clock.timeLeft, sleep=clock.sleep)
+        self.assertEqual(result["deleted"], ["dg"])
+        self.assertEqual(client.outOfOrder, [])
+        self.assertIn("dg", client.gone)
+
+
+if __name__=="__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import io
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+
+from timeseriesstore import TimeSeriesStore
+
+
+def newStore(days):
+    store=TimeSeriesStore(["col2"])
+    for ordinal in days:
+        store.setValues(ordinal, "a", [float(ordinal)])
+    return store
+
+
+class ClearRangeTest(unittest.TestCase):
+
+    def testRestatedFileEndingEarlierShrinksEnd(self):
+        store=newStore(range(100, 110))
+        store.clearRange(105, 200)
+        # the re-pulled file only goes up to 106
+        store.setValues(105, "a", [1.0])
+        store.setValues(106, "a", [2.0])
+        self.assertEqual((store.startOrdinal, store.endOrdinal), (100, 106))
+        self.assertEqual(store.numDays, 7)
+
+    def testEndMovesToLastDayWithValue(self):
+        store=newStore([100, 101, 102])
+        store.setValue(104, "b", "col2", np.nan)
+        self.assertEqual(store.endOrdinal, 104)
+        store.clearRange(103, 200)
+        self.assertEqual(store.endOrdinal, 102)
+        self.assertTrue(store.hasDay(102))
+
+    def testClearingEverythingEmptiesStore(self):
+        store=newStore([100, 101])
+        store.clearRange(0, 200)
+        self.assertIsNone(store.endOrdinal)
+        self.assertEqual(store.numDays, 0)
+        store.setValues(150, "a", [1.0])
+        self.assertEqual((store.startOrdinal, store.endOrdinal), (150, 150))
+        self.assertEqual(store.getDay(150, "col2").tolist(), [1.0])
+
+    def testSnapshotAfterClear(self):
+        store=newStore(range(100, 110))
+        store.clearRange(108, 200)
+        snapshot=io.BytesIO()
+        store.save(snapshot)
+        snapshot.seek(0)
+        loaded=TimeSeriesStore.load(snapshot)
+        self.assertEqual((loaded.startOrdinal, loaded.endOrdinal), (100, 107))
+        self.assertEqual(loaded.getRange(100, 107, "col2").ravel().tolist(), [float(ordinal) for ordinal in range(100, 108)])
+
+
+if __name__=="__main__":
+    unittest.main()
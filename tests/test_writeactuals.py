@@ -0,0 +1,72 @@
+#Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#SPDX-License-Identifier: MIT-0
+import unittest
+from datetime import date, timedelta
+
+import lambdaloader
+import boto3
+import actualsstore
+from timeseriesstore import TimeSeriesStore
+
+RawDataProcesser=lambdaloader.loadLambdaModule("rawdataprocessor", "RawDataProcesser")
+MODEL={"target_col": 2}
+
+
+def rawStore(startDay, endDay):
+    store=TimeSeriesStore(["col2"])
+    day=startDay
+    while (day<=endDay):
+        for item in ["A", "B"]:
+            store.setValues(day.toordinal(), item, [float(day.day)])
+        day+=timedelta(days=1)
+    return store
+
+
+class WriteActualsTest(unittest.TestCase):
+
+    def setUp(self):
+        from moto import mock_aws
+        self.mock=mock_aws()
+        self.mock.start()
+        self.client=boto3.client("s3")
+        self.client.create_bucket(Bucket=lambdaloader.BUCKET)
+
+    def tearDown(self):
+        self.mock.stop()
+
+    def actual(self, item, day):
+        return actualsstore.ActualsStore(self.client, lambdaloader.BUCKET).getRange([item], day.toordinal(), day.toordinal())[0][0]
+
+    def restate(self, store, day, value):
+        store.setValue(day.toordinal(), "A", "col2", value)
+        RawDataProcesser.setRawData(store)
+
+    # a restated day RestatementDays back, in the previous month, has its month partition rewritten
+    def testRestatedDayAcrossMonthBoundary(self):
+        store=rawStore(date(2020, 3, 15), date(2020, 4, 6))
+        RawDataProcesser.setRawData(store)
+        RawDataProcesser.writeActuals(MODEL)
+        restatedDay=date(2020, 4, 6)-timedelta(days=RawDataProcesser.RestatementDays-1)
+        # the recent days alone (NumberOfRecentDays) stay in April
+        self.assertEqual(restatedDay.month, 3)
+        self.assertEqual((date(2020, 4, 6)-timedelta(days=RawDataProcesser.vars.NumberOfRecentDays)).month, 4)
+        self.assertEqual(self.actual("A", restatedDay), float(restatedDay.day))
+
+        self.restate(store, restatedDay, 999.0)
+        RawDataProcesser.writeActuals(MODEL)
+        self.assertEqual(self.actual("A", restatedDay), 999.0)
+        self.assertEqual(self.actual("B", restatedDay), float(restatedDay.day))
+
+    # after skipped runs the incremental parse goes back further than RestatementDays, up to its cutoff
+    def testRewritesBackToTheParseCutoff(self):
+        store=rawStore(date(2020, 3, 15), date(2020, 4, 10))
+        RawDataProcesser.setRawData(store)
+        RawDataProcesser.writeActuals(MODEL)
+        restatedDay=date(2020, 3, 28)
+        self.restate(store, restatedDay, 999.0)
+        RawDataProcesser.writeActuals(MODEL, cutoffDate=date(2020, 3, 25))
+        self.assertEqual(self.actual("A", restatedDay), 999.0)
+
+
+if __name__=="__main__":
+    unittest.main()